@@ -8,11 +8,13 @@ from .dynamo import Dynamo
 from .mcm import McM
 from .msmgr import MSMgr
 from .rucio import Rucio
+from .sitemap import SiteMap
+from .requestindex import RequestIndex
 
 
 class Client(RESTClient):
-    def __init__(self, usercert=None, certdir=None):
-        super().__init__(usercert, certdir)
+    def __init__(self, usercert=None, certdir=None, compact=None, arrow=None):
+        super().__init__(usercert, certdir, compact, arrow)
         self.datasvc = DataSvc(self)
         self.unified = Unified(self)
         self.dbs = DBS(self)
@@ -21,6 +23,7 @@ class Client(RESTClient):
         self.mcm = McM(self)
         self.msmgr = MSMgr(self)
         self.rucio = Rucio(self)
+        self.sitemap = SiteMap(self.datasvc, self.rucio)
 
 
 __all__ = [
@@ -33,4 +36,6 @@ __all__ = [
     "Dynamo",
     "Client",
     "MSMgr",
+    "SiteMap",
+    "RequestIndex",
 ]
@@ -1,5 +1,11 @@
 import asyncio
+import collections
 import contextlib
+import logging
+import time
+
+
+logger = logging.getLogger(__name__)
 
 
 def _make_throttle(semaphore):
@@ -43,3 +49,103 @@ async def completed(coroutines, semaphore=None):
     else:
         for coro in asyncio.as_completed(map(_make_throttle(semaphore), coroutines)):
             yield await coro
+
+
+class TTLCache:
+    """Memoize coroutine results for a limited time
+
+    Concurrent requests for the same key share a single pending fetch,
+    and failed fetches are not cached.
+
+    Parameters
+    ----------
+        ttl : float or None
+            Lifetime of an entry in seconds, or None to never expire
+        maxsize : int, optional
+            Maximum number of entries, the least recently used are evicted first
+    """
+
+    def __init__(self, ttl, maxsize=None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _valid(self, key):
+        try:
+            expiration, future = self._entries[key]
+        except KeyError:
+            return False
+        return not future.done() or expiration is None or expiration > time.monotonic()
+
+    def fresh(self, key):
+        """True if key has a valid completed entry"""
+        return self._valid(key) and self._entries[key][1].done()
+
+    def peek(self, key, default=None):
+        """Return the cached value for key without fetching"""
+        if self.fresh(key):
+            future = self._entries[key][1]
+            if future.exception() is None:
+                return future.result()
+        return default
+
+    def invalidate(self, key=None):
+        """Drop key from the cache, or all entries if key is None"""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    async def get(self, key, factory):
+        """Get the value for key, calling factory() to create it if needed
+
+        Parameters
+        ----------
+            key : hashable
+            factory : callable
+                A function returning a coroutine that produces the value
+        """
+        if self._valid(key):
+            self._entries.move_to_end(key)
+            future = self._entries[key][1]
+        else:
+            future = asyncio.ensure_future(factory())
+            expiration = None if self.ttl is None else time.monotonic() + self.ttl
+            self._entries[key] = (expiration, future)
+            while self.maxsize is not None and len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        try:
+            return await asyncio.shield(future)
+        except Exception:
+            if key in self._entries and self._entries[key][1] is future:
+                del self._entries[key]
+            raise
+
+
+async def retry(factory, retries, exceptions=(IOError,), delay=1.0):
+    """Await a coroutine until it succeeds
+
+    Parameters
+    ----------
+        factory : callable
+            A function returning a new coroutine for each attempt
+        retries : int
+            Total number of attempts
+        exceptions : tuple, optional
+            Exception types that trigger a retry
+        delay : float, optional
+            Initial delay between attempts in seconds, doubled after each failure
+    """
+    for attempt in range(retries):
+        try:
+            return await factory()
+        except exceptions as ex:
+            if attempt + 1 == retries:
+                raise
+            logger.warning(
+                f"Attempt {attempt + 1} of {retries} failed ({ex!r}), retrying"
+            )
+            await asyncio.sleep(delay * 2**attempt)
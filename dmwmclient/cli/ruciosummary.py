@@ -3,6 +3,7 @@ import logging
 import asyncio
 from itertools import chain
 from dmwmclient.asyncutil import gather
+from dmwmclient.export import to_parquet
 from matplotlib.ticker import EngFormatter
 
 
@@ -37,10 +38,9 @@ class RucioSummary:
 
         self.client.rucio.account = "transfer_ops"
 
-        ddm_rses = await self.client.rucio.getjson(
-            "rses/", params={"expression": "(rse_type=DISK)&(ddm_quota>0)"}
+        ddm_rses = await self.client.rucio.rse_cache.expression(
+            "(rse_type=DISK)&(ddm_quota>0)"
         )
-        ddm_rses = sorted(item["rse"] for item in ddm_rses)
 
         async def get_sync_usage(rse):
             account = "sync_" + rse.lower()
@@ -75,10 +75,8 @@ class RucioSummary:
             for item in usage:
                 del item["updated_at"]
                 del item["rse_id"]
-            attr = await self.client.rucio.getjson(f"rses/{rse}/attr/")
-            attr = attr[0]
-            limits = await self.client.rucio.getjson(f"rses/{rse}/limits")
-            limits = limits[0]
+            attr = await self.client.rucio.rse_cache.attributes(rse)
+            limits = await self.client.rucio.rse_cache.limits(rse)
             reaper_info = {
                 "source": "reaper",
                 "rse": rse,
@@ -131,7 +129,7 @@ class RucioSummary:
         )
         usage = pd.concat([rse_usage, account_usage], axis=1)
         usage.loc["Total"] = usage.sum()
-        usage.to_pickle(f"{self.out}/rucio_summary.pkl.gz")
+        await to_parquet(usage, f"{self.out}/rucio_summary.parquet")
 
         volume = pd.DataFrame(
             {
@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import numpy
+import pandas
+from .asyncutil import gather, retry
+from .sitemap import SiteMap
+
+logger = logging.getLogger(__name__)
+
+
+# Mismatch categories, in order of precedence
+CATEGORIES = [
+    "missing_in_rucio",
+    "missing_in_phedex",
+    "size_mismatch",
+    "incomplete",
+    "ok",
+]
+
+
+def _complete(values):
+    # y/n, or bool if the client compacts dtypes
+    return pandas.Series(values).astype(str).isin(["y", "True"]).to_numpy()
+
+
+def phedex_side(df, sitemap):
+    """Reduce a DataSvc.blockreplicas dataframe to the columns compared
+
+    Replicas at nodes without an RSE (e.g. buffers) are dropped
+    """
+    out = pandas.DataFrame(
+        {
+            "block": df["name"].astype(object).to_numpy(),
+            "rse": sitemap.translate(df["replica.node"], "node", "rse").to_numpy(),
+            "node": df["replica.node"].astype(object).to_numpy(),
+            "phedex_bytes": df["bytes"].to_numpy(),
+            "phedex_replica_bytes": df["replica.bytes"].to_numpy(),
+            "phedex_complete": _complete(df["replica.complete"]),
+        }
+    )
+    return out[out["rse"].notna()]
+
+
+def rucio_side(df):
+    """Reduce a Rucio.list_dataset_replicas(_bulk) dataframe to the columns compared"""
+    if len(df) == 0:
+        df = pandas.DataFrame(
+            columns=["dataset_name", "rse", "Total_bytes", "Bytes_at_rse", "state"]
+        )
+    return pandas.DataFrame(
+        {
+            "block": df["dataset_name"].astype(object).to_numpy(),
+            "rse": df["rse"].astype(object).to_numpy(),
+            "rucio_bytes": df["Total_bytes"].to_numpy(),
+            "rucio_replica_bytes": df["Bytes_at_rse"].to_numpy(),
+            "rucio_complete": (df["state"] == "AVAILABLE").to_numpy(),
+        }
+    )
+
+
+def classify(phedex, rucio):
+    """Join the two sides by (block, rse) and categorize each block replica
+
+    Parameters
+    ----------
+        phedex : pandas.DataFrame
+            output of phedex_side
+        rucio : pandas.DataFrame
+            output of rucio_side
+
+    Returns the outer join with a categorical ``category`` column, one of:
+        missing_in_rucio    replica only known to PhEDEx
+        missing_in_phedex   replica only known to Rucio
+        size_mismatch       the block size differs between the two
+        incomplete          the replica is complete in one but not the other
+        ok
+    """
+    df = phedex.merge(rucio, on=["block", "rse"], how="outer", indicator=True)
+    where = df.pop("_merge").to_numpy()
+    category = numpy.select(
+        [
+            where == "left_only",
+            where == "right_only",
+            df["phedex_bytes"].to_numpy() != df["rucio_bytes"].to_numpy(),
+            df["phedex_complete"].to_numpy() != df["rucio_complete"].to_numpy(),
+        ],
+        CATEGORIES[:-1],
+        default=CATEGORIES[-1],
+    )
+    df["category"] = pandas.Categorical(category, categories=CATEGORIES)
+    return df
+
+
+class ConsistencyCheck:
+    """Compare PhEDEx and Rucio block replicas
+
+    Node names are translated to RSE names with a SiteMap.
+    PhEDEx block replicas are fetched in shards (one per node, and batches of
+    datasets or blocks) and, as each shard arrives, the Rucio replicas of its
+    new blocks are fetched in bulk, so that both sides are pulled concurrently.
+    Each side is immediately reduced to the compared columns, and the two are
+    joined once at the end. Blocks unknown to PhEDEx are not looked up in Rucio.
+    """
+
+    defaults = {
+        # Number of blocks per Rucio bulk request
+        "batchsize": 1000,
+        # Number of concurrent requests to each service
+        "concurrency": 4,
+        # Number of attempts for each request
+        "retries": 3,
+        "scope": "cms",
+    }
+
+    def __init__(
+        self,
+        datasvc,
+        rucio,
+        sitemap=None,
+        batchsize=None,
+        concurrency=None,
+        retries=None,
+    ):
+        if batchsize is None:
+            batchsize = ConsistencyCheck.defaults["batchsize"]
+        if concurrency is None:
+            concurrency = ConsistencyCheck.defaults["concurrency"]
+        if retries is None:
+            retries = ConsistencyCheck.defaults["retries"]
+        self.datasvc = datasvc
+        self.rucio = rucio
+        self.sitemap = SiteMap(datasvc, rucio) if sitemap is None else sitemap
+        self.batchsize = batchsize
+        self.concurrency = concurrency
+        self.retries = retries
+
+    async def _rucio(self, blocks, semaphore):
+        scope = ConsistencyCheck.defaults["scope"]
+
+        async def batch(names):
+            dids = [{"scope": scope, "name": name} for name in names]
+            df = await retry(
+                lambda: self.rucio.list_dataset_replicas_bulk(dids), self.retries
+            )
+            return rucio_side(df)
+
+        batches = []
+        for start in range(0, len(blocks), self.batchsize):
+            stop = start + self.batchsize
+            batches.append(blocks[start:stop])
+        return await gather(map(batch, batches), semaphore)
+
+    async def compare(self, **params):
+        """Compare the block replicas selected by DataSvc.blockreplicas parameters
+
+        Parameters
+        ----------
+        dataset        dataset name, can be multiple
+        block          block name, can be multiple
+        node           node name, can be multiple. Rucio replicas at other RSEs are ignored.
+        (any other DataSvc.blockreplicas parameter)
+
+        Returns a dataframe from classify
+        """
+        sitemap = await self.sitemap.load()
+        phedex_semaphore = asyncio.BoundedSemaphore(self.concurrency)
+        rucio_semaphore = asyncio.BoundedSemaphore(self.concurrency)
+        seen = set()
+
+        async def shard(query):
+            async with phedex_semaphore:
+                df = await retry(
+                    lambda: self.datasvc.blockreplicas(**query), self.retries
+                )
+            phedex = phedex_side(df, sitemap)
+            blocks = [
+                b for b in pandas.unique(phedex["block"].to_numpy()) if b not in seen
+            ]
+            seen.update(blocks)
+            del df
+            return phedex, await self._rucio(blocks, rucio_semaphore)
+
+        results = await asyncio.gather(*map(shard, self.datasvc.shards(**params)))
+        phedex = pandas.concat([p for p, _ in results], ignore_index=True)
+        rucio = [r for _, rs in results for r in rs if len(r)]
+        rucio = pandas.concat(
+            rucio or [rucio_side(pandas.DataFrame())], ignore_index=True
+        )
+        del results
+        if "node" in params:
+            nodes = params["node"]
+            if isinstance(nodes, str):
+                nodes = [nodes]
+            rucio = rucio[rucio["rse"].isin(sitemap.translate(nodes, "node", "rse"))]
+        logger.info(
+            f"Comparing {len(phedex)} PhEDEx and {len(rucio)} Rucio block replicas"
+        )
+        return classify(phedex, rucio)
@@ -1,6 +1,10 @@
+import itertools
+import time
 import httpx
 import pandas
-from .util import format_dates
+from .asyncutil import gather, retry
+from .util import iter_chunks
+from .flatten import Level, Schema, flatten, flatten_xml, rename
 
 
 BLOCKARRIVE_BASISCODE = {
@@ -15,6 +19,357 @@ BLOCKARRIVE_BASISCODE = {
     2: "rerouting",
 }
 
+# Methods whose XML form can be streamed with DataSvc.iter_xml
+XML_STREAMABLE = ("data", "errorlog", "filereplicas", "missingfiles")
+# Multi-valued parameters that can be split into batches
+SHARD_BATCHED = ("block", "dataset", "lfn")
+# Parameters bounding a time range, that can be split into windows
+SHARD_WINDOWS = {"create_since": "create_until", "decide_since": "decide_until"}
+# Date column compared to each time range parameter, per method
+SHARD_WINDOW_COLUMNS = {
+    "requestlist": {"create_since": "time_created", "decide_since": "time_decided"},
+}
+
+
+SCHEMAS = {
+    "data": Schema(
+        path=["phedex"],
+        levels=[
+            Level("dbs"),
+            Level("dataset", {"Dataset": "name", "Is_dataset_open": "is_open"}),
+            Level(
+                "block",
+                {
+                    "block_Name": "name",
+                    "Block_size_(GB)": "bytes",
+                    "Time_block_was_created": "time_create",
+                },
+            ),
+            Level(
+                "file",
+                {
+                    "File_name": "lfn",
+                    "File_checksum": "checksum",
+                    "File_size": "size",
+                    "Time_file_was_created": "time_create",
+                },
+            ),
+        ],
+        units={"Block_size_(GB)": 1e9, "File_size": 1e9},
+        dates=["Time_file_was_created", "Time_block_was_created"],
+        human_readable={
+            "Is_dataset_open": "Is dataset open",
+            "block_Name": "Block Name",
+            "Block_size_(GB)": "Block size (GB)",
+            "Time_block_was_created": "Time Block Was Created",
+            "File_name": "File Name",
+            "File_checksum": "File Checksum",
+            "File_size": "File Size (GB)",
+            "Time_file_was_created": "Time File Was Created",
+        },
+    ),
+    "errorlog": Schema(
+        path=["phedex"],
+        levels=[
+            Level("link", {"Link": lambda link: link["from"] + " to " + link["to"]}),
+            Level("block", {"Block_name": "name"}),
+            Level(
+                "file",
+                {"LFN": "name", "file_Checksum": "checksum", "file_size_(GB)": "size"},
+            ),
+            Level(
+                "transfer_error",
+                {
+                    "Error_log": ("detail_log", "$t"),
+                    "From_PFN": "from_pfn",
+                    "To_PFN": "to_pfn",
+                    "Time": "time_done",
+                },
+            ),
+        ],
+        units={"file_size_(GB)": 1e9},
+        convert={"Error_log": lambda col: col.map(str)},
+        dates=["Time"],
+        human_readable={
+            "From_PFN": "From PFN",
+            "To_PFN": "To PFN",
+            "Error_log": "Error Log",
+            "Block_Name": "Block Name",
+            "Block_size_(GB)": "Block size (GB)",
+            "file_checksum": "File Checksum",
+            "file_size_(GB)": "File Size (GB)",
+        },
+        columns=[
+            "Link",
+            "LFN",
+            "file_Checksum",
+            "file_size_(GB)",
+            "Block_name",
+            "Error_log",
+            "From_PFN",
+            "To_PFN",
+            "Time",
+        ],
+    ),
+    "blockarrive": Schema(
+        path=["phedex"],
+        levels=[
+            Level("block", {"Block_Name": "name"}),
+            Level(
+                "destination",
+                {
+                    "Destination": "name",
+                    "Time_Arrive": "time_arrive",
+                    "Time_update": "time_update",
+                    "Number_of_files": "files",
+                    "Block_size_(GB)": "bytes",
+                    "Basis_code": "basis",
+                },
+            ),
+        ],
+        units={"Block_size_(GB)": 1e9},
+        convert={
+            "Basis_code": lambda col: col.map(BLOCKARRIVE_BASISCODE).fillna(
+                "No code specified"
+            )
+        },
+        dates=["Time_Arrive", "Time_update"],
+        human_readable={
+            "Block_Name": "Block Name",
+            "Block_size_(GB)": "Block size (GB)",
+            "Time_Arrive": "Time Arrive",
+            "Time_update": "Time Update",
+            "Number_of_files": "Number Of Files",
+            "Basis_code": "Basis Code",
+        },
+    ),
+    "filereplicas": Schema(
+        path=["phedex"],
+        levels=[
+            Level(
+                "block",
+                {"Block_name": "name", "Files": "files", "Block_size_(GB)": "bytes"},
+            ),
+            Level(
+                "file",
+                {
+                    "lfn": "name",
+                    "Checksum": "checksum",
+                    "File_created_on": "time_create",
+                },
+            ),
+            Level(
+                "replica",
+                {
+                    "File_replica_at": "node",
+                    "File_subcribed": "subscribed",
+                    "Custodial": "custodial",
+                    "Group": "group",
+                    "File_in_node_since": "time_create",
+                },
+            ),
+        ],
+        units={"Block_size_(GB)": 1e9},
+        dates=["File_created_on", "File_in_node_since"],
+        human_readable={
+            "Block_name": "Block Name",
+            "Block_size_(GB)": "Block size (GB)",
+            "File_created_on": "File Created On",
+            "File_replica_at": "File Replica At",
+            "File_subcribed": "File Subcribed",
+            "File_in_node_since": "File In Node Since",
+        },
+        numeric=["Files"],
+    ),
+    "agentlogs": Schema(
+        path=["phedex"],
+        levels=[
+            Level(
+                "agent", {"Agent": "name", "Host": "host", "PID": "pid", "User": "user"}
+            ),
+            Level("node", {"Node": "name"}),
+            # every log message of an agent is listed for each of its nodes
+            Level(
+                "log",
+                {
+                    "Reason": "reason",
+                    "Time": "time",
+                    "state_dir": "state_dir",
+                    "working_dir": "working_dir",
+                    "Message": ("message", "$t"),
+                },
+                source=0,
+            ),
+        ],
+        convert={"Message": lambda col: col.map(str)},
+        dates=["Time"],
+        human_readable={
+            "state_dir": "State Directory",
+            "working_dir": "Working Directory",
+        },
+        columns=[
+            "Agent",
+            "Host",
+            "PID",
+            "Node",
+            "User",
+            "Reason",
+            "Time",
+            "state_dir",
+            "working_dir",
+            "Message",
+        ],
+    ),
+    "missingfiles": Schema(
+        path=["phedex"],
+        levels=[
+            Level("block", {"block_name": "name"}),
+            Level(
+                "file",
+                {
+                    "file_name": "name",
+                    "checksum": "checksum",
+                    "size": "bytes",
+                    "created": "time_create",
+                    "origin_node": "origin_node",
+                },
+            ),
+            Level(
+                "missing",
+                {
+                    "missing_from": "node_name",
+                    "disk": "se",
+                    "custodial": "custodial",
+                    "subscribed": "subscribed",
+                },
+            ),
+        ],
+        dates=["created"],
+        human_readable={
+            "block_name": "Block Name",
+            "file_name": "File Name",
+            "size": "Size of file",
+            "created": "Time created",
+            "origin_node": "Origin Node",
+            "missing_from": "Missing from",
+            "disk": "Disk",
+            "custodial": "Custodial?",
+            "subscribed": "Subscribed?",
+        },
+        numeric=["size"],
+    ),
+    "agents": Schema(
+        path=["phedex"],
+        levels=[
+            Level("node", {"Node": "node", "Host": "host", "Agent_name": "name"}),
+            Level(
+                "agent",
+                {
+                    "Agent_label": "label",
+                    "Time_update": "time_update",
+                    "state_dir": "state_dir",
+                    "version": "version",
+                },
+            ),
+        ],
+        dates=["Time_update"],
+        human_readable={
+            "Agent_name": "Agent name",
+            "Agent_label": "Agent label",
+            "Time_update": "Time update",
+            "state_dir": "Directory",
+            "version": "Version",
+        },
+    ),
+    "blocklatency": Schema(
+        path=["phedex"],
+        levels=[
+            Level(
+                "block",
+                {
+                    "Block": "name",
+                    "Block_ID": "id",
+                    "Dataset": "dataset",
+                    "Size": "bytes",
+                    "Time_create": "time_create",
+                    "Number_of_files": "files",
+                    "Time_update": "time_update",
+                },
+            ),
+            Level("destination", {"Destination": "name"}),
+            Level(
+                "latency",
+                {
+                    "custodial": "is_custodial",
+                    "last_suspend": "last_suspend",
+                    "last_replica": "last_replica",
+                    "time_subscription": "time_subscription",
+                    "block_closed": "block_close",
+                    "latency": "latency",
+                },
+            ),
+        ],
+        dates=[
+            "Time_update",
+            "last_suspend",
+            "last_replica",
+            "time_subscription",
+            "block_closed",
+            "Time_create",
+        ],
+        human_readable={
+            "Block_ID": "Block ID",
+            "Time_create": "Time Create",
+            "Number_of_files": "Number of files",
+            "Time_update": "Time Update",
+            "last_suspend": "Last Suspend",
+            "last_replica": "Last Replica",
+            "time_subscription": "Time Subscription",
+            "block_closed": "Block Closed",
+            "latency": "Latency",
+        },
+    ),
+    "requestlist": Schema(
+        path=["phedex"],
+        levels=[
+            Level(
+                "request",
+                {
+                    "request_id": "id",
+                    "time_created": "time_create",
+                    "requested_by": "requested_by",
+                    "approval": "approval",
+                },
+            ),
+            Level(
+                "node",
+                {
+                    "node": "name",
+                    "time_decided": "time_decided",
+                    "decided_by": "decided_by",
+                },
+            ),
+        ],
+        dates=["time_created", "time_decided"],
+        human_readable={
+            "request_id": "Request ID",
+            "time_created": "Time Created",
+            "requested_by": "Requested by",
+            "approval": "Approval",
+            "node": "Node",
+            "time_decided": "Time decided",
+            "decided_by": "Decided by",
+        },
+    ),
+    "blockreplicasummary": Schema(
+        path=["phedex"],
+        levels=[
+            Level("block", {"Block": "name"}),
+            Level("replica", {"Node": "node", "Complete": "complete"}),
+        ],
+    ),
+}
+
 
 class DataSvc:
     """PhEDEx datasvc REST API
@@ -27,6 +382,14 @@ class DataSvc:
         "datasvc_base": "https://cmsweb.cern.ch/phedex/datasvc/",
         # Options: prod, dev, debug
         "phedex_instance": "prod",
+        # Maximum length of the query string of a sharded request
+        "max_query_length": 4000,
+        # Number of concurrent requests when sharding
+        "shard_concurrency": 4,
+        # Number of attempts for each shard
+        "shard_retries": 3,
+        # Number of rows per dataframe when streaming
+        "chunksize": 100000,
     }
 
     def __init__(self, client, datasvc_base=None, phedex_instance=None):
@@ -42,6 +405,185 @@ class DataSvc:
     async def jsonmethod(self, method, **params):
         return await self.client.getjson(url=self.jsonurl.join(method), params=params)
 
+    async def flatmethod(self, method, human_readable=None, **params):
+        """Call a method and flatten the result according to its schema in SCHEMAS"""
+        if type(human_readable) is not bool and human_readable is not None:
+            raise Exception("Wrong human_readable parameter type")
+        resjson = await self.jsonmethod(method, **params)
+        return self.client.postprocess(
+            flatten(resjson, SCHEMAS[method], human_readable)
+        )
+
+    async def iter_xml(self, method, chunksize=None, human_readable=None, **params):
+        """Stream a method through the XML datasvc as dataframe chunks
+
+        The response is parsed incrementally and discarded as it is consumed,
+        so memory use is bounded by the chunk size. Yields dataframes with the
+        same columns as the corresponding json method, where numeric columns
+        are always floating point.
+        Supported methods: data, errorlog, filereplicas, missingfiles
+        """
+        if chunksize is None:
+            chunksize = DataSvc.defaults["chunksize"]
+        if type(human_readable) is not bool and human_readable is not None:
+            raise Exception("Wrong human_readable parameter type")
+        chunks = self.client.iter_bytes(self.xmlurl.join(method), params=params)
+        async for df in flatten_xml(chunks, SCHEMAS[method], chunksize, human_readable):
+            yield df
+
+    async def iter_chunks(self, method, chunksize=None, **params):
+        """Yield the result of a dataframe method in chunks of up to chunksize rows
+
+        Methods supported by :meth:`iter_xml` are streamed, so that memory use is
+        bounded by the chunk size, and their numeric columns are floating point.
+        Other methods are fetched whole and then split.
+        All chunks have the same columns and types.
+        """
+        if chunksize is None:
+            chunksize = DataSvc.defaults["chunksize"]
+        if method in XML_STREAMABLE:
+            chunks = self.iter_xml(method, chunksize, **params)
+        else:
+            chunks = iter_chunks(getattr(self, method)(**params), chunksize)
+        async for df in chunks:
+            yield df
+
+    def shards(self, window=None, **params):
+        """Split query parameters into a list of smaller queries
+
+        A list of nodes is split into one query per node, and a list of blocks,
+        datasets or files is split into batches that keep each query string
+        under ``max_query_length``. Only one of the latter may be a list.
+        If window is given, the range of a ``create_since`` or ``decide_since``
+        parameter (up to the matching ``*_until`` parameter, or now) is split
+        into windows of that many seconds. The split queries are the cartesian
+        product of all splits.
+        """
+        splits = []
+        batched = None
+        fixed = {}
+        for key, value in params.items():
+            if key == "node" and isinstance(value, (list, tuple)):
+                splits.append([{key: node} for node in value])
+            elif key in SHARD_BATCHED and isinstance(value, (list, tuple)):
+                if batched is not None:
+                    raise ValueError(
+                        f"Cannot shard on both {batched!r} and {key!r} lists"
+                    )
+                batched = key
+            elif key not in SHARD_WINDOWS.values() or window is None:
+                fixed[key] = value
+        if window is not None:
+            keys = [key for key in SHARD_WINDOWS if key in params]
+            if len(keys) != 1:
+                raise ValueError(
+                    "Time window sharding needs exactly one of: "
+                    + ", ".join(SHARD_WINDOWS)
+                )
+            since_key, until_key = keys[0], SHARD_WINDOWS[keys[0]]
+            since = int(params[since_key])
+            until = int(params.get(until_key, time.time()))
+            splits.append(
+                [
+                    {since_key: start, until_key: min(start + window, until)}
+                    for start in range(since, until, int(window))
+                ]
+            )
+        if batched is not None:
+            limit = DataSvc.defaults["max_query_length"]
+            used = len(str(httpx.QueryParams(fixed))) + sum(
+                max(len(str(httpx.QueryParams(opt))) + 1 for opt in split)
+                for split in splits
+            )
+            batches, batch, length = [], [], used
+            for value in params[batched]:
+                size = len(str(httpx.QueryParams({batched: value}))) + 1
+                if batch and length + size > limit:
+                    batches.append(batch)
+                    batch, length = [], used
+                batch.append(value)
+                length += size
+            if batch:
+                batches.append(batch)
+            splits.append([{batched: batch} for batch in batches])
+        out = []
+        for combination in itertools.product(*splits):
+            shard = dict(fixed)
+            for item in combination:
+                shard.update(item)
+            out.append(shard)
+        return out
+
+    def _empty(self, method, human_readable=None):
+        """Empty result of a flattened method, with its date and unit columns typed"""
+        schema = SCHEMAS[method]
+        document = {schema.levels[0].key: []}
+        for key in reversed(schema.path):
+            document = {key: document}
+        df = flatten(document, schema)
+        for col in df.columns:
+            if col in schema.dates:
+                df[col] = pandas.to_datetime(df[col].astype(float), unit="s")
+            elif col in schema.units:
+                df[col] = df[col].astype(float)
+        return self.client.postprocess(rename(df, schema, human_readable))
+
+    async def sharded(
+        self, method, window=None, concurrency=None, retries=None, **params
+    ):
+        """Run a dataframe-returning method as several smaller concurrent queries
+
+        The parameters are split according to :meth:`shards`, the shards are run
+        concurrently with each retried independently on failure, and the results
+        are concatenated into a single dataframe.
+        Time windows are half-open: a record exactly on the boundary of two
+        windows is returned by both queries, and only kept from the later one.
+        Only the methods in ``SHARD_WINDOW_COLUMNS`` can be split into windows.
+        Empty results are left out of the concatenation, and if all are empty
+        the result of a method in ``SCHEMAS`` is an empty dataframe with its
+        date and unit columns typed.
+
+        Parameters
+        ----------
+        method         name of the method, e.g. "blockreplicas"
+        window         split the time range into windows of this many seconds
+        concurrency    number of concurrent requests
+        retries        number of attempts for each shard
+        """
+        if concurrency is None:
+            concurrency = DataSvc.defaults["shard_concurrency"]
+        if retries is None:
+            retries = DataSvc.defaults["shard_retries"]
+        func = getattr(self, method)
+        column, until_key, last = None, None, None
+        if window is not None:
+            since_key = next((key for key in SHARD_WINDOWS if key in params), None)
+            column = SHARD_WINDOW_COLUMNS.get(method, {}).get(since_key)
+            if since_key is not None and column is None:
+                raise ValueError(f"Cannot split {method} on {since_key} windows")
+        shards = self.shards(window=window, **params)
+        if window is not None:
+            if params.get("human_readable"):
+                column = SCHEMAS[method].human_readable.get(column, column)
+            until_key = SHARD_WINDOWS[since_key]
+            last = max((shard[until_key] for shard in shards), default=None)
+
+        async def run(shard):
+            df = await retry(lambda: func(**shard), retries)
+            if column is not None and shard[until_key] < last:
+                end = pandas.Timestamp(shard[until_key], unit="s")
+                df = df[df[column] != end]
+            return df
+
+        dfs = await gather(map(run, shards), concurrency)
+        # empty results have untyped columns, that would spoil the others
+        nonempty = [df for df in dfs if len(df)]
+        if nonempty:
+            return pandas.concat(nonempty, ignore_index=True)
+        if method in SCHEMAS:
+            return self._empty(method, params.get("human_readable"))
+        return dfs[0] if dfs else pandas.DataFrame()
+
     async def blockreplicas(self, **params):
         """Get block replicas as a pandas dataframe
 
@@ -79,8 +621,9 @@ class DataSvc:
             record_prefix="replica.",
             meta=["bytes", "files", "name", "id", "is_open"],
         )
-        format_dates(df, ["replica.time_create", "replica.time_update"])
-        return df
+        return self.client.postprocess(
+            df, ["replica.time_create", "replica.time_update"]
+        )
 
     async def nodes(self, **params):
 
@@ -97,10 +640,9 @@ class DataSvc:
             record_prefix="node.",
         )
 
-        return df
+        return self.client.postprocess(df)
 
     async def data(self, human_readable=None, **params):
-
         """Shows data which is registered (injected) to phedex
         Parameters
         ----------
@@ -113,47 +655,9 @@ class DataSvc:
                                  when level = 'file', return data of which files were created since this time
         create_since             when no parameters are given, default create_since is set to one day ago
         """
-        if type(human_readable) is not bool and human_readable is not None:
-            raise Exception("Wrong human_readable parameter type")
-        resjson = await self.jsonmethod("data", **params)
-        out = []
-        for _instance in resjson["phedex"]["dbs"]:
-            for _dataset in _instance["dataset"]:
-                for _block in _dataset["block"]:
-                    for _file in _block["file"]:
-                        out.append(
-                            {
-                                "Dataset": _dataset["name"],
-                                "Is_dataset_open": _dataset["is_open"],
-                                "block_Name": _block["name"],
-                                "Block_size_(GB)": _block["bytes"] / 1000000000.0,
-                                "Time_block_was_created": _block["time_create"],
-                                "File_name": _file["lfn"],
-                                "File_checksum": _file["checksum"],
-                                "File_size": _file["size"] / 1000000000.0,
-                                "Time_file_was_created": _file["time_create"],
-                            }
-                        )
-        df = pandas.json_normalize(out)
-        format_dates(df, ["Time_file_was_created", "Time_block_was_created"])
-        if human_readable:
-            mapping = {
-                "Is_dataset_open": "Is dataset open",
-                "block_Name": "Block Name",
-                "Block_size_(GB)": "Block size (GB)",
-                "Time_block_was_created": "Time Block Was Created",
-                "File_name": "File Name",
-                "File_checksum": "File Checksum",
-                "File_size": "File Size (GB)",
-                "Time_file_was_created": "Time File Was Created",
-            }
-            df2 = df.rename(columns=mapping)
-            return df2
-        else:
-            return df
+        return await self.flatmethod("data", human_readable, **params)
 
     async def errorlog(self, human_readable=None, **params):
-
         """Return detailed transfer error information, including logs of the transfer and validation commands.
         Note that phedex only stores the last 100 errors per link, so more errors may have occurred then indicated by this API
         call.
@@ -168,46 +672,9 @@ class DataSvc:
         dataset          dataset name
         lfn              logical file name
         """
-        if type(human_readable) is not bool and human_readable is not None:
-            raise Exception("Wrong human_readable parameter type")
-        resjson = await self.jsonmethod("errorlog", **params)
-        out = []
-        for _instance in resjson["phedex"]["link"]:
-            for _block in _instance["block"]:
-                for _file in _block["file"]:
-                    for _transfer_error in _file["transfer_error"]:
-                        out.append(
-                            {
-                                "Link": _instance["from"] + " to " + _instance["to"],
-                                "LFN": _file["name"],
-                                "file_Checksum": _file["checksum"],
-                                "file_size_(GB)": _file["size"] / 1000000000.0,
-                                "Block_name": _block["name"],
-                                "Error_log": str(_transfer_error["detail_log"]["$t"]),
-                                "From_PFN": _transfer_error["from_pfn"],
-                                "To_PFN": _transfer_error["to_pfn"],
-                                "Time": _transfer_error["time_done"],
-                            }
-                        )
-        df = pandas.json_normalize(out)
-        format_dates(df, ["Time"])
-        if human_readable:
-            mapping = {
-                "From_PFN": "From PFN",
-                "To_PFN": "To PFN",
-                "Error_log": "Error Log",
-                "Block_Name": "Block Name",
-                "Block_size_(GB)": "Block size (GB)",
-                "file_checksum": "File Checksum",
-                "file_size_(GB)": "File Size (GB)",
-            }
-            df2 = df.rename(columns=mapping)
-            return df2
-        else:
-            return df
+        return await self.flatmethod("errorlog", human_readable, **params)
 
     async def blockarrive(self, human_readable=None, **params):
-
         """Return estimated time of arrival for blocks currently subscribed for transfer. If the estimated time of arrival (ETA)
         cannot be calculated, or the block will never arrive, a reason for the missing estimate is provided.
         Parameters
@@ -223,43 +690,9 @@ class DataSvc:
         arrive_after          only show blocks that are expected to arrive after this time.
 
         """
-        if type(human_readable) is not bool and human_readable is not None:
-            raise Exception("Wrong human_readable parameter type")
-        resjson = await self.jsonmethod("blockarrive", **params)
-        out = []
-        for _block in resjson["phedex"]["block"]:
-            for _destination in _block["destination"]:
-                out.append(
-                    {
-                        "Block_Name": _block["name"],
-                        "Destination": _destination["name"],
-                        "Time_Arrive": _destination["time_arrive"],
-                        "Time_update": _destination["time_update"],
-                        "Number_of_files": _destination["files"],
-                        "Block_size_(GB)": _destination["bytes"] / 1000000000.0,
-                        "Basis_code": BLOCKARRIVE_BASISCODE.get(
-                            _destination["basis"], "No code specified"
-                        ),
-                    }
-                )
-        df = pandas.json_normalize(out)
-        format_dates(df, ["Time_Arrive", "Time_update"])
-        if human_readable:
-            mapping = {
-                "Block_Name": "Block Name",
-                "Block_size_(GB)": "Block size (GB)",
-                "Time_Arrive": "Time Arrive",
-                "Time_update": "Time Update",
-                "Number_of_files": "Number Of Files",
-                "Basis_code": "Basis Code",
-            }
-            df2 = df.rename(columns=mapping)
-            return df2
-        else:
-            return df
+        return await self.flatmethod("blockarrive", human_readable, **params)
 
     async def filereplicas(self, human_readable=None, **params):
-
         """Serves the file replicas known to phedex.
         Parameters
         ----------
@@ -286,43 +719,7 @@ class DataSvc:
         group          group name.  default is to return replicas for any group.
         lfn            logical file name
         """
-        if type(human_readable) is not bool and human_readable is not None:
-            raise Exception("Wrong human_readable parameter type")
-        resjson = await self.jsonmethod("filereplicas", **params)
-        out = []
-        for _block in resjson["phedex"]["block"]:
-            for _file in _block["file"]:
-                for _replica in _file["replica"]:
-                    out.append(
-                        {
-                            "Block_name": _block["name"],
-                            "Files": _block["files"],
-                            "Block_size_(GB)": _block["bytes"] / 1000000000.0,
-                            "lfn": _file["name"],
-                            "Checksum": _file["checksum"],
-                            "File_created_on": _file["time_create"],
-                            "File_replica_at": _replica["node"],
-                            "File_subcribed": _replica["subscribed"],
-                            "Custodial": _replica["custodial"],
-                            "Group": _replica["group"],
-                            "File_in_node_since": _replica["time_create"],
-                        }
-                    )
-        df = pandas.json_normalize(out)
-        format_dates(df, ["File_created_on", "File_in_node_since"])
-        if human_readable is True:
-            mapping = {
-                "Block_name": "Block Name",
-                "Block_size_(GB)": "Block size (GB)",
-                "File_created_on": "File Created On",
-                "File_replica_at": "File Replica At",
-                "File_subcribed": "File Subcribed",
-                "File_in_node_since": "File In Node Since",
-            }
-            df2 = df.rename(columns=mapping)
-            return df2
-        else:
-            return df
+        return await self.flatmethod("filereplicas", human_readable, **params)
 
     async def agentlogs(self, human_readable=None, **params):
         """Show messages from the agents.
@@ -337,39 +734,7 @@ class DataSvc:
         pid               process id of agent
         update_since      ower bound of time to show log messages. Default last 24 h.
         """
-        if type(human_readable) is not bool and human_readable is not None:
-            raise Exception("Wrong human_readable parameter type")
-        resjson = await self.jsonmethod("agentlogs", **params)
-        out = []
-        for _agent in resjson["phedex"]["agent"]:
-            for _node in _agent["node"]:
-                node = _node["name"]
-                for _log in _agent["log"]:
-                    out.append(
-                        {
-                            "Agent": _agent["name"],
-                            "Host": _agent["host"],
-                            "PID": _agent["pid"],
-                            "Node": node,
-                            "User": _agent["user"],
-                            "Reason": _log["reason"],
-                            "Time": _log["time"],
-                            "state_dir": _log["state_dir"],
-                            "working_dir": _log["working_dir"],
-                            "Message": str(_log["message"]["$t"]),
-                        }
-                    )
-        df = pandas.json_normalize(out)
-        format_dates(df, ["Time"])
-        if human_readable is True:
-            mapping = {
-                "state_dir": "State Directory",
-                "working_dir": "Working Directory",
-            }
-            df2 = df.rename(columns=mapping)
-            return df2
-        else:
-            return df
+        return await self.flatmethod("agentlogs", human_readable, **params)
 
     async def missingfiles(self, human_readable=None, **params):
         """Show files which are missing from blocks at a node.
@@ -388,53 +753,7 @@ class DataSvc:
 
         (*) either block or lfn is required
         """
-
-        resjson = await self.jsonmethod("missingfiles", **params)
-        out = []
-        if human_readable is not None and type(human_readable) is not bool:
-            print("Wrong human_readable parameter type")
-            df = pandas.json_normalize(out)
-            return df
-        elif human_readable is None or human_readable is False:
-            for _block in resjson["phedex"]["block"]:
-                for _file in _block["file"]:
-                    for _missing in _file["missing"]:
-                        out.append(
-                            {
-                                "block_name": _block["name"],
-                                "file_name": _file["name"],
-                                "checksum": _file["checksum"],
-                                "size": _file["bytes"],
-                                "created": _file["time_create"],
-                                "origin_node": _file["origin_node"],
-                                "missing_from": _missing["node_name"],
-                                "disk": _missing["se"],
-                                "custodial": _missing["custodial"],
-                                "subscribed": _missing["subscribed"],
-                            }
-                        )
-            df = pandas.json_normalize(out)
-            return format_dates(df, ["created"])
-        elif human_readable is True:
-            for _block in resjson["phedex"]["block"]:
-                for _file in _block["file"]:
-                    for _missing in _file["missing"]:
-                        out.append(
-                            {
-                                "Block Name": _block["name"],
-                                "File Name": _file["name"],
-                                "checksum": _file["checksum"],
-                                "Size of file": _file["bytes"],
-                                "Time created": _file["time_create"],
-                                "Origin Node": _file["origin_node"],
-                                "Missing from": _missing["node_name"],
-                                "Disk": _missing["se"],
-                                "Custodial?": _missing["custodial"],
-                                "Subscribed?": _missing["subscribed"],
-                            }
-                        )
-            df = pandas.json_normalize(out)
-            return format_dates(df, ["Time created"])
+        return await self.flatmethod("missingfiles", human_readable, **params)
 
     async def agents(self, human_readable=None, **params):
         """Serves information about running (or at least recently running) phedex agents.
@@ -450,44 +769,7 @@ class DataSvc:
         update_since     updated since this time
         detail           'y' or 'n', default 'n'. show "code" information at file level *
         """
-        resjson = await self.jsonmethod("agents", **params)
-        out = []
-        if human_readable is not None and type(human_readable) is not bool:
-            print("Wrong human_readable parameter type")
-            df = pandas.json_normalize(out)
-            return df
-        elif human_readable is None or human_readable is False:
-            for _node in resjson["phedex"]["node"]:
-                for _agent in _node["agent"]:
-                    out.append(
-                        {
-                            "Node": _node["node"],
-                            "Host": _node["host"],
-                            "Agent_name": _node["name"],
-                            "Agent_label": _agent["label"],
-                            "Time_update": _agent["time_update"],
-                            "state_dir": _agent["state_dir"],
-                            "version": _agent["version"],
-                        }
-                    )
-            df = pandas.json_normalize(out)
-            return format_dates(df, ["Time_update"])
-        elif human_readable is True:
-            for _node in resjson["phedex"]["node"]:
-                for _agent in _node["agent"]:
-                    out.append(
-                        {
-                            "Node": _node["node"],
-                            "Host": _node["host"],
-                            "Agent name": _node["name"],
-                            "Agent label": _agent["label"],
-                            "Time update": _agent["time_update"],
-                            "Directory": _agent["state_dir"],
-                            "Version": _agent["version"],
-                        }
-                    )
-            df = pandas.json_normalize(out)
-            return format_dates(df, ["Time update"])
+        return await self.flatmethod("agents", human_readable, **params)
 
     async def blocklatency(self, human_readable=None, **params):
         """Show authentication state and abilities
@@ -500,80 +782,7 @@ class DataSvc:
         require_passwd if passed then the call will die if the user is not
                        authenticated by password
         """
-        resjson = await self.jsonmethod("blocklatency", **params)
-        out = []
-        if human_readable is not None and type(human_readable) is not bool:
-            print("Wrong human_readable parameter type")
-            df = pandas.json_normalize(out)
-            return df
-        elif human_readable is None or human_readable is False:
-            for _block in resjson["phedex"]["block"]:
-                for _destination in _block["destination"]:
-                    for _latency in _destination["latency"]:
-                        out.append(
-                            {
-                                "Block": _block["name"],
-                                "Block_ID": _block["id"],
-                                "Dataset": _block["dataset"],
-                                "Size": _block["bytes"],
-                                "Time_create": _block["time_create"],
-                                "Number_of_files": _block["files"],
-                                "Time_update": _block["time_update"],
-                                "Destination": _destination["name"],
-                                "custodial": _latency["is_custodial"],
-                                "last_suspend": _latency["last_suspend"],
-                                "last_replica": _latency["last_replica"],
-                                "time_subscription": _latency["time_subscription"],
-                                "block_closed": _latency["block_close"],
-                                "latency": _latency["latency"],
-                            }
-                        )
-            df = pandas.json_normalize(out)
-            return format_dates(
-                df,
-                [
-                    "Time_update",
-                    "last_suspend",
-                    "last_replica",
-                    "time_subscription",
-                    "block_closed",
-                    "Time_create",
-                ],
-            )
-        elif human_readable is True:
-            for _block in resjson["phedex"]["block"]:
-                for _destination in _block["destination"]:
-                    for _latency in _destination["latency"]:
-                        out.append(
-                            {
-                                "Block": _block["name"],
-                                "Block ID": _block["id"],
-                                "Dataset": _block["dataset"],
-                                "Size": _block["bytes"],
-                                "Time Create": _block["time_create"],
-                                "Number of files": _block["files"],
-                                "Time Update": _block["time_update"],
-                                "Destination": _destination["name"],
-                                "custodial": _latency["is_custodial"],
-                                "Last Suspend": _latency["last_suspend"],
-                                "Last Replica": _latency["last_replica"],
-                                "Time Subscription": _latency["time_subscription"],
-                                "Block Closed": _latency["block_close"],
-                                "Latency": _latency["latency"],
-                            }
-                        )
-            df = pandas.json_normalize(out)
-            return format_dates(
-                df,
-                [
-                    "Time Update",
-                    "Last Suspend",
-                    "Last Replica",
-                    "Time Subscription",
-                    "Block Closed",
-                    "Time Create",
-                ],
-            )
+        return await self.flatmethod("blocklatency", human_readable, **params)
 
     async def requestlist(self, human_readable=None, **params):
         """Serve as a simple request search and cache-able catalog of requests to save within a client,
@@ -599,45 +808,7 @@ class DataSvc:
         * could be multiple and/or with wildcard
         ** when both 'block' and 'dataset' are present, they form a logical disjunction (ie. or)
         """
-        resjson = await self.jsonmethod("requestlist", **params)
-        out = []
-        if human_readable is not None and type(human_readable) is not bool:
-            df = pandas.json_normalize(out)
-            raise Exception("Wrong human_readable parameter type")
-            return df
-        elif human_readable is None or human_readable is False:
-            for _request in resjson["phedex"]["request"]:
-                for _node in _request["node"]:
-                    out.append(
-                        {
-                            "request_id": _request["id"],
-                            "time_created": _request["time_create"],
-                            "requested_by": _request["requested_by"],
-                            "approval": _request["approval"],
-                            "node": _node["name"],
-                            "time_decided": _node["time_decided"],
-                            "decided_by": _node["decided_by"],
-                        }
-                    )
-            df = pandas.json_normalize(out)
-            return format_dates(df, ["time_created", "time_decided"])
-
-        else:
-            for _request in resjson["phedex"]["request"]:
-                for _node in _request["node"]:
-                    out.append(
-                        {
-                            "Request ID": _request["id"],
-                            "Time Created": _request["time_create"],
-                            "Requested by": _request["requested_by"],
-                            "Approval": _request["approval"],
-                            "Node": _node["name"],
-                            "Time decided": _node["time_decided"],
-                            "Decided by": _node["decided_by"],
-                        }
-                    )
-            df = pandas.json_normalize(out)
-            return format_dates(df, ["Time Created", "Time decided"])
+        return await self.flatmethod("requestlist", human_readable, **params)
 
     async def blockreplicasummary(self, human_readable=None, **params):
         """Show authentication state and abilities
@@ -650,21 +821,4 @@ class DataSvc:
         require_passwd if passed then the call will die if the user is not
                        authenticated by password
         """
-        resjson = await self.jsonmethod("blockreplicasummary", **params)
-        out = []
-        if human_readable is not None and type(human_readable) is not bool:
-            print("Wrong human_readable parameter type")
-            df = pandas.json_normalize(out)
-            return df
-        else:
-            for _block in resjson["phedex"]["block"]:
-                for _replica in _block["replica"]:
-                    out.append(
-                        {
-                            "Block": _block["name"],
-                            "Node": _replica["node"],
-                            "Complete": _replica["complete"],
-                        }
-                    )
-            df = pandas.json_normalize(out)
-            return df
+        return await self.flatmethod("blockreplicasummary", human_readable, **params)
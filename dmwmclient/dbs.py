@@ -1,5 +1,24 @@
+import itertools
+import logging
 import httpx
 import pandas
+from .asyncutil import TTLCache, completed, gather, retry
+from .util import conform, iter_json_array
+from .lumimask import FileLumiIndex
+
+
+logger = logging.getLogger(__name__)
+
+
+# Methods that can be split into one query per block of a dataset
+BLOCK_SHARDED = ("files", "filelumis", "filesummaries", "runs")
+# Date columns of DBS records
+DATES = ["creation_date", "last_modification_date"]
+# Lineage direction: (DBS method, key of the related dataset in each record)
+LINEAGE = {
+    "parents": ("datasetparents", "parent_dataset"),
+    "children": ("datasetchildren", "child_dataset"),
+}
 
 
 class DBS:
@@ -11,6 +30,20 @@ class DBS:
     defaults = {
         # DBS REST endpoint URL with trailing slash
         "dbs_base": "https://cmsweb.cern.ch/dbs/prod/global/DBSReader/",
+        # Seconds before a streamed query times out, applies to each read
+        "timeout": 30,
+        # Number of concurrent shard queries
+        "concurrency": 8,
+        # Number of attempts for each shard query
+        "retries": 3,
+        # Number of runs per shard when splitting a run range
+        "run_shard": 500,
+        # Maximum number of items in each bulk POST request
+        "bulk_batchsize": 1000,
+        # Lifetime in seconds of cached dataset parents and children
+        "lineage_ttl": 3600,
+        # Maximum number of cached dataset parents and children lists
+        "lineage_cachesize": 100000,
     }
 
     def __init__(self, client, dbs_base=None):
@@ -18,15 +51,312 @@ class DBS:
             dbs_base = DBS.defaults["dbs_base"]
         self.client = client
         self.baseurl = httpx.URL(dbs_base)
+        self._lineage = TTLCache(
+            DBS.defaults["lineage_ttl"], DBS.defaults["lineage_cachesize"]
+        )
 
     async def jsonmethod(self, method, **params):
         return await self.client.getjson(url=self.baseurl.join(method), params=params)
 
+    async def postjson(self, method, data, timeout=None, retries=1):
+        """Submit a POST request with a json body to a DBS method and decode the json result"""
+        request = self.client.build_request(
+            method="POST", url=self.baseurl.join(method), json=data
+        )
+        result = await self.client.send(request, timeout=timeout, retries=retries)
+        if result.status_code != 200:
+            raise IOError(
+                f"Failed to execute request {request}, result: ({result.status_code}) {result.text}"
+            )
+        return result.json()
+
+    async def iter_json(self, method, **params):
+        """Stream the records of a DBS method as they arrive"""
+        chunks = self.client.iter_bytes(
+            self.baseurl.join(method), params=params, timeout=DBS.defaults["timeout"]
+        )
+        async for records in iter_json_array(chunks):
+            for record in records:
+                yield record
+
     async def pandasmethod(self, method, **params):
-        req = self.client.build_request(
-            method="GET",
-            url=self.baseurl.join(method),
-            params=params,
+        """Get the records of a DBS method as a pandas dataframe
+
+        The response is decoded as it arrives, rather than read whole, so the
+        read timeout applies to each chunk of the response.
+        """
+        chunks = self.client.iter_bytes(
+            self.baseurl.join(method), params=params, timeout=DBS.defaults["timeout"]
+        )
+        records = [r async for records in iter_json_array(chunks) for r in records]
+        return pandas.DataFrame.from_records(records)
+
+    async def shards(self, method, **params):
+        """Split query parameters into a list of smaller queries
+
+        For the methods in BLOCK_SHARDED, a ``dataset`` query is split into one
+        query per block. A ``run_num`` given as a (first, last) tuple is split
+        into ranges of ``run_shard`` runs. The split queries are the cartesian
+        product of both splits.
+        """
+        splits = []
+        if (
+            method in BLOCK_SHARDED
+            and "dataset" in params
+            and "block_name" not in params
+        ):
+            dataset = params.pop("dataset")
+            blocks = await retry(
+                lambda: self.jsonmethod("blocks", dataset=dataset),
+                DBS.defaults["retries"],
+            )
+            splits.append([{"block_name": block["block_name"]} for block in blocks])
+        if isinstance(params.get("run_num"), tuple):
+            first, last = params.pop("run_num")
+            step = DBS.defaults["run_shard"]
+            splits.append(
+                [
+                    {"run_num": f"{start}-{min(start + step - 1, last)}"}
+                    for start in range(first, last + 1, step)
+                ]
+            )
+        out = []
+        for combination in itertools.product(*splits):
+            shard = dict(params)
+            for item in combination:
+                shard.update(item)
+            out.append(shard)
+        return out
+
+    def _frame(self, records):
+        df = pandas.DataFrame.from_records(records)
+        return self.client.postprocess(df, [col for col in DATES if col in df.columns])
+
+    async def _shard(self, method, shard, retries):
+        async def fetch():
+            chunks = self.client.iter_bytes(
+                self.baseurl.join(method), params=shard, timeout=DBS.defaults["timeout"]
+            )
+            return [r async for records in iter_json_array(chunks) for r in records]
+
+        return self._frame(await retry(fetch, retries))
+
+    async def sharded(self, method, concurrency=None, retries=None, **params):
+        """Run a DBS method as several smaller concurrent queries
+
+        The parameters are split according to :meth:`shards`, each shard is
+        streamed and retried independently on failure, and the results are
+        concatenated into a single dataframe. Date columns are converted to datetime.
+
+        Parameters
+        ----------
+        method         DBS method, e.g. "files", "filelumis" or "blocks"
+        concurrency    number of concurrent requests
+        retries        number of attempts for each shard
+        params         DBS method parameters
+        """
+        if concurrency is None:
+            concurrency = DBS.defaults["concurrency"]
+        if retries is None:
+            retries = DBS.defaults["retries"]
+        shards = await self.shards(method, **params)
+        logger.debug(f"Running {method} as {len(shards)} shards")
+        dfs = await gather(
+            (self._shard(method, shard, retries) for shard in shards), concurrency
+        )
+        return pandas.concat(dfs, ignore_index=True) if dfs else self._frame([])
+
+    async def iter_chunks(self, method, concurrency=None, retries=None, **params):
+        """Run a DBS method as in :meth:`sharded`, yielding each shard's dataframe as it completes
+
+        Only the shards being fetched or not yet consumed are held in memory.
+        Chunks have the columns of the first one, and are cast to its types where possible.
+        """
+        if concurrency is None:
+            concurrency = DBS.defaults["concurrency"]
+        if retries is None:
+            retries = DBS.defaults["retries"]
+        shards = await self.shards(method, **params)
+        first = None
+        coroutines = [self._shard(method, shard, retries) for shard in shards]
+        async for df in completed(coroutines, concurrency):
+            df = conform(df, first)
+            if first is None:
+                first = df
+            yield df
+        if first is None:
+            yield self._frame([])
+
+    async def bulk(
+        self,
+        method,
+        key,
+        values,
+        batchsize=None,
+        concurrency=None,
+        retries=None,
+        **params,
+    ):
+        """Look up many items with a POST-style DBS method
+
+        The distinct values are split into batches of up to ``bulk_batchsize``,
+        submitted concurrently, and the results concatenated into one dataframe.
+
+        Parameters
+        ----------
+        method         DBS method accepting a list in a POST body, e.g. "fileArray"
+        key            name of the list parameter, e.g. "logical_file_name"
+        values         list of items to look up
+        batchsize      maximum number of items per request
+        concurrency    number of concurrent requests
+        retries        number of attempts for each request
+        params         additional parameters sent with each batch
+        """
+        if batchsize is None:
+            batchsize = DBS.defaults["bulk_batchsize"]
+        if concurrency is None:
+            concurrency = DBS.defaults["concurrency"]
+        if retries is None:
+            retries = DBS.defaults["retries"]
+        values = list(dict.fromkeys(values))
+        batches = []
+        for start in range(0, len(values), batchsize):
+            stop = start + batchsize
+            batches.append(values[start:stop])
+
+        async def fetch(batch):
+            data = dict(params)
+            data[key] = batch
+            return await retry(lambda: self.postjson(method, data), retries)
+
+        results = await gather(map(fetch, batches), concurrency)
+        logger.debug(
+            f"Looked up {len(values)} items in {len(batches)} {method} requests"
         )
-        res = await self.client.send(req, timeout=30)
-        return pandas.read_json(res.content)
+        return self._frame([record for result in results for record in result])
+
+    async def file_array(self, lfns, detail=True, **params):
+        """Get file information for many logical file names as a pandas dataframe
+
+        Parameters
+        ----------
+        lfns           list of logical file names
+        detail         if True, return all file attributes
+        params         any other fileArray parameter, e.g. validFileOnly
+        """
+        if detail:
+            params["detail"] = 1
+        return await self.bulk("fileArray", "logical_file_name", lfns, **params)
+
+    async def block_parents(self, blocks):
+        """Get the parent blocks of many blocks as a pandas dataframe
+
+        Parameters
+        ----------
+        blocks         list of block names
+        """
+        return await self.bulk("blockparents", "block_name", blocks)
+
+    async def file_parents(self, lfns):
+        """Get the parent files of many logical file names as a pandas dataframe
+
+        Parameters
+        ----------
+        lfns           list of logical file names
+        """
+        return await self.bulk("fileparents", "logical_file_name", lfns)
+
+    async def lumi_index(self, concurrency=None, retries=None, **params):
+        """Get the lumi ranges of each file as a FileLumiIndex
+
+        The filelumis query is sharded as in :meth:`sharded`, and each shard is
+        compressed into lumi ranges as it arrives.
+
+        Parameters
+        ----------
+        params         filelumis parameters, e.g. dataset, block_name or run_num
+        """
+        parts = []
+        async for df in self.iter_chunks(
+            "filelumis", concurrency=concurrency, retries=retries, **params
+        ):
+            if len(df):
+                parts.append(FileLumiIndex.from_filelumis(df))
+        return FileLumiIndex.concat(parts)
+
+    async def relatives(self, dataset, direction="parents"):
+        """Sorted list of the parent or child datasets of a dataset
+
+        Results are cached, and shared by all callers, for ``lineage_ttl`` seconds
+        """
+        method, key = LINEAGE[direction]
+
+        async def fetch():
+            result = await retry(
+                lambda: self.jsonmethod(method, dataset=dataset),
+                DBS.defaults["retries"],
+            )
+            return sorted({item[key] for item in result})
+
+        return await self._lineage.get((direction, dataset), fetch)
+
+    async def lineage(
+        self, datasets, direction="parents", depth=None, concurrency=None
+    ):
+        """Walk the dataset parentage graph breadth-first
+
+        All datasets of each generation are looked up concurrently, and each
+        dataset is looked up once even when shared by several lineages.
+
+        Parameters
+        ----------
+        datasets       dataset name, can be multiple
+        direction      "parents", "children" or "both"
+        depth          maximum number of generations, default is unlimited
+        concurrency    number of concurrent requests
+
+        Returns a pandas dataframe of edges with columns:
+            child          child dataset
+            parent         parent dataset
+            generation     number of steps from the nearest starting dataset to
+                           the farther end of the edge
+        """
+        if isinstance(datasets, str):
+            datasets = [datasets]
+        if concurrency is None:
+            concurrency = DBS.defaults["concurrency"]
+        directions = ["parents", "children"] if direction == "both" else [direction]
+        for item in directions:
+            if item not in LINEAGE:
+                raise ValueError(f"Unknown lineage direction {item!r}")
+        seen = set(datasets)
+        frontier = sorted(seen)
+        edges = set()
+        out = {"child": [], "parent": [], "generation": []}
+        generation = 0
+        while frontier and (depth is None or generation < depth):
+            generation += 1
+            queries = [(dataset, item) for dataset in frontier for item in directions]
+            results = await gather(
+                (self.relatives(dataset, item) for dataset, item in queries),
+                concurrency,
+            )
+            frontier = set()
+            for (dataset, item), relatives in zip(queries, results):
+                for relative in relatives:
+                    edge = (
+                        (dataset, relative)
+                        if item == "parents"
+                        else (relative, dataset)
+                    )
+                    if edge not in edges:
+                        edges.add(edge)
+                        out["child"].append(edge[0])
+                        out["parent"].append(edge[1])
+                        out["generation"].append(generation)
+                    if relative not in seen:
+                        seen.add(relative)
+                        frontier.add(relative)
+            frontier = sorted(frontier)
+        logger.debug(f"Found {len(edges)} lineage edges in {generation} generations")
+        return pandas.DataFrame(out)
@@ -0,0 +1,239 @@
+import asyncio
+import logging
+import sqlite3
+import zlib
+import numpy
+import pandas
+from .asyncutil import TTLCache
+
+
+logger = logging.getLogger(__name__)
+
+
+KEY = ["site", "dataset"]
+# Change of a (site, dataset) between two cycles, by decision in the later cycle
+CHANGES = {
+    "delete": "newly_deleted",
+    "protect": "newly_protected",
+    "keep": "newly_kept",
+}
+
+
+# Stands for a missing value in packed string columns
+_NULL = "\0"
+
+
+def _pack_strings(values):
+    values = [value if isinstance(value, str) else _NULL for value in values.tolist()]
+    return zlib.compress("\n".join(values).encode(), 1)
+
+
+def _unpack_strings(blob, n):
+    if not n:
+        return []
+    values = zlib.decompress(blob).decode().split("\n")
+    return [None if value == _NULL else value for value in values]
+
+
+def _pack_array(values, dtype):
+    return zlib.compress(numpy.ascontiguousarray(values, dtype=dtype).tobytes(), 1)
+
+
+def _unpack_array(blob, dtype):
+    return numpy.frombuffer(zlib.decompress(blob), dtype=dtype)
+
+
+def diff(before, after):
+    """Changes of detox decisions between two snapshots
+
+    Parameters
+    ----------
+        before, after : pandas.DataFrame
+            outputs of Dynamo.snapshot
+
+    Returns a dataframe with one row per (site, dataset) whose decision changed,
+    including datasets only in one of the snapshots, with columns site, dataset,
+    size_before, size_after, decision_before, decision_after and change, one of
+    newly_deleted, newly_protected, newly_kept (decision changed to delete,
+    protect or keep, or the dataset is new at the site with that decision) and
+    gone (the dataset is no longer at the site)
+    """
+    columns = KEY + ["size", "decision"]
+    merged = before[columns].merge(
+        after[columns],
+        on=KEY,
+        how="outer",
+        suffixes=("_before", "_after"),
+        indicator=True,
+    )
+    decision_before = merged["decision_before"].astype(object).to_numpy()
+    decision_after = merged["decision_after"].astype(object).to_numpy()
+    gone = (merged["_merge"] == "left_only").to_numpy()
+    same = (decision_before == decision_after) | (
+        pandas.isna(decision_before) & pandas.isna(decision_after)
+    )
+    changed = gone | ~same
+    change = numpy.select(
+        [gone] + [decision_after == decision for decision in CHANGES],
+        ["gone"] + list(CHANGES.values()),
+        default=None,
+    )
+    out = merged[changed].drop(columns="_merge").reset_index(drop=True)
+    for col in ("site", "decision_before", "decision_after"):
+        out[col] = out[col].astype("category")
+    out["change"] = pandas.Categorical(
+        change[changed], categories=list(CHANGES.values()) + ["gone"]
+    )
+    return out
+
+
+class DetoxSnapshots:
+    """Local cache of Dynamo detox snapshots
+
+    The results of a detox cycle do not change once published, so each cycle
+    is fetched once with Dynamo.snapshot and stored in SQLite, as one row per
+    (cycle, site) holding compressed columns, so that a cycle of a million
+    datasets loads in a fraction of a second. The most recently used snapshots
+    are also kept in memory.
+
+    Usage::
+
+        snapshots = DetoxSnapshots(client.dynamo, "detox.db")
+        changes = await snapshots.diff(34068, 34069)
+        changes[changes["change"] == "newly_deleted"]
+    """
+
+    defaults = {
+        # Number of snapshots kept in memory
+        "cachesize": 4,
+    }
+
+    def __init__(self, dynamo, path=":memory:", cachesize=None):
+        """
+        Parameters
+        ----------
+        dynamo         Dynamo instance
+        path           SQLite database file, default is in memory only
+        cachesize      number of snapshots kept in memory
+        """
+        if cachesize is None:
+            cachesize = DetoxSnapshots.defaults["cachesize"]
+        self.dynamo = dynamo
+        self._db = sqlite3.connect(path)
+        self._cache = TTLCache(None, cachesize)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS detox (cycle, site, rows, dataset, size, decision, condition_id, PRIMARY KEY (cycle, site))"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS conditions (cycle, condition_id, condition, PRIMARY KEY (cycle, condition_id))"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cycles (cycle PRIMARY KEY, sites, datasets)"
+            )
+
+    def close(self):
+        self._db.close()
+
+    def cycles(self):
+        """Sorted list of the locally stored cycles"""
+        return [
+            row[0]
+            for row in self._db.execute("SELECT cycle FROM cycles ORDER BY cycle")
+        ]
+
+    def _load(self, cycle):
+        sites, columns = [], {"dataset": [], "size": [], "decision": [], "code": []}
+        for site, n, dataset, size, decision, code in self._db.execute(
+            "SELECT site, rows, dataset, size, decision, condition_id FROM detox WHERE cycle = ? ORDER BY rowid",
+            [cycle],
+        ):
+            sites.append((site, n))
+            columns["dataset"].extend(_unpack_strings(dataset, n))
+            columns["size"].append(_unpack_array(size, numpy.float64))
+            columns["decision"].extend(_unpack_strings(decision, n))
+            columns["code"].append(_unpack_array(code, numpy.int64))
+        conditions = dict(
+            self._db.execute(
+                "SELECT condition_id, condition FROM conditions WHERE cycle = ?",
+                [cycle],
+            )
+        )
+        code = numpy.concatenate(columns["code"] + [numpy.array([], dtype=numpy.int64)])
+        counts = [n for _, n in sites]
+        decision = pandas.Categorical(columns["decision"])
+        df = pandas.DataFrame(
+            {
+                "cycle": cycle,
+                "site": pandas.Categorical.from_codes(
+                    numpy.repeat(numpy.arange(len(sites)), counts),
+                    categories=[site for site, _ in sites],
+                ),
+                "dataset": columns["dataset"],
+                "size": numpy.concatenate(columns["size"] + [numpy.array([])]),
+                "decision": decision,
+                "condition_id": pandas.arrays.IntegerArray(code, code < 0),
+            }
+        )
+        df["condition"] = df["condition_id"].map(conditions).astype("category")
+        return df
+
+    def _store(self, cycle, df):
+        rows = []
+        for site, group in df.groupby("site", observed=True, sort=False):
+            rows.append(
+                (
+                    cycle,
+                    site,
+                    len(group),
+                    _pack_strings(group["dataset"]),
+                    _pack_array(group["size"], numpy.float64),
+                    _pack_strings(group["decision"]),
+                    _pack_array(group["condition_id"].fillna(-1), numpy.int64),
+                )
+            )
+        conditions = (
+            df[["condition_id", "condition"]]
+            .dropna()
+            .drop_duplicates("condition_id")
+            .astype(object)
+        )
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO detox VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            self._db.executemany(
+                "INSERT OR REPLACE INTO conditions VALUES (?, ?, ?)",
+                (
+                    (cycle, int(i), text)
+                    for i, text in conditions.itertuples(index=False)
+                ),
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO cycles VALUES (?, ?, ?)",
+                (cycle, len(rows), len(df)),
+            )
+
+    async def snapshot(self, cycle):
+        """Snapshot of a cycle as Dynamo.snapshot, from the local store if available"""
+        cycle = int(cycle)
+
+        async def fetch():
+            stored = self._db.execute(
+                "SELECT 1 FROM cycles WHERE cycle = ?", [cycle]
+            ).fetchone()
+            if stored:
+                return self._load(cycle)
+            df = await self.dynamo.snapshot(cycle)
+            self._store(cycle, df)
+            logger.debug(f"Stored detox cycle {cycle} with {len(df)} datasets")
+            return df
+
+        return await self._cache.get(cycle, fetch)
+
+    async def diff(self, before, after):
+        """Changes of detox decisions between two cycles, see diff"""
+        before, after = await asyncio.gather(
+            self.snapshot(before), self.snapshot(after)
+        )
+        return diff(before, after)
@@ -1,7 +1,17 @@
+import logging
 import httpx
+import numpy
 import pandas
 import datetime
-from .util import format_dates
+from .asyncutil import TTLCache, gather, retry
+from .util import iter_chunks
+
+
+logger = logging.getLogger(__name__)
+
+
+# Dataset fields of detox/sitedetail kept in snapshots
+DETAIL_FIELDS = ["name", "size", "decision", "condition_id"]
 
 
 class Dynamo:
@@ -9,21 +19,115 @@ class Dynamo:
 
     defaults = {
         "dynamo_base": "http://dynamo.mit.edu/data/",
+        # Number of concurrent requests in snapshot
+        "concurrency": 10,
+        # Number of attempts for each request in snapshot
+        "retries": 3,
+        # Seconds before the cycle index is checked for new cycles
+        "cycles_ttl": 300,
+        # Number of rows per dataframe in iter_chunks
+        "chunksize": 100000,
     }
 
-    def __init__(self, client, dynamo_base=None):
+    def __init__(self, client, dynamo_base=None, cycles_ttl=None):
         if dynamo_base is None:
             dynamo_base = Dynamo.defaults["dynamo_base"]
+        if cycles_ttl is None:
+            cycles_ttl = Dynamo.defaults["cycles_ttl"]
         self.client = client
         self.baseurl = httpx.URL(dynamo_base)
+        self._cycles_cache = TTLCache(cycles_ttl, 1)
+        # partition_id: {"cycle": array, "timestamp": array, "records": list of cycle dicts}
+        self._cycles = {}
+        self._last_cycle = None
+
+    async def iter_chunks(self, method, chunksize=None, **params):
+        """Yield the result of a dataframe method in chunks of up to chunksize rows"""
+        if chunksize is None:
+            chunksize = Dynamo.defaults["chunksize"]
+        async for df in iter_chunks(getattr(self, method)(**params), chunksize):
+            yield df
+
+    async def _update_cycles(self):
+        result = await self.client.getjson(self.baseurl.join("detox/cycles"))
+        # cycles are listed in increasing order, only the ones after the last known are new
+        new = []
+        for cycle in reversed(result["data"]):
+            if self._last_cycle is not None and cycle["cycle"] <= self._last_cycle:
+                break
+            new.append(cycle)
+        new.reverse()
+        for partition_id in {cycle["partition_id"] for cycle in new}:
+            items = [cycle for cycle in new if cycle["partition_id"] == partition_id]
+            index = self._cycles.setdefault(
+                partition_id,
+                {
+                    "cycle": numpy.array([], dtype=numpy.int64),
+                    "timestamp": numpy.array([], dtype=numpy.float64),
+                    "records": [],
+                },
+            )
+            for key in ("cycle", "timestamp"):
+                current = index[key]
+                values = numpy.array(
+                    [cycle[key] for cycle in items], dtype=current.dtype
+                )
+                index[key] = numpy.concatenate([current, values])
+            index["records"].extend(items)
+        if new:
+            self._last_cycle = max(cycle["cycle"] for cycle in new)
+        logger.debug(f"Added {len(new)} detox cycles to the cycle index")
+
+    async def _cycle_index(self, partition_id):
+        await self._cycles_cache.get("cycles", self._update_cycles)
+        return self._cycles.get(partition_id)
+
+    def _cycle_info(self, index, i):
+        cycle = dict(index["records"][i])
+        cycle["timestamp"] = datetime.datetime.fromtimestamp(cycle["timestamp"])
+        return cycle
+
+    async def cycles(self, partition_id=10):
+        """Get all cycles of a partition as a dataframe
+
+        The cycle list is kept locally, and checked for new cycles at most
+        every ``cycles_ttl`` seconds.
+        """
+        index = await self._cycle_index(partition_id)
+        if index is None:
+            df = pandas.DataFrame(
+                {"cycle": [], "partition_id": [], "timestamp": [], "comment": []}
+            )
+        else:
+            df = pandas.DataFrame(index["records"])
+        return self.client.postprocess(df, ["timestamp"])
 
     async def latest_cycle(self, partition_id=10):
         """Get the latest cycle information"""
-        result = await self.client.getjson(self.baseurl.join("detox/cycles"))
-        for cycle in result["data"][::-1]:
-            if cycle["partition_id"] == partition_id:
-                cycle["timestamp"] = datetime.datetime.fromtimestamp(cycle["timestamp"])
-                return cycle
+        index = await self._cycle_index(partition_id)
+        if index is None or len(index["cycle"]) == 0:
+            return None
+        return self._cycle_info(index, -1)
+
+    async def cycle_at(self, timestamp, partition_id=10):
+        """Get the information of the last cycle run at or before a time
+
+        Parameters
+        ----------
+        timestamp      datetime or unix timestamp
+        partition_id   detox partition
+
+        Returns None if there is no such cycle
+        """
+        if isinstance(timestamp, datetime.datetime):
+            timestamp = timestamp.timestamp()
+        index = await self._cycle_index(partition_id)
+        if index is None:
+            return None
+        i = numpy.searchsorted(index["timestamp"], timestamp, side="right") - 1
+        if i < 0:
+            return None
+        return self._cycle_info(index, i)
 
     async def detox_summary(self, cycle):
         params = {"cycle": cycle}
@@ -43,7 +147,7 @@ class Dynamo:
                 "cycle",
             ],
         )
-        return format_dates(df, ["cycle_timestamp"])
+        return self.client.postprocess(df, ["cycle_timestamp"])
 
     async def site_detail(self, site, cycle):
         """Get a dataframe of site usage from detox"""
@@ -56,4 +160,67 @@ class Dynamo:
             {int(k): v for k, v in result["data"]["conditions"].items()}
         )
         out["site"] = site
-        return out
+        return self.client.postprocess(out)
+
+    async def snapshot(self, cycle, sites=None, concurrency=None, retries=None):
+        """Get the detox site usage of all sites in a cycle
+
+        The site details are fetched concurrently, and combined into one table
+        with the condition text mapped once for the whole cycle.
+
+        Parameters
+        ----------
+        cycle          detox cycle number
+        sites          site names, default is all sites in the cycle's detox_summary
+        concurrency    number of concurrent requests
+        retries        number of attempts for each request
+
+        Returns a pandas dataframe with columns cycle, site, dataset, size,
+        decision, condition_id and condition, with site, decision and condition
+        as categoricals
+        """
+        if concurrency is None:
+            concurrency = Dynamo.defaults["concurrency"]
+        if retries is None:
+            retries = Dynamo.defaults["retries"]
+        if sites is None:
+            summary = await retry(lambda: self.detox_summary(cycle), retries)
+            sites = list(summary["name"])
+
+        async def fetch(site):
+            params = {"site": site, "cycle": cycle}
+            result = await retry(
+                lambda: self.client.getjson(
+                    self.baseurl.join("detox/sitedetail"), params=params
+                ),
+                retries,
+            )
+            return result["data"]
+
+        results = await gather(map(fetch, sites), concurrency)
+        columns = {field: [] for field in DETAIL_FIELDS}
+        counts, conditions = [], {}
+        for data in results:
+            datasets = data["content"]["datasets"]
+            counts.append(len(datasets))
+            for field in DETAIL_FIELDS:
+                columns[field].extend(item.get(field) for item in datasets)
+            conditions.update((int(k), v) for k, v in data["conditions"].items())
+        df = pandas.DataFrame(
+            {
+                "cycle": cycle,
+                "site": pandas.Categorical(
+                    [site for site, n in zip(sites, counts) for _ in range(n)],
+                    categories=list(dict.fromkeys(sites)),
+                ),
+                "dataset": columns["name"],
+                "size": numpy.array(columns["size"], dtype=float),
+                "decision": pandas.Categorical(columns["decision"]),
+                "condition_id": pandas.array(columns["condition_id"], dtype="Int64"),
+            }
+        )
+        df["condition"] = df["condition_id"].map(conditions).astype("category")
+        logger.debug(
+            f"Fetched {len(df)} datasets at {len(sites)} sites for cycle {cycle}"
+        )
+        return self.client.postprocess(df)
@@ -0,0 +1,172 @@
+import logging
+import numpy
+import pandas
+from .asyncutil import gather, retry
+
+
+logger = logging.getLogger(__name__)
+
+
+# Applied in order to each error message, to mask the parts that vary
+# between occurrences of the same error
+PATTERNS = [
+    (r"[A-Za-z][A-Za-z0-9+.\-]*://\S+", "<PFN>"),
+    (r"(?:^|\s)/[^\s:;,'\"\]\)]+", " <PATH>"),
+    (r"\b\d+(?:\.\d+){3}(?::\d+)?\b", "<IP>"),
+    (r"\b(?:[A-Za-z0-9\-]+\.)+[A-Za-z]{2,}(?::\d+)?\b", "<HOST>"),
+    (r"\b[0-9A-Fa-f]{8}(?:-[0-9A-Fa-f]{4}){3}-[0-9A-Fa-f]{12}\b", "<ID>"),
+    (r"\b0x[0-9A-Fa-f]+\b", "<ID>"),
+    (r"\b[0-9A-Fa-f]{8,}\b", "<ID>"),
+    (r"\b\d+(?:\.\d+)?", "<N>"),
+    (r"\s+", " "),
+]
+
+# Columns of DataSvc.errorlog, for an empty result
+ERRORLOG_DTYPES = {
+    "Link": object,
+    "LFN": object,
+    "file_Checksum": object,
+    "file_size_(GB)": float,
+    "Block_name": object,
+    "Error_log": object,
+    "From_PFN": object,
+    "To_PFN": object,
+    "Time": "datetime64[s]",
+}
+
+
+def normalize(messages):
+    """Reduce error messages to signatures by masking PFNs, paths, hosts, ids and numbers
+
+    Each distinct message is normalized once, with vectorized regular expressions.
+
+    Parameters
+    ----------
+        messages : pandas.Series or list of str
+
+    Returns a categorical pandas Series of signatures aligned with messages
+    """
+    if not isinstance(messages, pandas.Series):
+        messages = pandas.Series(messages, dtype=object)
+    # missing messages get code -1
+    codes, unique = pandas.factorize(messages.astype(object))
+    signatures = pandas.Series(unique, dtype=str)
+    for pattern, replacement in PATTERNS:
+        signatures = signatures.str.replace(pattern, replacement, regex=True)
+    # distinct messages may share a signature
+    sigcodes, categories = pandas.factorize(signatures.str.strip())
+    # so that code -1 stays -1, i.e. a missing signature
+    sigcodes = numpy.append(sigcodes, -1)
+    return pandas.Series(
+        pandas.Categorical.from_codes(sigcodes[codes], categories=categories),
+        index=messages.index,
+    )
+
+
+def cluster(df, window=None):
+    """Group DataSvc.errorlog rows by link and error signature
+
+    Parameters
+    ----------
+        df : pandas.DataFrame
+            output of DataSvc.errorlog, without human readable column names
+        window : str or float, optional
+            Also group by time window, as a pandas frequency (e.g. "1h") or a
+            number of seconds. Windows are aligned to the epoch.
+
+    Returns a dataframe with one row per (Link, [Window,] Signature), sorted by
+    decreasing count, with columns:
+        Count       number of errors
+        Files       number of distinct files
+        First       time of the first error
+        Last        time of the last error
+        Example     one of the raw error messages
+    """
+    keys = ["Link", "Signature"]
+    df = df.assign(Signature=normalize(df["Error_log"]))
+    if window is not None:
+        if not isinstance(window, str):
+            window = pandas.Timedelta(seconds=window)
+        df["Window"] = df["Time"].dt.floor(window)
+        keys.insert(1, "Window")
+    out = (
+        df.groupby(keys, observed=True, sort=False)
+        .agg(
+            Count=("Error_log", "size"),
+            Files=("LFN", "nunique"),
+            First=("Time", "min"),
+            Last=("Time", "max"),
+            Example=("Error_log", "first"),
+        )
+        .reset_index()
+    )
+    return out.sort_values(
+        ["Link", "Count"], ascending=[True, False], ignore_index=True
+    )
+
+
+class ErrorSignatures:
+    """Transfer error signatures across many links
+
+    PhEDEx keeps the last 100 errors of each link. The error logs of all
+    links into each destination node are fetched concurrently, one query
+    per node, and clustered into signatures.
+    """
+
+    defaults = {
+        # Number of concurrent requests
+        "concurrency": 10,
+        # Number of attempts for each request
+        "retries": 3,
+    }
+
+    def __init__(self, datasvc, concurrency=None, retries=None):
+        if concurrency is None:
+            concurrency = ErrorSignatures.defaults["concurrency"]
+        if retries is None:
+            retries = ErrorSignatures.defaults["retries"]
+        self.datasvc = datasvc
+        self.concurrency = concurrency
+        self.retries = retries
+
+    async def errors(self, nodes=None):
+        """Fetch the error logs of all links into the given destination nodes
+
+        Parameters
+        ----------
+        nodes          destination node names, default is all nodes
+
+        Returns a dataframe as DataSvc.errorlog
+        """
+        if nodes is None:
+            nodes = (await self.datasvc.nodes())["node.name"].tolist()
+        elif isinstance(nodes, str):
+            nodes = [nodes]
+
+        async def fetch(node):
+            return await retry(lambda: self.datasvc.errorlog(to=node), self.retries)
+
+        dfs = await gather(map(fetch, nodes), self.concurrency)
+        logger.debug(f"Fetched error logs for {len(nodes)} nodes")
+        # empty error logs have untyped columns, that would spoil the others
+        dfs = [df for df in dfs if len(df)]
+        if not dfs:
+            return pandas.DataFrame(
+                {
+                    col: pandas.Series(dtype=dtype)
+                    for col, dtype in ERRORLOG_DTYPES.items()
+                }
+            )
+        return pandas.concat(dfs, ignore_index=True)
+
+    async def signatures(self, nodes=None, window=None):
+        """Fetch and cluster the errors of all links into the given destination nodes
+
+        Parameters
+        ----------
+        nodes          destination node names, default is all nodes
+        window         see cluster
+
+        Returns a dataframe from cluster
+        """
+        return cluster(await self.errors(nodes), window)
@@ -0,0 +1,145 @@
+import logging
+import os
+import uuid
+import pandas
+
+
+logger = logging.getLogger(__name__)
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        import pyarrow.dataset  # noqa: F401
+    except ImportError:
+        raise ImportError(
+            "Parquet export requires pyarrow to be installed, e.g. pip install dmwmclient[arrow]"
+        )
+    return pyarrow
+
+
+def to_table(df, schema=None):
+    """Convert a dataframe to an Arrow table
+
+    Numeric, boolean, datetime and categorical columns are converted without
+    creating Python objects. Categoricals are stored as dictionary arrays.
+
+    Parameters
+    ----------
+        df : pandas.DataFrame
+        schema : pyarrow.Schema, optional
+            Cast the table to this schema, e.g. that of a previous chunk
+    """
+    pa = _pyarrow()
+    table = pa.Table.from_pandas(df, preserve_index=None)
+    if schema is not None and not table.schema.equals(schema):
+        table = table.select(schema.names).cast(schema)
+    return table
+
+
+async def _chunks(result):
+    if isinstance(result, pandas.DataFrame):
+        yield result
+    elif hasattr(result, "__aiter__"):
+        async for df in result:
+            yield df
+    elif hasattr(result, "__await__"):
+        yield await result
+    else:
+        for df in result:
+            yield df
+
+
+async def _enumerate(chunks):
+    i = 0
+    async for chunk in chunks:
+        yield i, chunk
+        i += 1
+
+
+async def to_parquet(
+    result, path, partition_cols=None, row_group_size=None, compression="zstd"
+):
+    """Write a service result to Parquet
+
+    Chunks are converted to Arrow and written one by one, so a streamed
+    result is never held in memory as a whole. Each chunk is written as one
+    or more row groups, with min/max statistics so that ``read_parquet``
+    can skip row groups that do not match its filters.
+
+    Parameters
+    ----------
+        result : pandas.DataFrame, awaitable or (async) iterable of dataframes
+            e.g. the coroutine returned by ``client.datasvc.blockreplicas(...)``
+            or the async generator returned by one of the ``iter_chunks`` methods
+        path : str
+            Output file, or output directory if partition_cols is given
+        partition_cols : list, optional
+            Columns to partition the output directory by (hive layout, ``col=value/``),
+            e.g. the node or site name. Partitioned datasets can be appended to.
+        row_group_size : int, optional
+            Maximum number of rows per row group, default is one row group per chunk
+        compression : str
+
+    Returns the number of rows written
+    """
+    pa = _pyarrow()
+    schema = None
+    writer = None
+    nrows = 0
+    # unique per call, so that repeated exports append to a partitioned dataset
+    basename = uuid.uuid4().hex
+    try:
+        async for i, df in _enumerate(_chunks(result)):
+            table = to_table(df, schema)
+            if schema is None:
+                schema = table.schema
+            if partition_cols:
+                pa.parquet.write_to_dataset(
+                    table,
+                    path,
+                    partition_cols=partition_cols,
+                    basename_template=f"{basename}-{i}-{{i}}.parquet",
+                    compression=compression,
+                    row_group_size=row_group_size,
+                    existing_data_behavior="overwrite_or_ignore",
+                )
+            else:
+                if writer is None:
+                    writer = pa.parquet.ParquetWriter(
+                        path, schema, compression=compression
+                    )
+                writer.write_table(table, row_group_size=row_group_size)
+            nrows += len(df)
+    finally:
+        if writer is not None:
+            writer.close()
+    if schema is None:
+        raise ValueError("No data to write")
+    logger.debug(f"Wrote {nrows} rows to {path}")
+    return nrows
+
+
+def read_parquet(path, columns=None, filters=None):
+    """Read a Parquet file or partitioned directory written by ``to_parquet``
+
+    Only the requested columns are read, and partitions and row groups whose
+    statistics exclude the filters are skipped entirely.
+
+    Parameters
+    ----------
+        path : str
+        columns : list, optional
+            Columns to read, default is all
+        filters : list, optional
+            Row filters in the pyarrow DNF format, e.g.
+            ``[("replica.node", "=", "T2_CH_CERN"), ("replica.time_update", ">=", pandas.Timestamp("2020-06-01"))]``
+
+    Returns a pandas dataframe
+    """
+    pa = _pyarrow()
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    table = pa.parquet.read_table(path, columns=columns, filters=filters)
+    return table.to_pandas()
@@ -0,0 +1,286 @@
+import numpy
+import pandas
+from lxml import etree
+from .util import format_dates
+
+
+class Level:
+    """One level of nesting in a flattening schema
+
+    Parameters
+    ----------
+        key : str
+            Key of the list of items for this level, in the item of the source level
+            (or in the root object for the first level)
+        fields : dict
+            Mapping of output column name to the key of the value in each item.
+            A tuple of keys can be used to fetch a nested value, or a function
+            to compute the value from the item.
+        source : int, optional
+            Index of the level holding the list, if not the previous level.
+            Used to form the cross product of sibling lists.
+    """
+
+    def __init__(self, key, fields=None, source=None):
+        self.key = key
+        self.fields = {} if fields is None else fields
+        self.source = source
+
+
+class Schema:
+    """Declarative description of how to flatten a nested json document
+
+    Parameters
+    ----------
+        path : tuple
+            Keys leading from the document to the root object
+        levels : list of Level
+            Nesting levels, outermost first. One row is produced per item of the last level.
+        units : dict, optional
+            Mapping of column name to a divisor, e.g. 1e9 to convert bytes to GB
+        convert : dict, optional
+            Mapping of column name to a function applied to the whole column
+        dates : list, optional
+            Columns holding UNIX timestamps to convert to datetime
+        human_readable : dict, optional
+            Mapping of column name to its human readable name
+        columns : list, optional
+            Output columns and their order, defaults to all fields in level order
+        numeric : list, optional
+            Columns to parse as numbers when reading XML, in addition to those
+            in units and dates
+    """
+
+    def __init__(
+        self,
+        path,
+        levels,
+        units=None,
+        convert=None,
+        dates=(),
+        human_readable=None,
+        columns=None,
+        numeric=(),
+    ):
+        self.path = tuple(path)
+        self.levels = list(levels)
+        self.units = {} if units is None else units
+        self.convert = {} if convert is None else convert
+        self.dates = list(dates)
+        self.human_readable = {} if human_readable is None else human_readable
+        if columns is None:
+            columns = [col for level in self.levels for col in level.fields]
+        self.columns = list(columns)
+        self.numeric = set(numeric) | set(self.units) | set(self.dates)
+
+
+_numeric = {"integer", "floating", "mixed-integer-float", "boolean"}
+
+
+def _getter(spec):
+    if callable(spec):
+        return spec
+    if isinstance(spec, tuple):
+
+        def get(item):
+            for key in spec:
+                if item is None:
+                    return None
+                item = item.get(key)
+            return item
+
+        return get
+    return lambda item: item.get(spec)
+
+
+def _column(values):
+    column = numpy.empty(len(values), dtype=object)
+    column[:] = values
+    if pandas.api.types.infer_dtype(column, skipna=True) in _numeric:
+        # int64, float64 or bool
+        return pandas.Series(column).infer_objects().to_numpy()
+    return column
+
+
+def walk(root, schema):
+    """Walk the nesting levels of a document
+
+    Returns, for each level, the list of items and the index of each
+    item's parent in the previous level
+    """
+    items = [root.get(schema.levels[0].key) or []]
+    parents = [None]
+    for depth, level in enumerate(schema.levels[1:], start=1):
+        source = depth - 1 if level.source is None else level.source
+        # index of each item of the previous level in the source level
+        ancestor = numpy.arange(len(items[-1]))
+        for d in range(depth - 1, source, -1):
+            ancestor = parents[d][ancestor]
+        children = [items[source][i].get(level.key) or [] for i in ancestor]
+        counts = numpy.fromiter(
+            map(len, children), dtype=numpy.int64, count=len(children)
+        )
+        parents.append(numpy.repeat(numpy.arange(len(children)), counts))
+        items.append([child for group in children for child in group])
+    return items, parents
+
+
+def build(columns, schema):
+    """Apply unit conversions, column transforms and date conversions to a dictionary of columns"""
+    for col, divisor in schema.units.items():
+        if col in columns:
+            columns[col] = columns[col] / divisor
+    for col, func in schema.convert.items():
+        if col in columns:
+            values = pandas.Series(columns[col], dtype=columns[col].dtype)
+            columns[col] = func(values).to_numpy()
+    df = pandas.DataFrame({col: columns[col] for col in schema.columns})
+    return format_dates(df, schema.dates)
+
+
+def rename(df, schema, human_readable=None):
+    """Apply the human readable column names of a schema in place, without copying data"""
+    if human_readable is not None and type(human_readable) is not bool:
+        raise Exception("Wrong human_readable parameter type")
+    if human_readable:
+        df.columns = [schema.human_readable.get(col, col) for col in df.columns]
+    return df
+
+
+def flatten(document, schema, human_readable=None):
+    """Flatten a nested json document into a pandas dataframe according to a schema
+
+    Values of outer levels are read once per item and broadcast to the
+    rows of the innermost level by index, rather than copied per row.
+
+    Parameters
+    ----------
+        document : dict
+        schema : Schema
+        human_readable : bool, optional
+            Rename the columns to their human readable names
+    """
+    root = document
+    for key in schema.path:
+        root = root[key]
+    items, parents = walk(root, schema)
+    nrows = len(items[-1])
+    # leaf index into each level, from innermost outwards
+    index = numpy.arange(nrows)
+    columns = {}
+    for depth in range(len(schema.levels) - 1, -1, -1):
+        level = schema.levels[depth]
+        for col, spec in level.fields.items():
+            values = _column(list(map(_getter(spec), items[depth])))
+            columns[col] = values if depth == len(schema.levels) - 1 else values[index]
+        if depth > 0:
+            index = parents[depth][index]
+    return rename(build(columns, schema), schema, human_readable)
+
+
+def _xmlgetter(spec):
+    if callable(spec):
+        return lambda elem: spec(elem.attrib)
+    if isinstance(spec, tuple):
+        # child elements, with "$t" for the text content
+        path = "/".join(key for key in spec if key != "$t")
+        return lambda elem: elem.findtext(path)
+    return lambda elem: elem.get(spec)
+
+
+def _xmlchunk(rows, schema, human_readable):
+    columns = {}
+    for col, values in rows.items():
+        if col in schema.numeric:
+            # always floating point, so that chunks with missing values match
+            columns[col] = pandas.to_numeric(
+                pandas.Series(values, dtype=object), errors="coerce"
+            ).to_numpy(dtype=numpy.float64)
+        else:
+            columns[col] = numpy.array(values, dtype=object)
+    return rename(build(columns, schema), schema, human_readable)
+
+
+async def flatten_xml(chunks, schema, chunksize, human_readable=None):
+    """Incrementally flatten an XML document into dataframe chunks according to a schema
+
+    The XML elements of each level are named after the level key, and the
+    fields of all but the innermost level are read from element attributes.
+    Elements are discarded as soon as they are processed, so that memory use
+    is bounded by the chunk size rather than the document size.
+
+    Parameters
+    ----------
+        chunks : async iterable of bytes
+            The XML document
+        schema : Schema
+        chunksize : int
+            Number of rows per dataframe
+        human_readable : bool, optional
+            Rename the columns to their human readable names
+
+    Yields dataframes of up to chunksize rows with identical columns and types.
+    An empty dataframe is yielded if the document has no rows. Unlike flatten,
+    the numeric columns (see Schema) are always floating point, since whether a
+    column has missing values is only known once the document is fully read:
+    e.g. a file count of 2 comes back as 2.0.
+    """
+    if any(level.source is not None for level in schema.levels):
+        raise ValueError("Cannot stream a schema with cross product levels")
+    for level in schema.levels[:-1]:
+        if any(isinstance(spec, tuple) for spec in level.fields.values()):
+            raise ValueError("Only innermost level fields can be nested when streaming")
+    getters = [
+        [(col, _xmlgetter(spec)) for col, spec in level.fields.items()]
+        for level in schema.levels
+    ]
+    leaf = len(schema.levels) - 1
+    offset = len(schema.path)
+    current = [None] * len(schema.levels)
+    rows = {col: [] for getter in getters for col, _ in getter}
+    nrows = 0
+    yielded = False
+    depth = 0
+    parser = etree.XMLPullParser(events=("start", "end"))
+
+    def events():
+        nonlocal depth
+        for event, elem in parser.read_events():
+            if event == "start":
+                depth += 1
+                level = depth - 1 - offset
+            else:
+                depth -= 1
+                level = depth - offset
+            if 0 <= level < len(schema.levels) and elem.tag == schema.levels[level].key:
+                yield event, level, elem
+
+    async def feed():
+        async for chunk in chunks:
+            parser.feed(chunk)
+            yield
+        parser.close()
+        yield
+
+    async for _ in feed():
+        for event, level, elem in events():
+            if event == "start" and level < leaf:
+                current[level] = [(col, get(elem)) for col, get in getters[level]]
+            elif event == "end":
+                if level == leaf:
+                    for parent in current[:leaf]:
+                        for col, value in parent:
+                            rows[col].append(value)
+                    for col, get in getters[leaf]:
+                        rows[col].append(get(elem))
+                    nrows += 1
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+                if nrows == chunksize:
+                    yield _xmlchunk(rows, schema, human_readable)
+                    yielded = True
+                    rows = {col: [] for col in rows}
+                    nrows = 0
+    if nrows > 0 or not yielded:
+        yield _xmlchunk(rows, schema, human_readable)
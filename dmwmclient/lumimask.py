@@ -0,0 +1,287 @@
+import itertools
+import numpy
+import pandas
+
+
+# Run and lumi section numbers are combined into one integer, so that
+# intervals of lumis become intervals on a line
+_SHIFT = 32
+_LUMI = (1 << _SHIFT) - 1
+
+
+def _encode(run, lumi):
+    return (numpy.asarray(run, dtype=numpy.int64) << _SHIFT) | numpy.asarray(
+        lumi, dtype=numpy.int64
+    )
+
+
+def _normalize(start, stop):
+    """Sort and merge half-open intervals [start, stop) that overlap or touch"""
+    if len(start) == 0:
+        return start, stop
+    order = numpy.argsort(start, kind="stable")
+    start, stop = start[order], stop[order]
+    reach = numpy.maximum.accumulate(stop)
+    first = numpy.ones(len(start), dtype=bool)
+    first[1:] = start[1:] > reach[:-1]
+    index = numpy.flatnonzero(first)
+    return start[index], numpy.maximum.reduceat(stop, index)
+
+
+def _member(start, stop, points):
+    """Whether each point is inside one of the sorted disjoint intervals [start, stop)"""
+    i = numpy.searchsorted(start, points, side="right") - 1
+    return (i >= 0) & (points < stop[numpy.maximum(i, 0)])
+
+
+def _combine(a, b, op):
+    # elementary segments between all interval boundaries
+    points = numpy.unique(numpy.concatenate([a._start, a._stop, b._start, b._stop]))
+    if len(points) < 2:
+        return LumiMask._from_intervals(points[:0], points[:0])
+    keep = op(
+        _member(a._start, a._stop, points[:-1]), _member(b._start, b._stop, points[:-1])
+    )
+    return LumiMask._from_intervals(points[:-1][keep], points[1:][keep])
+
+
+def _covered(start, stop, points):
+    """Number of lumis of the sorted disjoint intervals [start, stop) below each point"""
+    cumulative = numpy.concatenate([[0], numpy.cumsum(stop - start)])
+    i = numpy.searchsorted(start, points, side="right") - 1
+    inside = numpy.clip(points - start[numpy.maximum(i, 0)], 0, None)
+    inside = numpy.minimum(inside, (stop - start)[numpy.maximum(i, 0)])
+    return numpy.where(i >= 0, cumulative[numpy.maximum(i, 0)] + inside, 0)
+
+
+class LumiMask:
+    """A set of luminosity sections, stored as sorted disjoint (run, first_lumi, last_lumi) intervals
+
+    Set operations (``|``, ``&``, ``-``) are vectorized over all intervals.
+
+    Parameters
+    ----------
+        run, first_lumi, last_lumi : array-like
+            Inclusive lumi ranges, in any order and possibly overlapping
+    """
+
+    def __init__(self, run=(), first_lumi=(), last_lumi=()):
+        start = _encode(run, first_lumi)
+        stop = _encode(run, last_lumi) + 1
+        self._start, self._stop = _normalize(start, stop)
+
+    @classmethod
+    def _from_intervals(cls, start, stop):
+        out = cls.__new__(cls)
+        out._start, out._stop = _normalize(start, stop)
+        return out
+
+    @classmethod
+    def from_json(cls, mask):
+        """Build from a golden JSON style dictionary, e.g. {"315257": [[1, 88], [91, 92]]}"""
+        run, first, last = [], [], []
+        for key, ranges in mask.items():
+            for lo, hi in ranges:
+                run.append(int(key))
+                first.append(lo)
+                last.append(hi)
+        return cls(run, first, last)
+
+    @classmethod
+    def from_lumis(cls, run, lumi):
+        """Build from arrays of individual (run, lumi) pairs"""
+        key = _encode(run, lumi)
+        return cls._from_intervals(key, key + 1)
+
+    @classmethod
+    def from_filelumis(cls, df):
+        """Build from the output of the DBS filelumis method"""
+        return FileLumiIndex.from_filelumis(df).mask()
+
+    @property
+    def run(self):
+        return self._start >> _SHIFT
+
+    @property
+    def first_lumi(self):
+        return self._start & _LUMI
+
+    @property
+    def last_lumi(self):
+        return (self._stop - 1) & _LUMI
+
+    def __len__(self):
+        """Number of lumi sections"""
+        return int((self._stop - self._start).sum())
+
+    def __eq__(self, other):
+        return numpy.array_equal(self._start, other._start) and numpy.array_equal(
+            self._stop, other._stop
+        )
+
+    def __repr__(self):
+        return f"<LumiMask: {len(self._start)} ranges, {len(self)} lumis>"
+
+    def __or__(self, other):
+        return LumiMask._from_intervals(
+            numpy.concatenate([self._start, other._start]),
+            numpy.concatenate([self._stop, other._stop]),
+        )
+
+    def __and__(self, other):
+        return _combine(self, other, numpy.logical_and)
+
+    def __sub__(self, other):
+        return _combine(self, other, lambda a, b: a & ~b)
+
+    def runs(self):
+        """Sorted array of distinct runs"""
+        return numpy.unique(self.run)
+
+    def contains(self, run, lumi):
+        """Vectorized membership test of (run, lumi) pairs"""
+        return _member(self._start, self._stop, _encode(run, lumi))
+
+    def to_frame(self):
+        """Lumi ranges as a pandas dataframe"""
+        return pandas.DataFrame(
+            {
+                "run": self.run,
+                "first_lumi": self.first_lumi,
+                "last_lumi": self.last_lumi,
+            }
+        )
+
+    def to_json(self):
+        """Golden JSON style dictionary"""
+        out = {}
+        for run, first, last in zip(
+            self.run.tolist(), self.first_lumi.tolist(), self.last_lumi.tolist()
+        ):
+            out.setdefault(str(run), []).append([first, last])
+        return out
+
+
+class FileLumiIndex:
+    """Lumi ranges of each file, as flat interval arrays sorted by file
+
+    Parameters
+    ----------
+        files : array-like
+            File names
+        code, run, first_lumi, last_lumi : array-like
+            Index into files and inclusive lumi range of each interval
+    """
+
+    def __init__(self, files, code, run, first_lumi, last_lumi):
+        self.files = numpy.asarray(files, dtype=object)
+        code = numpy.asarray(code, dtype=numpy.int64)
+        start = _encode(run, first_lumi)
+        stop = _encode(run, last_lumi) + 1
+        # sort by file then lumi, and merge intervals within each file
+        order = numpy.lexsort((start, code))
+        code, start, stop = code[order], start[order], stop[order]
+        if len(code):
+            reach = pandas.Series(stop).groupby(code).cummax().to_numpy()
+            first = numpy.ones(len(code), dtype=bool)
+            first[1:] = (code[1:] != code[:-1]) | (start[1:] > reach[:-1])
+            index = numpy.flatnonzero(first)
+            code, start, stop = (
+                code[index],
+                start[index],
+                numpy.maximum.reduceat(stop, index),
+            )
+        self._code, self._start, self._stop = code, start, stop
+
+    @classmethod
+    def from_filelumis(cls, df):
+        """Build from the output of the DBS filelumis method
+
+        Lumi lists are read directly into arrays, and consecutive lumis compressed into ranges.
+        """
+        lists = df["lumi_section_num"]
+        counts = numpy.fromiter(map(len, lists), dtype=numpy.int64, count=len(lists))
+        lumi = numpy.fromiter(
+            itertools.chain.from_iterable(lists), dtype=numpy.int64, count=counts.sum()
+        )
+        run = numpy.repeat(df["run_num"].to_numpy(dtype=numpy.int64), counts)
+        code, files = pandas.factorize(df["logical_file_name"].astype(object))
+        code = numpy.repeat(code, counts)
+        return cls(files, code, run, lumi, lumi)
+
+    @classmethod
+    def concat(cls, indices):
+        """Combine several indices, e.g. built from chunks of a filelumis query"""
+        indices = list(indices)
+        names = numpy.concatenate(
+            [index.files for index in indices] + [numpy.array([], dtype=object)]
+        )
+        recode, files = pandas.factorize(names)
+        offsets = numpy.cumsum([0] + [len(index.files) for index in indices])
+        code = numpy.concatenate(
+            [recode[offset + index._code] for offset, index in zip(offsets, indices)]
+            + [numpy.array([], dtype=numpy.int64)]
+        )
+        start = numpy.concatenate(
+            [index._start for index in indices] + [numpy.array([], dtype=numpy.int64)]
+        )
+        stop = numpy.concatenate(
+            [index._stop for index in indices] + [numpy.array([], dtype=numpy.int64)]
+        )
+        return cls(files, code, start >> _SHIFT, start & _LUMI, (stop - 1) & _LUMI)
+
+    def __len__(self):
+        """Number of files"""
+        return len(self.files)
+
+    def _select(self, files):
+        if files is None:
+            return numpy.ones(len(self._code), dtype=bool)
+        wanted = numpy.isin(self.files, numpy.asarray(files, dtype=object))
+        return wanted[self._code]
+
+    def mask(self, files=None):
+        """LumiMask of all lumis of the given files, default all files"""
+        select = self._select(files)
+        return LumiMask._from_intervals(self._start[select], self._stop[select])
+
+    def to_frame(self):
+        """Lumi ranges of each file as a pandas dataframe"""
+        return pandas.DataFrame(
+            {
+                "logical_file_name": self.files[self._code],
+                "run": self._start >> _SHIFT,
+                "first_lumi": self._start & _LUMI,
+                "last_lumi": (self._stop - 1) & _LUMI,
+            }
+        )
+
+    def coverage(self, mask):
+        """Number of lumis of each file, and how many of them are in mask
+
+        Returns a pandas dataframe indexed by file name with columns
+        lumis, selected and fraction
+        """
+        inside = _covered(mask._start, mask._stop, self._stop) - _covered(
+            mask._start, mask._stop, self._start
+        )
+        n = len(self.files)
+        lumis = numpy.bincount(
+            self._code, weights=self._stop - self._start, minlength=n
+        )
+        selected = numpy.bincount(self._code, weights=inside, minlength=n)
+        with numpy.errstate(invalid="ignore", divide="ignore"):
+            fraction = selected / lumis
+        return pandas.DataFrame(
+            {
+                "lumis": lumis.astype(numpy.int64),
+                "selected": selected.astype(numpy.int64),
+                "fraction": fraction,
+            },
+            index=pandas.Index(self.files, name="logical_file_name"),
+        )
+
+    def files_in(self, mask):
+        """Array of the names of files with at least one lumi in mask"""
+        cov = self.coverage(mask)
+        return cov.index[cov["selected"].to_numpy() > 0].to_numpy()
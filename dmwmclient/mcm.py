@@ -1,4 +1,12 @@
+import asyncio
+import collections
+import logging
 import httpx
+import pandas
+from .asyncutil import retry
+
+
+logger = logging.getLogger(__name__)
 
 
 class McM:
@@ -7,6 +15,12 @@ class McM:
     defaults = {
         # McM REST endpoint URL with trailing slash
         "mcm_base": "https://cms-pdmv.cern.ch/mcm/",
+        # Number of records per page in iter_search
+        "limit": 500,
+        # Number of pages requested ahead in iter_search
+        "prefetch": 4,
+        # Number of attempts for each page in iter_search
+        "retries": 3,
     }
 
     def __init__(self, client, mcm_base=None):
@@ -17,3 +31,77 @@ class McM:
 
     async def search(self, **params):
         return await self.client.getjson(url=self.baseurl.join("search"), params=params)
+
+    async def iter_pages(
+        self,
+        db_name="requests",
+        fields=None,
+        limit=None,
+        prefetch=None,
+        retries=None,
+        **params,
+    ):
+        """Yield the records of a search, one list per page
+
+        Pages of ``limit`` records are requested ``prefetch`` at a time ahead of
+        the one being consumed, and paging stops at the first page that is not
+        full. If fields are given, they are sent as ``include_fields`` so the
+        server can omit the other fields, and records are also reduced to these
+        fields locally.
+
+        Parameters
+        ----------
+        db_name        McM database, e.g. "requests", "campaigns" or "chained_requests"
+        fields         list of fields to keep, default is the full documents
+        limit          number of records per page
+        prefetch       number of pages requested concurrently
+        retries        number of attempts for each page
+        params         search query, e.g. member_of_campaign or prepid (wildcards allowed)
+        """
+        if limit is None:
+            limit = McM.defaults["limit"]
+        if prefetch is None:
+            prefetch = McM.defaults["prefetch"]
+        if retries is None:
+            retries = McM.defaults["retries"]
+        params["db_name"] = db_name
+        params["limit"] = limit
+        if fields is not None:
+            fields = list(fields)
+            params["include_fields"] = ",".join(fields)
+
+        async def fetch(page):
+            query = dict(params, page=page)
+            result = await retry(lambda: self.search(**query), retries)
+            return result.get("results") or []
+
+        pending = collections.deque()
+        page = 0
+        try:
+            while True:
+                while len(pending) < prefetch:
+                    pending.append(asyncio.ensure_future(fetch(page)))
+                    page += 1
+                records = await pending.popleft()
+                if fields is not None:
+                    records = [{f: record.get(f) for f in fields} for record in records]
+                if records:
+                    yield records
+                if len(records) < limit:
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+        logger.debug(f"Searched {db_name} in {page - len(pending)} pages")
+
+    async def iter_search(self, db_name="requests", fields=None, **params):
+        """Yield the records of a search one by one, see iter_pages"""
+        async for records in self.iter_pages(db_name, fields, **params):
+            for record in records:
+                yield record
+
+    async def iter_search_chunks(self, db_name="requests", fields=None, **params):
+        """Yield the records of a search as a pandas dataframe per page, see iter_pages"""
+        async for records in self.iter_pages(db_name, fields, **params):
+            df = pandas.DataFrame.from_records(records, columns=fields)
+            yield self.client.postprocess(df)
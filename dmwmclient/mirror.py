@@ -0,0 +1,210 @@
+import logging
+import sqlite3
+import time
+import numpy
+import pandas
+from .util import format_dates
+
+
+logger = logging.getLogger(__name__)
+
+
+# Mirror table column: DataSvc.blockreplicas column
+COLUMNS = {
+    "block": "name",
+    "block_id": "id",
+    "block_bytes": "bytes",
+    "block_files": "files",
+    "is_open": "is_open",
+    "node": "replica.node",
+    "node_id": "replica.node_id",
+    "se": "replica.se",
+    "bytes": "replica.bytes",
+    "files": "replica.files",
+    "complete": "replica.complete",
+    "subscribed": "replica.subscribed",
+    "custodial": "replica.custodial",
+    "group_name": "replica.group",
+    "time_create": "replica.time_create",
+    "time_update": "replica.time_update",
+}
+DATES = ["time_create", "time_update"]
+# y/n flags, that clients with compact=True turn into booleans
+FLAGS = ["is_open", "complete", "subscribed", "custodial"]
+
+
+class BlockReplicaMirror:
+    """Local SQLite mirror of PhEDEx block replicas
+
+    The first refresh of each node loads all of its block replicas. Later
+    refreshes only fetch replicas updated since the previous one, and merge
+    them by (block, node). Since deleted replicas never show up in an
+    update_since query, each node is fully reloaded once its last full load
+    is older than ``full_refresh`` seconds.
+    """
+
+    defaults = {
+        # Seconds subtracted from the last refresh time to tolerate clock skew
+        "overlap": 600,
+        # Maximum age in seconds of a node's last full load
+        "full_refresh": 7 * 86400,
+    }
+
+    def __init__(self, datasvc, path, nodes=None, overlap=None, full_refresh=None):
+        """
+        Parameters
+        ----------
+        datasvc        DataSvc instance
+        path           SQLite database file
+        nodes          list of nodes to mirror, default is all nodes
+        overlap        see defaults
+        full_refresh   see defaults
+        """
+        if overlap is None:
+            overlap = BlockReplicaMirror.defaults["overlap"]
+        if full_refresh is None:
+            full_refresh = BlockReplicaMirror.defaults["full_refresh"]
+        self.datasvc = datasvc
+        self.nodes = nodes
+        self.overlap = overlap
+        self.full_refresh = full_refresh
+        self._db = sqlite3.connect(path)
+        columns = ", ".join(f'"{col}"' for col in COLUMNS)
+        with self._db:
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS blockreplicas ({columns}, PRIMARY KEY (block, node))"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS blockreplicas_node ON blockreplicas (node)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sync (node PRIMARY KEY, full_time, delta_time)"
+            )
+
+    def close(self):
+        self._db.close()
+
+    def sync_state(self):
+        """Get the last full and delta refresh time of each mirrored node"""
+        df = pandas.read_sql_query("SELECT * FROM sync", self._db)
+        return format_dates(df, ["full_time", "delta_time"])
+
+    def _rows(self, df):
+        df = df.reindex(columns=list(COLUMNS.values()))
+        df.columns = list(COLUMNS)
+        epoch = pandas.Timestamp("1970-01-01")
+        for col in DATES:
+            if pandas.api.types.is_datetime64_any_dtype(df[col]):
+                df[col] = (df[col] - epoch) / pandas.Timedelta(seconds=1)
+        for col in FLAGS:
+            if pandas.api.types.is_bool_dtype(df[col]):
+                df[col] = numpy.where(df[col].to_numpy(dtype=bool), "y", "n")
+        df = df.astype(object).where(df.notna(), None)
+        return list(df.itertuples(index=False, name=None))
+
+    async def refresh(self, full=False):
+        """Bring the mirror up to date
+
+        Parameters
+        ----------
+        full           force a full reload of all nodes
+
+        Returns the number of block replica rows fetched
+        """
+        nodes = self.nodes
+        if nodes is None:
+            nodes = (await self.datasvc.nodes())["node.name"].tolist()
+        state = {
+            node: (full_time, delta_time)
+            for node, full_time, delta_time in self._db.execute("SELECT * FROM sync")
+        }
+        start = time.time()
+        full_nodes, delta_nodes = [], []
+        for node in nodes:
+            if full or node not in state or start - state[node][0] > self.full_refresh:
+                full_nodes.append(node)
+            else:
+                delta_nodes.append(node)
+
+        nrows = 0
+        placeholders = ", ".join("?" * len(COLUMNS))
+        if full_nodes:
+            logger.info(f"Loading all block replicas at {len(full_nodes)} nodes")
+            df = await self.datasvc.sharded("blockreplicas", node=full_nodes)
+            with self._db:
+                self._db.executemany(
+                    "DELETE FROM blockreplicas WHERE node = ?",
+                    [(node,) for node in full_nodes],
+                )
+                self._db.executemany(
+                    f"INSERT OR REPLACE INTO blockreplicas VALUES ({placeholders})",
+                    self._rows(df),
+                )
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO sync VALUES (?, ?, ?)",
+                    [(node, start, start) for node in full_nodes],
+                )
+            nrows += len(df)
+        if delta_nodes:
+            since = min(state[node][1] for node in delta_nodes) - self.overlap
+            logger.info(
+                f"Loading block replica updates at {len(delta_nodes)} nodes since {since}"
+            )
+            df = await self.datasvc.sharded(
+                "blockreplicas", node=delta_nodes, update_since=int(since)
+            )
+            with self._db:
+                self._db.executemany(
+                    f"INSERT OR REPLACE INTO blockreplicas VALUES ({placeholders})",
+                    self._rows(df),
+                )
+                self._db.executemany(
+                    "UPDATE sync SET delta_time = ? WHERE node = ?",
+                    [(start, node) for node in delta_nodes],
+                )
+            nrows += len(df)
+        return nrows
+
+    def blockreplicas(self, block=None, dataset=None, node=None, complete=None):
+        """Query the mirrored block replicas
+
+        Returns a dataframe with the same columns as DataSvc.blockreplicas
+
+        Parameters
+        ----------
+        block          block name, can be multiple
+        dataset        dataset name, can be multiple
+        node           node name, can be multiple
+        complete       y or n, whether or not to require complete or incomplete blocks
+        """
+        where, args = [], []
+
+        def isin(column, values):
+            if isinstance(values, str):
+                values = [values]
+            where.append(f"{column} IN ({', '.join('?' * len(values))})")
+            args.extend(values)
+
+        if block is not None:
+            isin("block", block)
+        if node is not None:
+            isin("node", node)
+        if complete is not None:
+            where.append("complete = ?")
+            args.append(complete)
+        if dataset is not None:
+            if isinstance(dataset, str):
+                dataset = [dataset]
+            # block names are the dataset name followed by '#'
+            where.append(
+                "(" + " OR ".join(["(block > ? AND block < ?)"] * len(dataset)) + ")"
+            )
+            for name in dataset:
+                args.extend([name + "#", name + "$"])
+        query = "SELECT * FROM blockreplicas"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        df = pandas.read_sql_query(query, self._db, params=args)
+        format_dates(df, DATES)
+        df.columns = [COLUMNS[col] for col in df.columns]
+        return df
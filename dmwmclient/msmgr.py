@@ -1,6 +1,51 @@
+import logging
 import httpx
+import numpy
 import pandas
-from .util import format_dates
+from .asyncutil import completed, retry
+from .util import iter_chunks
+
+
+logger = logging.getLogger(__name__)
+
+
+# Columns of the transfers method
+TRANSFER_COLUMNS = [
+    "workflow",
+    "dataset",
+    "dataType",
+    "campaignName",
+    "rule_id",
+    "lastUpdate",
+]
+
+
+def _transfer_columns(result):
+    """Flatten the transfer documents of an info query, one row per rule ID
+
+    A transfer record without rule IDs gives one row with a missing rule_id
+    """
+    columns = {col: [] for col in TRANSFER_COLUMNS}
+    counts = []
+    for row in result["result"]:
+        docs = row.get("transferDoc")
+        if docs is None:
+            continue
+        if isinstance(docs, dict):
+            docs = [docs]
+        for doc in docs:
+            for transfer in doc.get("transfers") or []:
+                ids = transfer.get("transferIDs") or [None]
+                counts.append(len(ids))
+                columns["rule_id"].extend(ids)
+                columns["workflow"].append(doc.get("workflowName", row.get("request")))
+                columns["lastUpdate"].append(doc.get("lastUpdate"))
+                for col in ("dataset", "dataType", "campaignName"):
+                    columns[col].append(transfer.get(col))
+    for col in TRANSFER_COLUMNS:
+        if col != "rule_id":
+            columns[col] = numpy.repeat(numpy.array(columns[col], dtype=object), counts)
+    return columns
 
 
 class MSMgr:
@@ -8,6 +53,12 @@ class MSMgr:
 
     defaults = {
         "msmgr_base": "https://cmsweb.cern.ch/ms-transferor/data/",
+        # Number of concurrent requests in bulk queries
+        "concurrency": 10,
+        # Number of attempts for each request in bulk queries
+        "retries": 3,
+        # Number of rows per dataframe in iter_chunks
+        "chunksize": 100000,
     }
 
     def __init__(self, client, msmgr_base=None):
@@ -16,6 +67,13 @@ class MSMgr:
         self.client = client
         self.baseurl = httpx.URL(msmgr_base)
 
+    async def iter_chunks(self, method, chunksize=None, **params):
+        """Yield the result of a dataframe method in chunks of up to chunksize rows"""
+        if chunksize is None:
+            chunksize = MSMgr.defaults["chunksize"]
+        async for df in iter_chunks(getattr(self, method)(**params), chunksize):
+            yield df
+
     async def transfer_ids(self, workflowName=None):
         """Request stuck transfer IDs
 
@@ -23,8 +81,9 @@ class MSMgr:
 
         Returns a list of all stuck transfer requests
         """
+        params = {}
         if workflowName is not None:
-            params = {"request": workflowName}
+            params["request"] = workflowName
         transfers = []
         result = await self.client.getjson(self.baseurl.join("info"), params=params)
         for row in result["result"]:
@@ -37,5 +96,77 @@ class MSMgr:
                     }
                     transfers.append(input_data)
         df = pandas.json_normalize(transfers)
-        format_dates(df, ["LastUpdate"])
-        return df
+        return self.client.postprocess(df, ["LastUpdate"])
+
+    def _frame(self, columns):
+        df = pandas.DataFrame(columns, columns=TRANSFER_COLUMNS)
+        return self.client.postprocess(df, ["lastUpdate"])
+
+    async def _iter_columns(self, workflows, concurrency, retries, skip_failed=False):
+        if concurrency is None:
+            concurrency = MSMgr.defaults["concurrency"]
+        if retries is None:
+            retries = MSMgr.defaults["retries"]
+        if workflows is None:
+            workflows = ["ALL_DOCS"]
+        elif isinstance(workflows, str):
+            workflows = [workflows]
+
+        async def fetch(workflow):
+            try:
+                result = await retry(
+                    lambda: self.client.getjson(
+                        self.baseurl.join("info"), params={"request": workflow}
+                    ),
+                    retries,
+                )
+            except IOError as ex:
+                if not skip_failed:
+                    raise
+                logger.warning(f"Failed to look up transfers of {workflow}: {ex!r}")
+                return None
+            return _transfer_columns(result)
+
+        coroutines = [fetch(workflow) for workflow in dict.fromkeys(workflows)]
+        async for columns in completed(coroutines, concurrency):
+            if columns is not None:
+                yield columns
+
+    async def iter_transfers(self, workflows=None, concurrency=None, retries=None):
+        """Yield the transfer records of many workflows, as dataframes as they arrive
+
+        One info query per workflow is run concurrently. If workflows is None,
+        the transfer documents of all workflows are fetched in a single query.
+        A workflow whose query still fails after all attempts is skipped with a
+        warning, so that it does not interrupt the others. See transfers for
+        the columns.
+        """
+        async for columns in self._iter_columns(
+            workflows, concurrency, retries, skip_failed=True
+        ):
+            yield self._frame(columns)
+
+    async def transfers(self, workflows=None, concurrency=None, retries=None):
+        """Transfer records of many workflows
+
+        Parameters
+        ----------
+        workflows      workflow names, default is all workflows known to MSTransferor
+        concurrency    number of concurrent requests
+        retries        number of attempts for each request
+
+        Returns a pandas dataframe with one row per transfer rule, of all the
+        transfer records of each workflow, with columns:
+            workflow       workflow name
+            dataset        transferred dataset or pileup
+            dataType       e.g. primary, parent or secondary
+            campaignName   campaign of the transfer
+            rule_id        Rucio rule ID, missing for a record without rules
+            lastUpdate     last update of the workflow transfer document
+        """
+        columns = {col: [] for col in TRANSFER_COLUMNS}
+        async for chunk in self._iter_columns(workflows, concurrency, retries):
+            for col in TRANSFER_COLUMNS:
+                columns[col].extend(chunk[col])
+        logger.debug(f"Fetched {len(columns['rule_id'])} transfer records")
+        return self._frame(columns)
@@ -1,7 +1,45 @@
+import itertools
 import httpx
+import numpy
 import pandas
-from .util import format_dates
+from .asyncutil import gather, retry
+from .util import iter_chunks
 import datetime
+import time
+
+
+# Fields of each RequestTransition entry, placed first in the transition columns
+TRANSITION_FIELDS = ["Status", "UpdateTime", "DN"]
+
+
+def _transition_columns(result):
+    """Flatten the RequestTransition lists of a request query into a dict of columns"""
+    names, counts, transitions = [], [], []
+    for row in result["result"]:
+        for requestname, item in row.items():
+            items = item.get("RequestTransition") or []
+            names.append(requestname)
+            counts.append(len(items))
+            transitions.extend(items)
+    current = [False] * len(transitions)
+    position = 0
+    for count in counts:
+        position += count
+        if count:
+            current[position - 1] = True
+    columns = {
+        "requestname": [
+            name for name, count in zip(names, counts) for _ in range(count)
+        ],
+        "current": current,
+    }
+    # TRANSITION_FIELDS, then any other field present in the documents
+    fields = dict.fromkeys(TRANSITION_FIELDS)
+    for transition in transitions:
+        fields.update(dict.fromkeys(transition))
+    for field in fields:
+        columns[field] = [transition.get(field) for transition in transitions]
+    return columns
 
 
 class ReqMgr:
@@ -12,6 +50,12 @@ class ReqMgr:
 
     defaults = {
         "reqmgr_base": "https://cmsweb.cern.ch/reqmgr2/data/",
+        # Number of concurrent requests in bulk queries
+        "concurrency": 10,
+        # Number of attempts for each request in bulk queries
+        "retries": 3,
+        # Number of rows per dataframe in iter_chunks
+        "chunksize": 100000,
     }
 
     def __init__(self, client, reqmgr_base=None):
@@ -20,6 +64,13 @@ class ReqMgr:
         self.client = client
         self.baseurl = httpx.URL(reqmgr_base)
 
+    async def iter_chunks(self, method, chunksize=None, **params):
+        """Yield the result of a dataframe method in chunks of up to chunksize rows"""
+        if chunksize is None:
+            chunksize = ReqMgr.defaults["chunksize"]
+        async for df in iter_chunks(getattr(self, method)(**params), chunksize):
+            yield df
+
     async def transitions(
         self, inputdataset=None, outputdataset=None, mc_pileup=None, status=None
     ):
@@ -27,7 +78,9 @@ class ReqMgr:
 
         Specify either input or output dataset.
 
-        Returns a list of all request transitions that involve the specified dataset
+        Returns a list of all request transitions that involve the specified dataset,
+        with columns requestname, current, the query parameters, and all the fields
+        of the transitions
         """
         params = {
             "mask": "RequestTransition",
@@ -41,54 +94,168 @@ class ReqMgr:
         if status is not None:
             params["status"] = status
         result = await self.client.getjson(self.baseurl.join("request"), params=params)
+        columns = _transition_columns(result)
+        df = pandas.DataFrame(
+            {
+                "requestname": columns.pop("requestname"),
+                "current": columns.pop("current"),
+            }
+        )
+        for key, value in params.items():
+            df[key] = value
+        for key, values in columns.items():
+            df[key] = values
+        return self.client.postprocess(df, ["UpdateTime"])
+
+    async def bulk_transitions(
+        self,
+        datasets,
+        role="outputdataset",
+        status=None,
+        concurrency=None,
+        retries=None,
+    ):
+        """Request transitions of many datasets
+
+        One query per dataset is run concurrently, and the results are combined.
+
+        Parameters
+        ----------
+        datasets       list of dataset names
+        role           which request parameter to match the datasets to, one of
+                       "inputdataset", "outputdataset" or "mc_pileup"
+        status         only requests in this status
+        concurrency    number of concurrent requests
+        retries        number of attempts for each request
+
+        Returns a pandas dataframe with columns dataset (categorical), requestname,
+        current, and the transition fields: Status, UpdateTime, DN and any other
+        field present in the transitions
+        """
+        if role not in ("inputdataset", "outputdataset", "mc_pileup"):
+            raise ValueError(f"Unknown dataset role {role!r}")
+        if concurrency is None:
+            concurrency = ReqMgr.defaults["concurrency"]
+        if retries is None:
+            retries = ReqMgr.defaults["retries"]
+        datasets = list(dict.fromkeys(datasets))
+
+        async def fetch(dataset):
+            params = {"mask": "RequestTransition", role: dataset}
+            if status is not None:
+                params["status"] = status
+            result = await retry(
+                lambda: self.client.getjson(
+                    self.baseurl.join("request"), params=params
+                ),
+                retries,
+            )
+            return _transition_columns(result)
+
+        results = await gather(map(fetch, datasets), concurrency)
+        lengths = [len(columns["requestname"]) for columns in results]
+        codes = numpy.repeat(numpy.arange(len(datasets)), lengths)
+        keys = dict.fromkeys(["requestname", "current"] + TRANSITION_FIELDS)
+        for columns in results:
+            keys.update(dict.fromkeys(columns))
+        df = pandas.DataFrame(
+            {
+                key: list(
+                    itertools.chain.from_iterable(
+                        columns.get(key, [None] * length)
+                        for columns, length in zip(results, lengths)
+                    )
+                )
+                for key in keys
+            }
+        )
+        df.insert(
+            0, "dataset", pandas.Categorical.from_codes(codes, categories=datasets)
+        )
+        return self.client.postprocess(df, ["UpdateTime"])
+
+    async def requests(self, columns=None, **params):
+        """Query requests, fetching only the given fields
+
+        The columns are passed to the server as ``mask`` parameters, so that only
+        these fields of each request document are sent.
 
-        flat = []
+        Parameters
+        ----------
+        columns        list of request fields, e.g. ["RequestStatus", "InputDataset"],
+                       default is the full request documents
+        params         query parameters, e.g. status, name or inputdataset
+
+        Returns a pandas dataframe with a requestname column and one column per
+        requested field, missing fields being None
+        """
+        return self.client.postprocess(await self._requests(columns, params))
+
+    async def _requests(self, columns, params):
+        if columns is not None:
+            columns = list(columns)
+            params["mask"] = columns
+        result = await self.client.getjson(self.baseurl.join("request"), params=params)
+        names, items = [], []
         for row in result["result"]:
             for requestname, item in row.items():
-                for i, transition in enumerate(item["RequestTransition"]):
-                    flatrow = {
-                        "requestname": requestname,
-                        "current": (i + 1) == len(item["RequestTransition"]),
-                    }
-                    flatrow.update(params)
-                    flatrow.update(transition)
-                    flat.append(flatrow)
-
-        df = pandas.json_normalize(flat)
-        format_dates(df, ["UpdateTime"])
-        return df
+                names.append(requestname)
+                items.append(item)
+        if columns is None:
+            columns = list(dict.fromkeys(key for item in items for key in item))
+        data = {"requestname": names}
+        for column in columns:
+            data[column] = [item.get(column) for item in items]
+        return pandas.DataFrame(data, columns=list(data))
 
     async def stuck_transfers(self, timedelta=14):
         """Request stuck input datasets
 
         Default time delta is 14.
 
-        Returns a list of all stuck input datasets that are stuck more than timedelta days
+        Returns the name, input dataset and last transition time of all staging
+        requests whose last transition is more than timedelta days old
+        """
+        df = await self._requests(
+            ["RequestTransition", "InputDataset"], {"status": "staging"}
+        )
+        updated = [
+            transitions[-1]["UpdateTime"] if transitions else numpy.nan
+            for transitions in df["RequestTransition"]
+        ]
+        df["UpdateTime"] = numpy.array(updated, dtype=float)
+        threshold = time.time() - datetime.timedelta(days=timedelta).total_seconds()
+        df = df[(df["UpdateTime"] < threshold) & df["InputDataset"].notna()]
+        df = df[["requestname", "InputDataset", "UpdateTime"]].reset_index(drop=True)
+        return self.client.postprocess(df, ["UpdateTime"])
+
+    async def request_status(self, status="ACTIVE"):
+        """Current status of requests
+
+        Parameters
+        ----------
+        status         status or status group, e.g. "ACTIVE" or "running-open"
+
+        Returns a dictionary of request name to status
         """
-        params = {"status": "staging"}
-        stuck_data = []
+        params = {"status": status, "mask": "RequestStatus"}
         result = await self.client.getjson(self.baseurl.join("request"), params=params)
-        for row in result["result"]:
-            for requestname, item in row.items():
-                tstart = datetime.datetime.fromtimestamp(
-                    item["RequestTransition"][-1]["UpdateTime"]
-                )
-                current_time = datetime.datetime.now()
-                past_time = datetime.timedelta(days=timedelta)
-                if tstart < current_time - past_time:
-                    if item.get("InputDataset") is not None:
-                        input_data = {
-                            "InputDataset": item.get("InputDataset"),
-                            "UpdateTime": item["RequestTransition"][-1]["UpdateTime"],
-                        }
-                        stuck_data.append(input_data)
-        df = pandas.json_normalize(stuck_data)
-        format_dates(df, ["UpdateTime"])
-        return df
-
-    async def active_request_datasets(self):
+        return {
+            name: item["RequestStatus"]
+            for row in result["result"]
+            for name, item in row.items()
+        }
+
+    async def active_request_datasets(self, names=None):
+        """Datasets and team of active requests
+
+        Parameters
+        ----------
+        names          request names to query instead of all active requests
+
+        Returns a list of dictionaries, one per request
+        """
         params = {
-            "status": "ACTIVE",
             "mask": [
                 "InputDataset",
                 "OutputDatasets",
@@ -97,11 +264,15 @@ class ReqMgr:
                 "Team",
             ],
         }
+        if names is None:
+            params["status"] = "ACTIVE"
+        else:
+            params["name"] = list(names)
         result = await self.client.getjson(self.baseurl.join("request"), params=params)
-        result = result["result"][0]
+        result = result["result"][0] if result["result"] else {}
         for name, request in result.items():
             request["requestname"] = name
             # normalize schema a bit
-            if isinstance(request["InputDataset"], str):
+            if isinstance(request.get("InputDataset"), str):
                 request["InputDataset"] = [request["InputDataset"]]
         return list(result.values())
@@ -0,0 +1,232 @@
+import logging
+import pandas
+from .asyncutil import gather, retry
+
+
+logger = logging.getLogger(__name__)
+
+
+# Dataset roles indexed, and the request fields they come from
+ROLES = {
+    "input": "InputDataset",
+    "output": "OutputDatasets",
+    "pileup": "MCPileup",
+    "parent": None,
+}
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value] if value else []
+    return [item for item in value if item]
+
+
+class RequestIndex:
+    """Inverted index of active ReqMgr requests by dataset
+
+    Maps each input, output, pileup and (if a DBS client is given) parent
+    dataset of the active requests to the names of the requests using it,
+    held as dictionaries so that lookups are constant time.
+
+    On refresh, only the status of the active requests is queried. The
+    details of requests that are new or changed status are then fetched in
+    concurrent batches, and requests that are no longer active are dropped.
+
+    Usage::
+
+        index = await RequestIndex(client.reqmgr, client.dbs).load()
+        index.requests("/ZeroBias/Run2018D-v1/RAW", roles=["input", "parent"])
+    """
+
+    defaults = {
+        # Number of request names per details query
+        "batchsize": 100,
+        # Number of concurrent details queries
+        "concurrency": 4,
+        # Number of attempts for each query
+        "retries": 3,
+    }
+
+    def __init__(
+        self, reqmgr, dbs=None, batchsize=None, concurrency=None, retries=None
+    ):
+        if batchsize is None:
+            batchsize = RequestIndex.defaults["batchsize"]
+        if concurrency is None:
+            concurrency = RequestIndex.defaults["concurrency"]
+        if retries is None:
+            retries = RequestIndex.defaults["retries"]
+        self.reqmgr = reqmgr
+        self.dbs = dbs
+        self.batchsize = batchsize
+        self.concurrency = concurrency
+        self.retries = retries
+        # request name: {"status", "team", "datasets": [(role, dataset), ...]}
+        self._requests = {}
+        # role: {dataset: set of request names}
+        self._index = {role: {} for role in ROLES}
+        self._loaded = False
+
+    def __len__(self):
+        """Number of indexed requests"""
+        return len(self._requests)
+
+    def _add(self, name, status, request, parents):
+        datasets = []
+        for role, field in ROLES.items():
+            if field is not None:
+                datasets.extend(
+                    (role, dataset) for dataset in _as_list(request.get(field))
+                )
+        if request.get("IncludeParents"):
+            for dataset in _as_list(request.get("InputDataset")):
+                datasets.extend(
+                    ("parent", parent) for parent in parents.get(dataset, [])
+                )
+        datasets = list(dict.fromkeys(datasets))
+        for role, dataset in datasets:
+            self._index[role].setdefault(dataset, set()).add(name)
+        self._requests[name] = {
+            "status": status,
+            "team": request.get("Team"),
+            "datasets": datasets,
+        }
+
+    def _remove(self, name):
+        for role, dataset in self._requests.pop(name)["datasets"]:
+            names = self._index[role][dataset]
+            names.discard(name)
+            if not names:
+                del self._index[role][dataset]
+
+    async def _details(self, names):
+        batches = []
+        for start in range(0, len(names), self.batchsize):
+            stop = start + self.batchsize
+            batches.append(names[start:stop])
+
+        async def fetch(batch):
+            return await retry(
+                lambda: self.reqmgr.active_request_datasets(names=batch), self.retries
+            )
+
+        results = await gather(map(fetch, batches), self.concurrency)
+        return [request for result in results for request in result]
+
+    async def _parents(self, requests):
+        if self.dbs is None:
+            return {}
+        inputs = {
+            dataset
+            for request in requests
+            if request.get("IncludeParents")
+            for dataset in _as_list(request.get("InputDataset"))
+        }
+        if not inputs:
+            return {}
+        edges = await self.dbs.lineage(sorted(inputs), depth=1)
+        return edges.groupby("child")["parent"].apply(list).to_dict()
+
+    async def refresh(self):
+        """Update the index with the current active requests
+
+        Returns a dictionary with the number of added, updated and removed requests
+        """
+        statuses = await retry(
+            lambda: self.reqmgr.request_status("ACTIVE"), self.retries
+        )
+        removed = [name for name in self._requests if name not in statuses]
+        changed = [
+            name
+            for name, status in statuses.items()
+            if name not in self._requests or self._requests[name]["status"] != status
+        ]
+        requests = await self._details(changed)
+        parents = await self._parents(requests)
+        for name in removed:
+            self._remove(name)
+        added = updated = 0
+        for request in requests:
+            name = request["requestname"]
+            if name not in statuses:
+                continue
+            if name in self._requests:
+                self._remove(name)
+                updated += 1
+            else:
+                added += 1
+            self._add(name, statuses[name], request, parents)
+        self._loaded = True
+        out = {
+            "added": added,
+            "updated": updated,
+            "removed": len(removed),
+        }
+        logger.debug(f"Refreshed request index: {out}, {len(self)} active requests")
+        return out
+
+    async def load(self):
+        """Build the index if it was never built, and return self"""
+        if not self._loaded:
+            await self.refresh()
+        return self
+
+    def _check(self):
+        if not self._loaded:
+            raise RuntimeError(
+                "Request index not loaded, await RequestIndex.load() first"
+            )
+
+    def requests(self, dataset, roles=None):
+        """Sorted list of the names of active requests using a dataset
+
+        Parameters
+        ----------
+        dataset        dataset name
+        roles          list of roles to consider among "input", "output",
+                       "pileup" and "parent", default all
+        """
+        self._check()
+        if roles is None:
+            roles = ROLES
+        names = set()
+        for role in roles:
+            names |= self._index[role].get(dataset, set())
+        return sorted(names)
+
+    def teams(self, dataset, roles=None):
+        """Sorted list of the teams of active requests using a dataset"""
+        teams = {self._requests[name]["team"] for name in self.requests(dataset, roles)}
+        return sorted(team for team in teams if team)
+
+    def team(self, name):
+        """Team of a request, or None"""
+        self._check()
+        request = self._requests.get(name)
+        return request["team"] if request else None
+
+    def status(self, name):
+        """Status of a request, or None if not active"""
+        self._check()
+        request = self._requests.get(name)
+        return request["status"] if request else None
+
+    def datasets(self, name):
+        """List of (role, dataset) used by a request"""
+        self._check()
+        request = self._requests.get(name)
+        return list(request["datasets"]) if request else []
+
+    def table(self):
+        """All (dataset, role, request) combinations as a pandas dataframe"""
+        self._check()
+        rows = [
+            (dataset, role, name, request["team"], request["status"])
+            for name, request in self._requests.items()
+            for role, dataset in request["datasets"]
+        ]
+        return pandas.DataFrame(
+            rows, columns=["dataset", "role", "requestname", "team", "status"]
+        )
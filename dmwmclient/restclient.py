@@ -5,6 +5,7 @@ import httpx
 import asyncio
 from lxml import etree
 from . import __version__
+from .util import format_dates, compact_dtypes
 
 
 logger = logging.getLogger(__name__)
@@ -45,14 +46,24 @@ class RESTClient:
         "usercert": _defaultcert(),
         # Location of trusted x509 certificates
         "certdir": os.getenv("X509_CERT_DIR", "/etc/grid-security/certificates"),
+        # Convert returned dataframes to memory-efficient types
+        "compact": False,
+        # Additionally use Arrow-backed columns when compacting (requires pyarrow)
+        "arrow": False,
     }
 
-    def __init__(self, usercert=None, certdir=None):
+    def __init__(self, usercert=None, certdir=None, compact=None, arrow=None):
         if usercert is None:
             usercert = RESTClient.defaults["usercert"]
         if certdir is None:
             certdir = RESTClient.defaults["certdir"]
+        if compact is None:
+            compact = RESTClient.defaults["compact"]
+        if arrow is None:
+            arrow = RESTClient.defaults["arrow"]
         certdir = os.path.expanduser(certdir)
+        self.compact = compact
+        self.arrow = arrow
         self._ssoevents = {}
         self._client = httpx.AsyncClient(
             cert=usercert,
@@ -129,16 +140,31 @@ class RESTClient:
             "Could not parse CERN SSO login page (no sign-in link or auto-redirect found)"
         )
 
+    def postprocess(self, df, dates=()):
+        """Common post-processing of dataframes returned by the service clients
+
+        Converts the UNIX timestamp columns listed in dates to datetime,
+        and compacts column types if enabled for this client.
+        """
+        format_dates(df, list(dates))
+        if self.compact:
+            df = compact_dtypes(df, arrow=self.arrow)
+        return df
+
     def build_request(self, **params):
         return self._client.build_request(**params)
 
-    async def send(self, request, timeout=None, retries=1):
+    async def send(self, request, timeout=None, retries=1, stream=False):
         await self.cern_sso_check(request.url.host)
         # Looking forward to https://github.com/encode/httpx/pull/784
         while retries > 0:
             try:
-                result = await self._client.send(request, timeout=timeout)
+                result = await self._client.send(
+                    request, timeout=timeout, stream=stream
+                )
                 if result.status_code == 200 and result.url.host == "login.cern.ch":
+                    if stream:
+                        await result.aread()
                     if await self.cern_sso_check(request.url.host):
                         self._client.cookies.set_cookie_header(request)
                         continue
@@ -161,3 +187,21 @@ class RESTClient:
         except json.JSONDecodeError:
             logging.debug("Result content: {result.text}")
             raise IOError(f"Failed to decode json for request {request}")
+
+    async def iter_bytes(self, url, params=None, headers=None, timeout=None, retries=1):
+        """Stream the body of a GET request as chunks of bytes"""
+        request = self.build_request(
+            method="GET", url=url, params=params, headers=headers
+        )
+        result = await self.send(request, timeout=timeout, retries=retries, stream=True)
+        try:
+            if result.status_code != 200:
+                await result.aread()
+                logging.debug(f"Result content: {result.text}")
+                raise IOError(
+                    f"Received {result.status_code} status for request {request}"
+                )
+            async for chunk in result.aiter_bytes():
+                yield chunk
+        finally:
+            await result.aclose()
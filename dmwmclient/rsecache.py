@@ -0,0 +1,229 @@
+import asyncio
+import logging
+import re
+import pandas
+from .asyncutil import TTLCache, gather
+
+
+logger = logging.getLogger(__name__)
+
+
+class RSEExpressionError(ValueError):
+    """Raised for RSE expressions the local evaluator cannot handle"""
+
+
+class InvalidRSEExpression(ValueError):
+    """Raised for RSE expressions that resolve to no RSE, as by the Rucio server"""
+
+
+_token = re.compile(r"\s*(?:(?P<op>[|&\\()])|(?P<term>[^|&\\()\s]+))")
+_primitive = re.compile(
+    r"^(?P<key>[A-Za-z0-9_\-.]+)(?:(?P<cmp>[=<>])(?P<value>[A-Za-z0-9_\-.:]+))?$"
+)
+
+
+def _tokenize(expression):
+    tokens = []
+    pos = 0
+    expression = expression.strip()
+    while pos < len(expression):
+        m = _token.match(expression, pos)
+        if m is None:
+            raise RSEExpressionError(f"Cannot tokenize RSE expression {expression!r}")
+        tokens.append(m.group("op") or m.group("term"))
+        pos = m.end()
+    return tokens
+
+
+def _match(value, cmp, target):
+    if cmp == "=":
+        if isinstance(value, bool):
+            return str(value).lower() == target.lower()
+        return str(value) == target
+    try:
+        value, target = float(value), float(target)
+    except (TypeError, ValueError):
+        return False
+    return value < target if cmp == "<" else value > target
+
+
+def _resolve_term(term, attributes):
+    if term == "*":
+        return set(attributes)
+    m = _primitive.match(term)
+    if m is None:
+        raise RSEExpressionError(f"Unsupported RSE expression term {term!r}")
+    key, cmp, value = m.group("key", "cmp", "value")
+    if cmp is None:
+        # A bare term is an RSE name, or a boolean attribute
+        return {
+            rse
+            for rse, attr in attributes.items()
+            if rse == key or attr.get(key) is True
+        }
+    return {
+        rse
+        for rse, attr in attributes.items()
+        if key in attr and _match(attr[key], cmp, value)
+    }
+
+
+def evaluate_rse_expression(expression, attributes):
+    """Resolve an RSE expression against a mapping of RSE attributes
+
+    Supports attribute comparisons (``key=value``, ``key<value``, ``key>value``),
+    bare RSE names or boolean attributes, ``*``, and the set operators
+    ``|`` (union), ``&`` (intersection) and ``\\`` (difference) with parentheses.
+    As in the Rucio server, operators have no precedence and are applied left to right,
+    and an expression resolving to no RSE, e.g. an unknown RSE name, is an error.
+
+    Parameters
+    ----------
+        expression : str
+        attributes : dict
+            Mapping of RSE name to a dictionary of its attributes
+
+    Returns a set of RSE names. Raises InvalidRSEExpression if it is empty.
+    """
+    tokens = _tokenize(expression)
+    pos = 0
+
+    def operand():
+        nonlocal pos
+        if pos >= len(tokens):
+            raise RSEExpressionError(f"Unexpected end of RSE expression {expression!r}")
+        token = tokens[pos]
+        pos += 1
+        if token == "(":
+            out = sequence()
+            if pos >= len(tokens) or tokens[pos] != ")":
+                raise RSEExpressionError(
+                    f"Unbalanced parentheses in RSE expression {expression!r}"
+                )
+            pos += 1
+            return out
+        if token in {"|", "&", "\\", ")"}:
+            raise RSEExpressionError(
+                f"Unexpected {token!r} in RSE expression {expression!r}"
+            )
+        return _resolve_term(token, attributes)
+
+    def sequence():
+        nonlocal pos
+        out = operand()
+        while pos < len(tokens) and tokens[pos] != ")":
+            op = tokens[pos]
+            pos += 1
+            rhs = operand()
+            if op == "|":
+                out = out | rhs
+            elif op == "&":
+                out = out & rhs
+            elif op == "\\":
+                out = out - rhs
+            else:
+                raise RSEExpressionError(
+                    f"Unexpected {op!r} in RSE expression {expression!r}"
+                )
+        return out
+
+    out = sequence()
+    if pos != len(tokens):
+        raise RSEExpressionError(
+            f"Unbalanced parentheses in RSE expression {expression!r}"
+        )
+    if not out:
+        raise InvalidRSEExpression(
+            f"RSE expression {expression!r} resulted in an empty set"
+        )
+    return out
+
+
+class RSECache:
+    """Locally cached RSE metadata
+
+    All RSEs, their attributes and limits are loaded in bulk on first use, and
+    reloaded once older than ``ttl`` seconds. RSE expressions are resolved against
+    the cached attributes, falling back to the Rucio server for unsupported syntax.
+    """
+
+    defaults = {
+        # Lifetime of the cached RSE metadata in seconds
+        "ttl": 3600,
+        # Number of concurrent requests while loading
+        "concurrency": 10,
+    }
+
+    def __init__(self, rucio, ttl=None, concurrency=None):
+        if ttl is None:
+            ttl = RSECache.defaults["ttl"]
+        if concurrency is None:
+            concurrency = RSECache.defaults["concurrency"]
+        self.rucio = rucio
+        self.concurrency = concurrency
+        self._cache = TTLCache(ttl)
+
+    async def _load(self):
+        rses = await self.rucio.getjson("rses/")
+
+        async def detail(info):
+            rse = info["rse"]
+            attr, limits = await asyncio.gather(
+                self.rucio.getjson(f"rses/{rse}/attr/"),
+                self.rucio.getjson(f"rses/{rse}/limits"),
+            )
+            attributes = {
+                key: value
+                for key, value in info.items()
+                if isinstance(value, (str, int, float, bool))
+            }
+            for item in attr:
+                attributes.update(item)
+            return rse, {
+                "attributes": attributes,
+                "limits": {k: v for item in limits for k, v in item.items()},
+            }
+
+        out = dict(await gather(map(detail, rses), self.concurrency))
+        logger.debug(f"Loaded metadata for {len(out)} RSEs")
+        return out
+
+    async def metadata(self):
+        """Mapping of RSE name to its attributes and limits"""
+        return await self._cache.get("rses", self._load)
+
+    def invalidate(self):
+        """Force a reload on next access"""
+        self._cache.invalidate()
+
+    async def rses(self):
+        """Sorted list of all RSE names"""
+        return sorted(await self.metadata())
+
+    async def attributes(self, rse):
+        return (await self.metadata())[rse]["attributes"]
+
+    async def limits(self, rse):
+        return (await self.metadata())[rse]["limits"]
+
+    async def table(self):
+        """Get the attributes of all RSEs as a pandas dataframe indexed by RSE"""
+        metadata = await self.metadata()
+        return pandas.DataFrame.from_dict(
+            {rse: item["attributes"] for rse, item in metadata.items()}, orient="index"
+        ).sort_index()
+
+    async def expression(self, expression):
+        """Resolve an RSE expression to a sorted list of RSE names
+
+        Evaluated locally when possible, otherwise via the server.
+        Raises InvalidRSEExpression if it resolves to no RSE.
+        """
+        metadata = await self.metadata()
+        try:
+            attributes = {rse: item["attributes"] for rse, item in metadata.items()}
+            return sorted(evaluate_rse_expression(expression, attributes))
+        except RSEExpressionError as ex:
+            logger.debug(f"Falling back to server for RSE expression: {ex}")
+        result = await self.rucio.getjson("rses/", params={"expression": expression})
+        return sorted(item["rse"] for item in result)
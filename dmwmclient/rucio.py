@@ -7,14 +7,117 @@ import logging
 import httpx
 import pandas
 from urllib.parse import quote
+from .rsecache import RSECache
+from .util import conform
 
 
 logger = logging.getLogger(__name__)
 
 
+def _rule_rows(dic):
+    return [
+        {
+            "id": dic["id"],
+            "locks_ok_cnt": dic["locks_ok_cnt"],
+            "did_type": dic["did_type"],
+            "weight": dic["weight"],
+            "purge_replicas": dic["purge_replicas"],
+            "rse_expression": dic["rse_expression"],
+            "updated_at": dic["updated_at"],
+            "activity": dic["activity"],
+            "child_rule_id": dic["child_rule_id"],
+            "locks_stuck_cnt": dic["locks_stuck_cnt"],
+            "locks_replicating_cnt": dic["locks_replicating_cnt"],
+            "copies": dic["copies"],
+            "comments": dic["comments"],
+            "split_container": dic["split_container"],
+            "state": dic["state"],
+            "scope": dic["scope"],
+            "subscription_id": dic["subscription_id"],
+            "stuck_at": dic["stuck_at"],
+            "expires_at": dic["expires_at"],
+            "account": dic["account"],
+            "locked": dic["locked"],
+            "name": dic["name"],
+            "grouping": dic["grouping"],
+        }
+    ]
+
+
+def _lock_rows(lock):
+    return [
+        {
+            "rule_id": lock["rule_id"],
+            "scope": lock["scope"],
+            "name": lock["name"],
+            "rse": lock["rse"],
+            "state": lock["state"],
+        }
+    ]
+
+
+def _content_rows(key):
+    return [
+        {
+            "adler_32": key["adler32"],
+            "lfn": key["name"],
+            "bytes": key["bytes"],
+            "scope": key["scope"],
+            "type": key["type"],
+        }
+    ]
+
+
+def _replica_rows(instance):
+    return [
+        {
+            "lfn": instance["name"],
+            "bytes": instance["bytes"],
+            "pfn": _pfn,
+            "replica": instance["pfns"][_pfn]["rse"],
+        }
+        for _pfn in instance["pfns"].keys()
+    ]
+
+
+def _dataset_replica_rows(element):
+    return [
+        {
+            "accessed_at": element["accessed_at"],
+            "dataset_name": element["name"],
+            "rse": element["rse"],
+            "created_at": element["created_at"],
+            "Total_bytes": element["bytes"],
+            "Bytes_at_rse": element["available_bytes"],
+            "state": element["state"],
+            "updated_at": element["updated_at"],
+            "Total_files": element["length"],
+            "files_at_rse": element["available_length"],
+            "rse_id": element["rse_id"],
+        }
+    ]
+
+
+# Dataframe methods that can be streamed: (path, function converting a record to rows)
+STREAMABLE = {
+    "list_did_rules": ("dids/{scope}/{name}/rules", _rule_rows),
+    "list_content": ("dids/{scope}/{name}/dids", _content_rows),
+    "list_replicas": ("replicas/{scope}/{name}", _replica_rows),
+    "list_dataset_replicas": (
+        "replicas/{scope}/{name}/datasets",
+        _dataset_replica_rows,
+    ),
+}
+
+
 class Rucio:
     _lifetime = re.compile(r".*datetime\.datetime\(([0-9 ,]*)\)")
 
+    defaults = {
+        # Number of rows per dataframe in iter_chunks
+        "chunksize": 100000,
+    }
+
     def __init__(self, client, account=None, host=None, auth_host=None):
         self.host = httpx.URL("http://cms-rucio.cern.ch" if host is None else host)
         self.auth_host = httpx.URL(
@@ -27,6 +130,7 @@ class Rucio:
         self._account = os.getenv("RUCIO_ACCOUNT", account)
         if self._account is not None:
             self._headers = {"X-Rucio-Account": self._account}
+        self.rse_cache = RSECache(self)
 
     @property
     def account(self):
@@ -96,6 +200,50 @@ class Rucio:
             logger.debug(f"Result content:\n{result.text}")
             raise IOError(f"Failed to decode json for request {request}")
 
+    async def iter_json(self, path, params=None, timeout=None, retries=1):
+        """Stream the json records of a GET request as they arrive"""
+        await self.check_token()
+        chunks = self.client.iter_bytes(
+            self.host.join(path),
+            params=params,
+            headers=self._headers,
+            timeout=timeout,
+            retries=retries,
+        )
+        buffer = b""
+        async for chunk in chunks:
+            lines = (buffer + chunk).split(b"\n")
+            buffer = lines.pop()
+            for line in lines:
+                if len(line):
+                    yield json.loads(line)
+        if len(buffer):
+            yield json.loads(buffer)
+
+    async def iter_chunks(self, method, scope, name, chunksize=None):
+        """Stream a dataframe method as chunks of up to chunksize rows
+
+        Records are converted to rows as they arrive, so that memory use is
+        bounded by the chunk size. Chunks have the columns of the first one, and
+        are cast to its types where possible (integer columns with missing
+        values stay floating point). Supported methods are the keys of STREAMABLE.
+        """
+        if chunksize is None:
+            chunksize = Rucio.defaults["chunksize"]
+        template, rows = STREAMABLE[method]
+        path = template.format(scope=quote(scope, safe=""), name=quote(name, safe=""))
+        buffer, first = [], None
+        async for record in self.iter_json(path):
+            buffer.extend(rows(record))
+            while len(buffer) >= chunksize:
+                df = conform(pandas.json_normalize(buffer[:chunksize]), first)
+                del buffer[:chunksize]
+                if first is None:
+                    first = df
+                yield df
+        if len(buffer) or first is None:
+            yield conform(pandas.json_normalize(buffer), first)
+
     async def getjson(self, path, params=None, timeout=None, retries=1):
         return await self.jsonmethod(
             "GET", path, params=params, timeout=timeout, retries=retries
@@ -144,6 +292,38 @@ class Rucio:
         """
         return await self.getjson(f"rules/{rule_id}/analysis", timeout=60)
 
+    async def get_rule(self, rule_id, json=None):
+        """Shows a replication rule.
+        Parameters
+        ----------
+        rule_id             rule ID.
+        json                If True, returns json element. Otherwise, method returns a pandas dataframe
+                            with the same columns as list_did_rules.
+                            Default initialization = None.
+        """
+        data = await self.getjson("rules/" + quote(rule_id, safe=""))
+        if json is True:
+            return data[0]
+        return self.client.postprocess(
+            pandas.json_normalize([row for dic in data for row in _rule_rows(dic)])
+        )
+
+    async def list_rule_locks(self, rule_id, json=None):
+        """Shows the replica locks of a replication rule.
+        Parameters
+        ----------
+        rule_id             rule ID.
+        json                If True, returns json element. Otherwise, method returns a pandas dataframe
+                            with columns rule_id, scope, name, rse and state.
+                            Default initialization = None.
+        """
+        data = await self.getjson("rules/" + quote(rule_id, safe="") + "/locks")
+        if json is True:
+            return data
+        return self.client.postprocess(
+            pandas.json_normalize([row for lock in data for row in _lock_rows(lock)])
+        )
+
     async def list_did_rules(self, scope, name, json=None):
         """Shows the rules tha apply to a specific did.
         Parameters
@@ -159,38 +339,9 @@ class Rucio:
         if json is True:
             return await self.getjson(method)
         data = await self.getjson(method)
-        out = []
-        for dic in data:
-            rse = dic["rse_expression"]
-            out.append(
-                {
-                    "id": dic["id"],
-                    "locks_ok_cnt": dic["locks_ok_cnt"],
-                    "did_type": dic["did_type"],
-                    "weight": dic["weight"],
-                    "purge_replicas": dic["purge_replicas"],
-                    "rse_expression": rse,
-                    "updated_at": dic["updated_at"],
-                    "activity": dic["activity"],
-                    "child_rule_id": dic["child_rule_id"],
-                    "locks_stuck_cnt": dic["locks_stuck_cnt"],
-                    "locks_replicating_cnt": dic["locks_replicating_cnt"],
-                    "copies": dic["copies"],
-                    "comments": dic["comments"],
-                    "split_container": dic["split_container"],
-                    "state": dic["state"],
-                    "scope": dic["scope"],
-                    "subscription_id": dic["subscription_id"],
-                    "stuck_at": dic["stuck_at"],
-                    "expires_at": dic["expires_at"],
-                    "account": dic["account"],
-                    "locked": dic["locked"],
-                    "name": dic["name"],
-                    "grouping": dic["grouping"],
-                }
-            )
-        df = pandas.json_normalize(out)
-        return df
+        return self.client.postprocess(
+            pandas.json_normalize([row for dic in data for row in _rule_rows(dic)])
+        )
 
     async def delete_rule(self, rule_id, purge_replicas=None, immediate=False):
         await self.check_token()
@@ -232,19 +383,9 @@ class Rucio:
         if json is True:
             return await self.getjson(method)
         data = await self.getjson(method)
-        out = []
-        for key in data:
-            out.append(
-                {
-                    "adler_32": key["adler32"],
-                    "lfn": key["name"],
-                    "bytes": key["bytes"],
-                    "scope": key["scope"],
-                    "type": key["type"],
-                }
-            )
-        df = pandas.json_normalize(out)
-        return df
+        return self.client.postprocess(
+            pandas.json_normalize([row for key in data for row in _content_rows(key)])
+        )
 
     async def list_replicas(self, scope, name, json=None):
         """Shows file replicas.
@@ -261,19 +402,11 @@ class Rucio:
         if json is True:
             return await self.getjson(method)
         data = await self.getjson(method)
-        out = []
-        for instance in data:
-            for _pfn in instance["pfns"].keys():
-                out.append(
-                    {
-                        "lfn": instance["name"],
-                        "bytes": instance["bytes"],
-                        "pfn": _pfn,
-                        "replica": instance["pfns"][_pfn]["rse"],
-                    }
-                )
-        df = pandas.json_normalize(out)
-        return df
+        return self.client.postprocess(
+            pandas.json_normalize(
+                [row for instance in data for row in _replica_rows(instance)]
+            )
+        )
 
     async def list_dataset_replicas(self, scope, name, json=None):
         """Shows replicas of datasets (former block in phedex context).
@@ -292,25 +425,31 @@ class Rucio:
         if json is True:
             return await self.getjson(method)
         data = await self.getjson(method)
-        out = []
-        for element in data:
-            out.append(
-                {
-                    "accessed_at": element["accessed_at"],
-                    "dataset_name": element["name"],
-                    "rse": element["rse"],
-                    "created_at": element["created_at"],
-                    "Total_bytes": element["bytes"],
-                    "Bytes_at_rse": element["available_bytes"],
-                    "state": element["state"],
-                    "updated_at": element["updated_at"],
-                    "Total_files": element["length"],
-                    "files_at_rse": element["available_length"],
-                    "rse_id": element["rse_id"],
-                }
+        return self.client.postprocess(
+            pandas.json_normalize(
+                [row for element in data for row in _dataset_replica_rows(element)]
             )
-        df = pandas.json_normalize(out)
-        return df
+        )
+
+    async def list_dataset_replicas_bulk(self, dids, json=None):
+        """Shows replicas of many datasets (former blocks in phedex context) in one request.
+        Parameters
+        ----------
+        dids                list of {"scope": ..., "name": ...} dictionaries. Unknown datasets are ignored.
+        json                If True, returns json element. Otherwise, method returns a pandas dataframe
+                            with the same columns as list_dataset_replicas.
+                            Default initialization = None.
+        """
+        data = await self.jsonmethod(
+            "POST", "replicas/datasets/bulk", jsondata={"dids": list(dids)}
+        )
+        if json is True:
+            return data
+        return self.client.postprocess(
+            pandas.json_normalize(
+                [row for element in data for row in _dataset_replica_rows(element)]
+            )
+        )
 
     async def set_local_account_limit(self, account, rse, nbytes):
         await self.check_token()
@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import re
+import time
+import pandas
+
+
+logger = logging.getLogger(__name__)
+
+
+_suffix = re.compile(r"_(?:Disk|MSS|Buffer|Export|Tape|Temp|Test)$")
+
+
+def site_name(name):
+    """Site name of a PhEDEx node or Rucio RSE, e.g. T1_US_FNAL for T1_US_FNAL_Disk"""
+    return _suffix.sub("", name)
+
+
+def rse_name(node):
+    """RSE name corresponding to a PhEDEx node by convention, or None for buffer and export nodes"""
+    if node.endswith(("_Buffer", "_Export")):
+        return None
+    if node.endswith("_MSS"):
+        return node[: -len("_MSS")] + "_Tape"
+    return node
+
+
+class SiteMap:
+    """Mapping between PhEDEx node, Rucio RSE and site names
+
+    Built from the PhEDEx node list and the Rucio RSE list, and held as
+    dictionaries so that lookups are constant time. Once loaded, lookups are
+    synchronous and, when the data is older than ``ttl`` seconds, trigger a
+    reload in the background while the current mapping keeps being served.
+
+    Usage::
+
+        sitemap = await client.sitemap.load()
+        df["rse"] = sitemap.translate(df["replica.node"], "node", "rse")
+    """
+
+    defaults = {
+        # Seconds after which the mapping is reloaded in the background
+        "ttl": 3600,
+    }
+
+    def __init__(self, datasvc=None, rucio=None, ttl=None):
+        if ttl is None:
+            ttl = SiteMap.defaults["ttl"]
+        self.datasvc = datasvc
+        self.rucio = rucio
+        self.ttl = ttl
+        self._index = None
+        self._table = None
+        self._loaded = None
+        self._task = None
+
+    @classmethod
+    def from_names(cls, nodes, rses):
+        """Build a static mapping from lists of node and RSE names"""
+        out = cls()
+        out._build(nodes, rses)
+        return out
+
+    def _build(self, nodes, rses):
+        rses = set(rses)
+        rows = []
+        for node in sorted(set(nodes)):
+            rse = rse_name(node)
+            rows.append((node, rse if rse in rses else None, site_name(node)))
+        mapped = {rse for _, rse, _ in rows}
+        for rse in sorted(rses - mapped):
+            rows.append((None, rse, site_name(rse)))
+        table = pandas.DataFrame(rows, columns=["node", "rse", "site"], dtype=object)
+        index = {}
+        for source in ("node", "rse"):
+            rows = table[table[source].notna()]
+            for target in ("node", "rse", "site"):
+                if target != source:
+                    index[source, target] = {
+                        key: value
+                        for key, value in zip(rows[source], rows[target])
+                        if value is not None
+                    }
+        for target in ("node", "rse"):
+            rows = table[table[target].notna()]
+            index["site", target] = rows.groupby("site")[target].apply(list).to_dict()
+        self._table = table
+        self._index = index
+        self._loaded = time.monotonic()
+
+    async def _reload(self):
+        nodes, rses = await asyncio.gather(
+            self.datasvc.nodes(), self.rucio.getjson("rses/")
+        )
+        self._build(nodes["node.name"], [item["rse"] for item in rses])
+        logger.debug(f"Loaded site map of {len(self._table)} nodes and RSEs")
+
+    async def _background_reload(self):
+        try:
+            await self._reload()
+        except Exception as ex:
+            logger.warning(f"Failed to reload site map, keeping previous one: {ex!r}")
+        finally:
+            self._task = None
+
+    def _maybe_refresh(self):
+        if self.ttl is None or self.datasvc is None or self._task is not None:
+            return
+        if time.monotonic() - self._loaded < self.ttl:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._task = loop.create_task(self._background_reload())
+
+    async def load(self):
+        """Load the mapping if it was never loaded, and return self"""
+        if self._index is None:
+            await self._reload()
+        else:
+            self._maybe_refresh()
+        return self
+
+    def _get(self, source, target):
+        if self._index is None:
+            raise RuntimeError("Site map not loaded, await SiteMap.load() first")
+        self._maybe_refresh()
+        try:
+            return self._index[source, target]
+        except KeyError:
+            raise ValueError(f"Cannot translate from {source!r} to {target!r}")
+
+    def table(self):
+        """All known node, RSE and site name combinations as a pandas dataframe"""
+        self._get("node", "rse")
+        return self._table.copy()
+
+    def rse(self, node):
+        """RSE of a node, or None"""
+        return self._get("node", "rse").get(node)
+
+    def node(self, rse):
+        """Node of an RSE, or None"""
+        return self._get("rse", "node").get(rse)
+
+    def site(self, name):
+        """Site of a node or RSE, or None if neither is known"""
+        site = self._get("node", "site").get(name)
+        if site is None:
+            site = self._get("rse", "site").get(name)
+        return site
+
+    def nodes(self, site):
+        """List of nodes of a site"""
+        return self._get("site", "node").get(site, [])
+
+    def rses(self, site):
+        """List of RSEs of a site"""
+        return self._get("site", "rse").get(site, [])
+
+    def translate(self, values, source, target):
+        """Translate a column of names
+
+        Parameters
+        ----------
+        values         pandas Series (categoricals are translated per category) or list of names
+        source         "node" or "rse"
+        target         "node", "rse" or "site"
+
+        Returns a pandas Series, with NaN for unknown names
+        """
+        mapping = self._get(source, target)
+        if not isinstance(values, pandas.Series):
+            values = pandas.Series(values, dtype=object)
+        return values.map(mapping)
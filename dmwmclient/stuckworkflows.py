@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import time
+import pandas
+from .asyncutil import retry
+
+
+logger = logging.getLogger(__name__)
+
+
+# Rucio rule states, from least to most in need of attention
+RULE_STATES = ["OK", "REPLICATING", "INJECT", "WAITING_APPROVAL", "SUSPENDED", "STUCK"]
+# Rucio lock states counted as stuck
+STUCK_LOCKS = ("STUCK", "S")
+RULE_COLUMNS = [
+    "rule_id",
+    "state",
+    "rse_expression",
+    "locks_ok_cnt",
+    "locks_replicating_cnt",
+    "locks_stuck_cnt",
+]
+
+
+def rule_table(rules):
+    """Reduce a list of Rucio rule dictionaries to a dataframe of RULE_COLUMNS"""
+    df = pandas.DataFrame(
+        {
+            "rule_id": [rule["id"] for rule in rules],
+            "state": pandas.Categorical(
+                [rule.get("state") for rule in rules],
+                categories=RULE_STATES,
+                ordered=True,
+            ),
+            "rse_expression": [rule.get("rse_expression") for rule in rules],
+        }
+    )
+    for col in RULE_COLUMNS[3:]:
+        df[col] = pandas.array([rule.get(col) for rule in rules], dtype="Int64")
+    return df
+
+
+def summarize(stuck, transfers, rules, locks):
+    """Join the stages of the stuck workflow diagnosis into one row per workflow
+
+    Parameters
+    ----------
+        stuck : pandas.DataFrame
+            output of ReqMgr.stuck_transfers
+        transfers : pandas.DataFrame
+            columns requestname, rule_id
+        rules : pandas.DataFrame
+            output of rule_table
+        locks : pandas.DataFrame
+            stuck locks, columns rule_id, rse
+
+    Returns a dataframe from stuck, sorted by decreasing age, with the additional columns:
+        age                    time since the last transition of the request
+        rule_ids               list of the transfer rule IDs
+        rule_state             most severe state among the rules (see RULE_STATES)
+        locks_ok               number of OK locks of all rules
+        locks_replicating      number of replicating locks of all rules
+        locks_stuck            number of stuck locks of all rules
+        blocking_rses          sorted list of the RSEs of stuck locks
+    """
+    joined = transfers.merge(rules, on="rule_id", how="left")
+    grouped = joined.groupby("requestname", sort=False)
+    per_workflow = pandas.DataFrame(
+        {
+            "rule_ids": grouped["rule_id"].agg(list),
+            "rule_state": grouped["state"].max(),
+            "locks_ok": grouped["locks_ok_cnt"].sum(),
+            "locks_replicating": grouped["locks_replicating_cnt"].sum(),
+            "locks_stuck": grouped["locks_stuck_cnt"].sum(),
+        }
+    )
+    blocking = (
+        transfers.merge(locks[["rule_id", "rse"]], on="rule_id")
+        .drop_duplicates(["requestname", "rse"])
+        .sort_values("rse")
+        .groupby("requestname")["rse"]
+        .agg(list)
+        .rename("blocking_rses")
+    )
+    out = stuck.merge(per_workflow, left_on="requestname", right_index=True, how="left")
+    out = out.merge(blocking, left_on="requestname", right_index=True, how="left")
+    out.insert(
+        out.columns.get_loc("UpdateTime") + 1,
+        "age",
+        pandas.Timestamp(time.time(), unit="s") - out["UpdateTime"],
+    )
+    for col in ("rule_ids", "blocking_rses"):
+        out[col] = [value if isinstance(value, list) else [] for value in out[col]]
+    for col in ("locks_ok", "locks_replicating", "locks_stuck"):
+        out[col] = out[col].fillna(0).astype("Int64")
+    return out.sort_values("age", ascending=False, ignore_index=True)
+
+
+class StuckWorkflows:
+    """Diagnose workflows stuck in staging
+
+    Chains ReqMgr (staging requests with an old last transition), MSMgr
+    (rule IDs of all transfer records of each workflow) and Rucio (state of
+    each rule, and stuck locks of rules that have any). Each workflow's rules
+    are looked up as soon as its transfer records arrive, each rule is looked
+    up once, and requests to MSMgr and Rucio are bounded separately. The
+    stages are joined at the end with summarize.
+
+    Usage::
+
+        df = await StuckWorkflows(client.reqmgr, client.msmgr, client.rucio).diagnose()
+    """
+
+    defaults = {
+        # Number of concurrent MSMgr requests
+        "msmgr_concurrency": 10,
+        # Number of concurrent Rucio requests
+        "rucio_concurrency": 20,
+        # Number of attempts for each request
+        "retries": 3,
+    }
+
+    def __init__(
+        self,
+        reqmgr,
+        msmgr,
+        rucio,
+        msmgr_concurrency=None,
+        rucio_concurrency=None,
+        retries=None,
+    ):
+        if msmgr_concurrency is None:
+            msmgr_concurrency = StuckWorkflows.defaults["msmgr_concurrency"]
+        if rucio_concurrency is None:
+            rucio_concurrency = StuckWorkflows.defaults["rucio_concurrency"]
+        if retries is None:
+            retries = StuckWorkflows.defaults["retries"]
+        self.reqmgr = reqmgr
+        self.msmgr = msmgr
+        self.rucio = rucio
+        self.msmgr_concurrency = msmgr_concurrency
+        self.rucio_concurrency = rucio_concurrency
+        self.retries = retries
+
+    async def _rule(self, rule_id, semaphore):
+        try:
+            async with semaphore:
+                rule = await retry(
+                    lambda: self.rucio.get_rule(rule_id, json=True), self.retries
+                )
+            locks = []
+            if rule.get("locks_stuck_cnt"):
+                async with semaphore:
+                    locks = await retry(
+                        lambda: self.rucio.list_rule_locks(rule_id, json=True),
+                        self.retries,
+                    )
+                locks = [lock for lock in locks if lock["state"] in STUCK_LOCKS]
+        except IOError as ex:
+            logger.warning(f"Failed to look up rule {rule_id}: {ex!r}")
+            return {"id": rule_id}, []
+        return rule, locks
+
+    async def diagnose(self, timedelta=14):
+        """Diagnose the workflows stuck in staging for more than timedelta days
+
+        Returns a dataframe from summarize
+        """
+        stuck = await retry(
+            lambda: self.reqmgr.stuck_transfers(timedelta), self.retries
+        )
+        rucio_semaphore = asyncio.BoundedSemaphore(self.rucio_concurrency)
+        lookups = {}
+        parts = []
+        names = list(stuck["requestname"])
+        try:
+            async for df in self.msmgr.iter_transfers(
+                names, self.msmgr_concurrency, self.retries
+            ):
+                # records without rules have a missing rule_id
+                df = df[df["rule_id"].notna()]
+                parts.append(df[["workflow", "rule_id"]])
+                for rule_id in df["rule_id"]:
+                    if rule_id not in lookups:
+                        lookups[rule_id] = asyncio.ensure_future(
+                            self._rule(rule_id, rucio_semaphore)
+                        )
+            await asyncio.gather(*lookups.values())
+        finally:
+            for lookup in lookups.values():
+                lookup.cancel()
+        transfers = (
+            pandas.concat(
+                parts + [pandas.DataFrame(columns=["workflow", "rule_id"])],
+                ignore_index=True,
+            )
+            .rename(columns={"workflow": "requestname"})
+            .drop_duplicates()
+        )
+        lookups = [lookup.result() for lookup in lookups.values()]
+        rules = rule_table([rule for rule, _ in lookups])
+        locks = pandas.DataFrame(
+            [(lock["rule_id"], lock["rse"]) for _, locks in lookups for lock in locks],
+            columns=["rule_id", "rse"],
+        )
+        logger.info(
+            f"Diagnosing {len(names)} stuck workflows with {len(rules)} rules and {len(locks)} stuck locks"
+        )
+        return summarize(stuck, transfers, rules, locks)
@@ -0,0 +1,310 @@
+import asyncio
+import logging
+import sqlite3
+import time
+import pandas
+from .util import format_dates
+
+
+logger = logging.getLogger(__name__)
+
+
+# Stored column: DataSvc method column, for each series
+SERIES = {
+    "blockarrive": {
+        "block": "Block_Name",
+        "destination": "Destination",
+        "time_arrive": "Time_Arrive",
+        "time_update": "Time_update",
+        "files": "Number_of_files",
+        "gbytes": "Block_size_(GB)",
+        "basis": "Basis_code",
+    },
+    "blocklatency": {
+        "block": "Block",
+        "destination": "Destination",
+        "block_id": "Block_ID",
+        "dataset": "Dataset",
+        "bytes": "Size",
+        "files": "Number_of_files",
+        "time_create": "Time_create",
+        "time_update": "Time_update",
+        "custodial": "custodial",
+        "last_suspend": "last_suspend",
+        "last_replica": "last_replica",
+        "time_subscription": "time_subscription",
+        "block_closed": "block_closed",
+        "latency": "latency",
+    },
+}
+KEY = ["block", "destination"]
+# Columns identifying a row, per series: a block can have several latency
+# records at the same destination, one per subscription
+KEYS = {
+    "blockarrive": KEY,
+    "blocklatency": KEY + ["time_subscription"],
+}
+# Columns not considered when deciding if a row changed
+IGNORE = ["time_update"]
+DATES = [
+    "poll_time",
+    "time_arrive",
+    "time_update",
+    "time_create",
+    "last_suspend",
+    "last_replica",
+    "time_subscription",
+    "block_closed",
+]
+
+
+def _changed(a, b):
+    # elementwise a != b, with missing values equal to each other
+    return (a != b) & ~(a.isna() & b.isna())
+
+
+class BlockTimeSeries:
+    """Append-only history of DataSvc.blockarrive and blocklatency polls
+
+    Each poll is compared with the latest stored state of each key (see KEYS), and
+    only new or changed rows are appended, stamped with the poll time. A change
+    of ``time_update`` alone does not count as a change. History is kept in SQLite,
+    indexed by poll time and by key, so that windowed queries only read the rows
+    in the window.
+    """
+
+    defaults = {
+        # Seconds between polls in run()
+        "interval": 900,
+    }
+
+    def __init__(self, datasvc, path):
+        """
+        Parameters
+        ----------
+        datasvc        DataSvc instance
+        path           SQLite database file
+        """
+        self.datasvc = datasvc
+        self._db = sqlite3.connect(path)
+        self._latest = {}
+        with self._db:
+            for kind, columns in SERIES.items():
+                names = ", ".join(f'"{col}"' for col in columns)
+                self._db.execute(
+                    f"CREATE TABLE IF NOT EXISTS {kind} (poll_time, {names})"
+                )
+                self._db.execute(
+                    f"CREATE INDEX IF NOT EXISTS {kind}_time ON {kind} (poll_time)"
+                )
+                self._db.execute(
+                    f"CREATE INDEX IF NOT EXISTS {kind}_key ON {kind} (block, destination, poll_time)"
+                )
+                key = ", ".join(KEYS[kind])
+                self._db.execute(
+                    f"CREATE TABLE IF NOT EXISTS {kind}_latest (poll_time, {names}, PRIMARY KEY ({key}))"
+                )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS polls (kind, poll_time, rows, changed)"
+            )
+
+    def close(self):
+        self._db.close()
+
+    def latest(self, kind):
+        """Latest stored state of each key of a series"""
+        if kind not in self._latest:
+            # SQLite keeps rows whose key has a NULL as distinct, the last one is current
+            self._latest[kind] = (
+                pandas.read_sql_query(
+                    f"SELECT * FROM {kind}_latest ORDER BY rowid", self._db
+                )
+                .drop_duplicates(KEYS[kind], keep="last")
+                .reset_index(drop=True)
+            )
+        return self._latest[kind]
+
+    def record(self, kind, df, poll_time=None):
+        """Append the new and changed rows of a DataSvc result to a series
+
+        Parameters
+        ----------
+        kind           "blockarrive" or "blocklatency"
+        df             output of the DataSvc method, without human readable column names
+        poll_time      unix timestamp of the poll, default is now
+
+        Returns the number of rows appended
+        """
+        if poll_time is None:
+            poll_time = time.time()
+        columns = SERIES[kind]
+        key = KEYS[kind]
+        new = df.reindex(columns=list(columns.values()))
+        new.columns = list(columns)
+        epoch = pandas.Timestamp("1970-01-01")
+        for col in new.columns:
+            if pandas.api.types.is_datetime64_any_dtype(new[col]):
+                new[col] = (new[col] - epoch) / pandas.Timedelta(seconds=1)
+        new = new.drop_duplicates(key, keep="last")
+        new.insert(0, "poll_time", float(poll_time))
+
+        latest = self.latest(kind)
+        merged = new.merge(
+            latest, on=key, how="left", suffixes=("", "_prev"), indicator=True
+        )
+        changed = (merged["_merge"] == "left_only").to_numpy(copy=True)
+        for col in columns:
+            if col not in key and col not in IGNORE:
+                changed |= _changed(
+                    merged[col].astype(object), merged[col + "_prev"].astype(object)
+                ).to_numpy()
+        new = new[changed]
+
+        rows = list(new.astype(object).where(new.notna(), None).itertuples(index=False))
+        placeholders = ", ".join("?" * len(new.columns))
+        with self._db:
+            self._db.executemany(
+                f"INSERT INTO {kind} VALUES ({placeholders})", map(tuple, rows)
+            )
+            self._db.executemany(
+                f"INSERT OR REPLACE INTO {kind}_latest VALUES ({placeholders})",
+                map(tuple, rows),
+            )
+            self._db.execute(
+                "INSERT INTO polls VALUES (?, ?, ?, ?)",
+                (kind, float(poll_time), len(df), len(new)),
+            )
+        self._latest[kind] = (
+            pandas.concat([latest, new], ignore_index=True)
+            .drop_duplicates(key, keep="last")
+            .reset_index(drop=True)
+        )
+        logger.debug(f"Recorded {len(new)} changed {kind} rows out of {len(df)}")
+        return len(new)
+
+    async def poll(self, kinds=("blockarrive", "blocklatency"), **params):
+        """Fetch the given series concurrently and record them
+
+        Parameters
+        ----------
+        kinds          DataSvc methods to poll
+        params         parameters passed to each method
+
+        Returns a dictionary of the number of rows appended per series
+        """
+        poll_time = time.time()
+        results = await asyncio.gather(
+            *(getattr(self.datasvc, kind)(**params) for kind in kinds)
+        )
+        return {
+            kind: self.record(kind, df, poll_time) for kind, df in zip(kinds, results)
+        }
+
+    async def run(self, interval=None, count=None, **params):
+        """Poll every interval seconds, count times or forever"""
+        if interval is None:
+            interval = BlockTimeSeries.defaults["interval"]
+        n = 0
+        while count is None or n < count:
+            start = time.time()
+            try:
+                changed = await self.poll(**params)
+                logger.info(f"Recorded changes: {changed}")
+            except IOError as ex:
+                logger.warning(f"Poll failed: {ex!r}")
+            n += 1
+            if count is None or n < count:
+                await asyncio.sleep(max(0, interval - (time.time() - start)))
+
+    def _window(self, since, until, block, destination):
+        where, args = [], []
+        if since is not None:
+            where.append("b.poll_time >= ?")
+            args.append(float(since))
+        if until is not None:
+            where.append("b.poll_time < ?")
+            args.append(float(until))
+        for column, values in (("block", block), ("destination", destination)):
+            if values is not None:
+                if isinstance(values, str):
+                    values = [values]
+                where.append(f"b.{column} IN ({', '.join('?' * len(values))})")
+                args.extend(values)
+        return (" WHERE " + " AND ".join(where)) if where else "", args
+
+    def history(self, kind, since=None, until=None, block=None, destination=None):
+        """Recorded rows of a series in a time window
+
+        Parameters
+        ----------
+        kind           "blockarrive" or "blocklatency"
+        since          unix timestamp, only rows polled at or after this time
+        until          unix timestamp, only rows polled before this time
+        block          block name, can be multiple
+        destination    destination node name, can be multiple
+        """
+        where, args = self._window(since, until, block, destination)
+        df = pandas.read_sql_query(
+            f"SELECT * FROM {kind} b{where} ORDER BY b.poll_time", self._db, params=args
+        )
+        return format_dates(df, [col for col in DATES if col in df.columns])
+
+    def _previous(self, column, since, until, block, destination):
+        # each row in the window, with the value of column in the previous row of its key
+        where, args = self._window(since, until, block, destination)
+        query = f"""
+            SELECT b.block, b.destination, b.poll_time, b.{column},
+                p.poll_time AS previous_poll_time, p.{column} AS previous_{column}
+            FROM blockarrive b LEFT JOIN blockarrive p
+            ON p.rowid = (
+                SELECT rowid FROM blockarrive
+                WHERE block = b.block AND destination = b.destination AND poll_time < b.poll_time
+                ORDER BY poll_time DESC LIMIT 1
+            ){where}
+            ORDER BY b.poll_time
+        """
+        return pandas.read_sql_query(query, self._db, params=args)
+
+    def basis_transitions(self, since=None, until=None, block=None, destination=None):
+        """Changes of blockarrive basis code recorded in a time window
+
+        Parameters are as for history. Returns one row per transition, with the
+        previous and new basis code and the times of both polls.
+        """
+        df = self._previous("basis", since, until, block, destination)
+        df = df[df["previous_basis"].notna() & (df["previous_basis"] != df["basis"])]
+        df = df[KEY + ["previous_poll_time", "poll_time", "previous_basis", "basis"]]
+        return format_dates(
+            df.reset_index(drop=True), ["previous_poll_time", "poll_time"]
+        )
+
+    def eta_drift(self, since=None, until=None, block=None, destination=None):
+        """Drift of the blockarrive estimated time of arrival in a time window
+
+        Parameters are as for history. Returns one row per (block, destination)
+        with a change in the window, with columns:
+            changes        number of recorded changes
+            first_poll     time of the first change
+            last_poll      time of the last change
+            eta_before     estimate before the window, or at its first change
+            eta_after      estimate at the last change
+            drift          eta_after - eta_before, in seconds
+        sorted by decreasing drift
+        """
+        df = self._previous("time_arrive", since, until, block, destination)
+        first = df.drop_duplicates(KEY, keep="first").set_index(KEY)
+        last = df.drop_duplicates(KEY, keep="last").set_index(KEY)
+        out = pandas.DataFrame(
+            {
+                "changes": df.groupby(KEY).size(),
+                "first_poll": first["poll_time"],
+                "last_poll": last["poll_time"],
+                "eta_before": first["previous_time_arrive"].fillna(
+                    first["time_arrive"]
+                ),
+                "eta_after": last["time_arrive"],
+            }
+        )
+        out["drift"] = out["eta_after"] - out["eta_before"]
+        out = out.sort_values("drift", ascending=False).reset_index()
+        return format_dates(out, ["first_poll", "last_poll", "eta_before", "eta_after"])
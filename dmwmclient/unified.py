@@ -1,6 +1,15 @@
+import asyncio
+import hashlib
+import inspect
+import json
+import logging
+import time
 import httpx
 
 
+logger = logging.getLogger(__name__)
+
+
 class Unified:
     """Unified REST API
 
@@ -10,6 +19,8 @@ class Unified:
     defaults = {
         # Unified base URL with trailing slash
         "unified_base": "https://cms-unified.web.cern.ch/cms-unified/",
+        # Seconds between polls of a Poller
+        "poll_interval": 300,
     }
 
     def __init__(self, client, unified_base=None):
@@ -23,3 +34,141 @@ class Unified:
             url=self.baseurl.join("transfer_statuses.json"),
         )
         return res
+
+    async def conditional_get(self, path, etag=None, last_modified=None):
+        """Get a document unless it is unchanged since a previous response
+
+        Parameters
+        ----------
+        path           document path, e.g. "transfer_statuses.json"
+        etag           ETag header of the previous response
+        last_modified  Last-Modified header of the previous response
+
+        Returns a tuple (content, etag, last_modified), with content None if
+        the server reports the document as not modified
+        """
+        headers = {}
+        if etag is not None:
+            headers["If-None-Match"] = etag
+        if last_modified is not None:
+            headers["If-Modified-Since"] = last_modified
+        request = self.client.build_request(
+            method="GET", url=self.baseurl.join(path), headers=headers
+        )
+        result = await self.client.send(request)
+        if result.status_code == 304:
+            return None, etag, last_modified
+        if result.status_code != 200:
+            raise IOError(
+                f"Failed to execute request {request}, result: ({result.status_code}) {result.text}"
+            )
+        return (
+            result.content,
+            result.headers.get("ETag"),
+            result.headers.get("Last-Modified"),
+        )
+
+    def poller(self, path="transfer_statuses.json", interval=None):
+        """Create a Poller of a Unified JSON document, by default transfer_statuses"""
+        return Poller(self, path, interval)
+
+
+class Poller:
+    """Poll a Unified JSON document and publish the entries that changed
+
+    Each poll is a conditional request, using the ETag and Last-Modified
+    headers of the previous response. If the server still sends the document,
+    its SHA-256 digest is compared with the previous one before it is decoded.
+    A changed document, which must be a JSON object or array, is compared key
+    by key (or index by index) with the previous one, and the delta is passed
+    to the subscribers.
+
+    Usage::
+
+        poller = client.unified.poller()
+        poller.subscribe(lambda delta: print(delta["updated"].keys()))
+        await poller.run()
+    """
+
+    def __init__(self, unified, path, interval=None):
+        if interval is None:
+            interval = Unified.defaults["poll_interval"]
+        self.unified = unified
+        self.path = path
+        self.interval = interval
+        self.snapshot = {}
+        self._etag = None
+        self._last_modified = None
+        self._digest = None
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        """Call callback(delta) for each change, callback can be a coroutine function"""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self._subscribers.remove(callback)
+
+    def _delta(self, document):
+        if isinstance(document, list):
+            document = dict(enumerate(document))
+        updated = {
+            key: value
+            for key, value in document.items()
+            if key not in self.snapshot or self.snapshot[key] != value
+        }
+        removed = [key for key in self.snapshot if key not in document]
+        self.snapshot = document
+        return {"updated": updated, "removed": removed}
+
+    async def poll(self):
+        """Poll once
+
+        Returns the delta, a dictionary with the new or changed entries under
+        "updated" and the keys of the entries that disappeared under "removed",
+        or None if nothing changed
+        """
+        content, etag, last_modified = await self.unified.conditional_get(
+            self.path, self._etag, self._last_modified
+        )
+        if content is None:
+            logger.debug(f"{self.path} not modified")
+            return None
+        digest = hashlib.sha256(content).digest()
+        if digest == self._digest:
+            logger.debug(f"{self.path} content unchanged")
+            self._etag, self._last_modified = etag, last_modified
+            return None
+        try:
+            document = json.loads(content)
+        except json.JSONDecodeError:
+            raise IOError(f"Failed to decode json of {self.path}")
+        if not isinstance(document, (dict, list)):
+            raise IOError(f"{self.path} is not a JSON object or array")
+        # only once the document is known to be valid, so that a bad one is fetched again
+        self._etag, self._last_modified = etag, last_modified
+        self._digest = digest
+        delta = self._delta(document)
+        if not delta["updated"] and not delta["removed"]:
+            return None
+        logger.debug(
+            f"{self.path}: {len(delta['updated'])} updated and {len(delta['removed'])} removed entries"
+        )
+        for callback in list(self._subscribers):
+            result = callback(delta)
+            if inspect.isawaitable(result):
+                await result
+        return delta
+
+    async def run(self, count=None):
+        """Poll every interval seconds, count times or forever"""
+        n = 0
+        while count is None or n < count:
+            start = time.time()
+            try:
+                await self.poll()
+            except IOError as ex:
+                logger.warning(f"Poll of {self.path} failed: {ex!r}")
+            n += 1
+            if count is None or n < count:
+                await asyncio.sleep(max(0, self.interval - (time.time() - start)))
@@ -1,8 +1,187 @@
+import codecs
+import json
+import logging
+import re
+import numpy
 import pandas
 
 
+logger = logging.getLogger(__name__)
+
+
+_separator = re.compile(r"[\s,]*")
+_delimiter = re.compile(r"[\s,\]]")
+_pandas_major = int(pandas.__version__.split(".")[0])
+
+
 def format_dates(df, columns):
-    """Convert UNIX timestamp columns to datetime"""
-    if df.size > 0:
-        df[columns] = df[columns].apply(lambda v: pandas.to_datetime(v, unit="s"))
+    """Convert UNIX timestamp columns to datetime
+
+    All columns are converted together in a single vectorized call
+    """
+    if df.size > 0 and len(columns) > 0:
+        values = df[columns].to_numpy(dtype=numpy.float64)
+        dates = pandas.to_datetime(values.ravel(), unit="s").to_numpy()
+        dates = dates.reshape(values.shape)
+        for i, col in enumerate(columns):
+            df[col] = dates[:, i]
+    return df
+
+
+def compact_dtypes(df, categorical_threshold=0.5, arrow=False):
+    """Convert the columns of a dataframe to memory-efficient types
+
+    - string columns with few distinct values become categorical
+    - y/n flag columns become boolean
+    - integer columns, and floating point columns holding only whole numbers,
+      are downcast to the smallest integer type that fits
+    - optionally, the remaining columns are converted to Arrow-backed types
+      (requires pyarrow; with pandas < 2.0 they get the pandas nullable types instead)
+
+    The memory saved, in bytes, is logged and stored in ``df.attrs["memory_saved"]``
+
+    Parameters
+    ----------
+        categorical_threshold : float
+            Maximum ratio of distinct values to rows for a categorical column
+        arrow : bool
+            Convert to Arrow-backed types
+    """
+    before = df.memory_usage(deep=True).sum()
+    out = {}
+    for col in df.columns:
+        values = df[col]
+        if pandas.api.types.is_bool_dtype(values) or isinstance(
+            values.dtype, pandas.CategoricalDtype
+        ):
+            out[col] = values
+        elif pandas.api.types.is_integer_dtype(values):
+            out[col] = pandas.to_numeric(values, downcast="integer")
+        elif pandas.api.types.is_float_dtype(values):
+            if values.notna().all() and (values == numpy.floor(values)).all():
+                out[col] = pandas.to_numeric(values, downcast="integer")
+            else:
+                out[col] = values
+        elif pandas.api.types.is_object_dtype(
+            values
+        ) or pandas.api.types.is_string_dtype(values):
+            try:
+                distinct = values.dropna().unique()
+            except TypeError:
+                # e.g. columns of lists
+                out[col] = values
+                continue
+            if (
+                len(distinct) > 0
+                and set(distinct) <= {"y", "n"}
+                and values.notna().all()
+            ):
+                out[col] = values == "y"
+            elif len(values) > 0 and len(distinct) <= categorical_threshold * len(
+                values
+            ):
+                out[col] = values.astype("category")
+            else:
+                out[col] = values
+        else:
+            out[col] = values
+    result = pandas.DataFrame(out, index=df.index)
+    if arrow:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError("Arrow-backed columns require pyarrow to be installed")
+        if _pandas_major >= 2:
+            result = result.convert_dtypes(dtype_backend="pyarrow")
+        else:
+            result = result.convert_dtypes()
+    result.attrs = dict(df.attrs)
+    saved = before - result.memory_usage(deep=True).sum()
+    result.attrs["memory_saved"] = int(saved)
+    logger.debug(f"Compacted dataframe of {before} bytes by {saved} bytes")
+    return result
+
+
+def chunked(df, chunksize):
+    """Split a dataframe into views of up to chunksize rows
+
+    An empty dataframe yields a single empty chunk, so that the schema is preserved
+    """
+    for start in range(0, max(len(df), 1), chunksize):
+        stop = start + chunksize
+        yield df.iloc[start:stop]
+
+
+async def iter_chunks(coro, chunksize):
+    """Await a coroutine returning a dataframe and yield it in chunks"""
+    for chunk in chunked(await coro, chunksize):
+        yield chunk
+
+
+def conform(df, reference):
+    """Cast a dataframe to the columns and types of a reference dataframe where possible"""
+    if reference is None:
+        return df
+    df = df.reindex(columns=reference.columns)
+    for col, dtype in reference.dtypes.items():
+        if df[col].dtype != dtype:
+            try:
+                df[col] = df[col].astype(dtype)
+            except (TypeError, ValueError):
+                pass
     return df
+
+
+async def iter_json_array(chunks):
+    """Incrementally decode a JSON array as its chunks arrive
+
+    Parameters
+    ----------
+        chunks : async iterable of bytes
+            The JSON document, whose top level must be an array
+
+    Yields, for each chunk, the list of array elements it completes
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    started = finished = eof = False
+    chunks = chunks.__aiter__()
+    while not finished:
+        try:
+            buffer += text.decode(await chunks.__anext__())
+        except StopAsyncIteration:
+            buffer += text.decode(b"", final=True)
+            eof = True
+        items = []
+        pos = _separator.match(buffer).end()
+        if not started and pos < len(buffer):
+            if buffer[pos] != "[":
+                raise ValueError("JSON document is not an array")
+            started = True
+            pos = _separator.match(buffer, pos + 1).end()
+        while started and pos < len(buffer):
+            if buffer[pos] == "]":
+                finished = True
+                break
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # incomplete element, wait for more data
+                if eof:
+                    raise
+                break
+            if (
+                not eof
+                and not isinstance(item, (dict, list, str))
+                and not _delimiter.match(buffer, end)
+            ):
+                # a number may continue in the next chunk
+                break
+            items.append(item)
+            pos = _separator.match(buffer, end).end()
+        buffer = buffer[pos:]
+        if items:
+            yield items
+        if eof and not finished:
+            raise ValueError("Truncated JSON array")
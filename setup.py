@@ -31,10 +31,11 @@ setup(
     download_url="https://github.com/nsmith-/dmwmclient/releases",
     license="BSD 3-clause",
     test_suite="tests",
-    install_requires=["httpx==0.12", "lxml", "ipython", "pandas>=1.1.0"],
+    install_requires=["httpx==0.12", "lxml", "ipython", "pandas>=1.1.0", "numpy"],
     extras_require={
         "dev": ["flake8", "black", "pytest-asyncio"],
-        "cli": ["matplotlib"],
+        "cli": ["matplotlib", "pyarrow"],
+        "arrow": ["pyarrow"],
     },
     classifiers=[
         "Development Status :: 3 - Alpha",
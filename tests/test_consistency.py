@@ -0,0 +1,46 @@
+import pandas
+from dmwmclient.consistency import classify, phedex_side, rucio_side
+from dmwmclient.sitemap import SiteMap
+
+
+def test_classify():
+    sitemap = SiteMap.from_names(
+        ["T2_CH_CERN", "T1_US_FNAL_MSS", "T1_US_FNAL_Buffer", "T2_DE_DESY"],
+        ["T2_CH_CERN", "T1_US_FNAL_Tape", "T2_DE_DESY"],
+    )
+    phedex = phedex_side(
+        pandas.DataFrame(
+            {
+                "name": ["/A/B/C#1", "/A/B/C#1", "/A/B/C#2", "/A/B/C#3", "/A/B/C#3"],
+                "bytes": [100, 100, 200, 300, 300],
+                "replica.node": [
+                    "T2_CH_CERN",
+                    "T1_US_FNAL_MSS",
+                    "T2_CH_CERN",
+                    "T2_CH_CERN",
+                    "T1_US_FNAL_Buffer",
+                ],
+                "replica.bytes": [100, 100, 200, 300, 300],
+                "replica.complete": ["y", "y", "y", "y", "y"],
+            }
+        ),
+        sitemap,
+    )
+    rucio = rucio_side(
+        pandas.DataFrame(
+            {
+                "dataset_name": ["/A/B/C#1", "/A/B/C#2", "/A/B/C#3", "/A/B/C#3"],
+                "rse": ["T2_CH_CERN", "T2_CH_CERN", "T2_CH_CERN", "T2_DE_DESY"],
+                "Total_bytes": [100, 250, 300, 300],
+                "Bytes_at_rse": [50, 250, 300, 300],
+                "state": ["UNAVAILABLE", "AVAILABLE", "AVAILABLE", "AVAILABLE"],
+            }
+        )
+    )
+    df = classify(phedex, rucio).set_index(["block", "rse"])["category"]
+    assert df["/A/B/C#1", "T2_CH_CERN"] == "incomplete"
+    assert df["/A/B/C#1", "T1_US_FNAL_Tape"] == "missing_in_rucio"
+    assert df["/A/B/C#2", "T2_CH_CERN"] == "size_mismatch"
+    assert df["/A/B/C#3", "T2_CH_CERN"] == "ok"
+    assert df["/A/B/C#3", "T2_DE_DESY"] == "missing_in_phedex"
+    assert len(df) == 5
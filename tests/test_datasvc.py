@@ -1,5 +1,9 @@
+import httpx
+import pandas
 import pytest
 from dmwmclient import Client
+from dmwmclient.datasvc import DataSvc
+from dmwmclient.util import format_dates
 
 
 @pytest.mark.asyncio
@@ -8,3 +12,180 @@ async def test_ping():
 
     res = await client.datasvc.jsonmethod("bounce", asdf="hi there")
     assert res['phedex']['bounce'] == {'asdf': 'hi there'}
+
+
+# request id, creation time, decided nodes
+REQUESTS = [
+    (1, 1000.0, ["T1_A"]),
+    (2, 1100.0, ["T1_A", "T2_B"]),
+    (3, 1200.0, ["T2_B", "T2_B"]),
+    (4, 1250.5, ["T2_C"]),
+    (5, 1300.0, []),
+]
+
+
+class FakeClient:
+    def __init__(self):
+        self.queries = []
+
+    async def getjson(self, url, params):
+        self.queries.append(params)
+        since = params.get("create_since", 0)
+        until = params.get("create_until", float("inf"))
+        requests = [
+            {
+                "id": request,
+                "time_create": created,
+                "requested_by": "someone",
+                "approval": "approved",
+                "node": [
+                    {"name": node, "time_decided": created + 10, "decided_by": "admin"}
+                    for node in nodes
+                ],
+            }
+            for request, created, nodes in REQUESTS
+            if since <= created <= until
+        ]
+        return {"phedex": {"request": requests}}
+
+    def postprocess(self, df, dates=()):
+        return format_dates(df, dates)
+
+
+def test_shards(monkeypatch):
+    datasvc = DataSvc(FakeClient())
+    shards = datasvc.shards(node=["T1_A", "T2_B"], complete="y")
+    assert shards == [
+        {"complete": "y", "node": "T1_A"},
+        {"complete": "y", "node": "T2_B"},
+    ]
+
+    monkeypatch.setitem(DataSvc.defaults, "max_query_length", 100)
+    blocks = [f"/A/B/RAW#{i:04d}" for i in range(10)]
+    shards = datasvc.shards(block=blocks, node=["T1_A", "T2_B"])
+    assert len(shards) > 2
+    assert {shard["node"] for shard in shards} == {"T1_A", "T2_B"}
+    for node in ("T1_A", "T2_B"):
+        batches = [shard["block"] for shard in shards if shard["node"] == node]
+        assert [block for batch in batches for block in batch] == blocks
+    for shard in shards:
+        assert len(str(httpx.QueryParams(shard))) <= 100
+
+    shards = datasvc.shards(window=100, create_since=1000, create_until=1250)
+    assert shards == [
+        {"create_since": 1000, "create_until": 1100},
+        {"create_since": 1100, "create_until": 1200},
+        {"create_since": 1200, "create_until": 1250},
+    ]
+    with pytest.raises(ValueError):
+        datasvc.shards(window=100, node="T1_A")
+    with pytest.raises(ValueError):
+        datasvc.shards(block=blocks, dataset=["/A/B/RAW"])
+
+
+@pytest.mark.asyncio
+async def test_sharded():
+    client = FakeClient()
+    datasvc = DataSvc(client)
+    expected = await datasvc.requestlist(create_since=1000, create_until=1300)
+    assert len(expected) == 6
+    df = await datasvc.sharded(
+        "requestlist", window=100, concurrency=2, create_since=1000, create_until=1300
+    )
+    assert len(client.queries) == 4  # one unsharded and three windows
+    # requests 2 and 3 are on window boundaries, and request 3 has a duplicated node
+    pandas.testing.assert_frame_equal(
+        df.sort_values("request_id", kind="stable", ignore_index=True), expected
+    )
+    df = await datasvc.sharded(
+        "requestlist",
+        window=100,
+        human_readable=True,
+        create_since=1000,
+        create_until=1300,
+    )
+    assert len(df) == 6
+    with pytest.raises(ValueError):
+        await datasvc.sharded("blockreplicas", window=100, create_since=1000)
+
+
+@pytest.mark.asyncio
+async def test_sharded_empty():
+    client = FakeClient()
+    datasvc = DataSvc(client)
+    expected = await datasvc.requestlist(create_since=1000, create_until=1300)
+    # the last three windows have no requests
+    df = await datasvc.sharded(
+        "requestlist", window=100, create_since=1000, create_until=1600
+    )
+    pandas.testing.assert_frame_equal(
+        df.sort_values("request_id", kind="stable", ignore_index=True), expected
+    )
+    # all windows empty
+    df = await datasvc.sharded(
+        "requestlist", window=100, create_since=2000, create_until=2200
+    )
+    assert len(df) == 0
+    assert list(df.columns) == list(expected.columns)
+    assert df["time_created"].dtype.kind == df["time_decided"].dtype.kind == "M"
+    # no shards at all
+    client.queries = []
+    df = await datasvc.sharded(
+        "requestlist", window=100, human_readable=True, create_since=1000, create_until=1000
+    )
+    assert client.queries == []
+    assert len(df) == 0
+    assert df["Time Created"].dtype.kind == "M"
+
+
+MISSINGFILES_XML = b"""<?xml version="1.0" encoding="utf-8"?>
+<phedex>
+  <block name="/A/B/RAW#1">
+    <file name="/store/1.root" checksum="adler32:1" bytes="1000" time_create="1600000000" origin_node="T0_CH_CERN">
+      <missing node_name="T1_A" se="a.se" custodial="y" subscribed="y"/>
+      <missing node_name="T2_B" se="b.se" custodial="n" subscribed="y"/>
+    </file>
+    <file name="/store/2.root" checksum="adler32:2" bytes="2000" time_create="1600000100" origin_node="T0_CH_CERN">
+      <missing node_name="T1_A" se="a.se" custodial="y" subscribed="n"/>
+    </file>
+  </block>
+</phedex>
+"""
+
+
+class FakeStreamClient:
+    def __init__(self):
+        self.queries = []
+
+    async def iter_bytes(self, url, params=None):
+        self.queries.append((str(url), params))
+        for start in range(0, len(MISSINGFILES_XML), 10):
+            stop = start + 10
+            yield MISSINGFILES_XML[start:stop]
+
+    def postprocess(self, df, dates=()):
+        return format_dates(df, dates)
+
+
+@pytest.mark.asyncio
+async def test_iter_xml():
+    client = FakeStreamClient()
+    datasvc = DataSvc(client)
+    dfs = [
+        df async for df in datasvc.iter_chunks("missingfiles", 2, block="/A/B/RAW#1")
+    ]
+    assert client.queries == [
+        (
+            "https://cmsweb.cern.ch/phedex/datasvc/xml/prod/missingfiles",
+            {"block": "/A/B/RAW#1"},
+        )
+    ]
+    assert [len(df) for df in dfs] == [2, 1]
+    df = pandas.concat(dfs, ignore_index=True)
+    assert df["file_name"].tolist() == ["/store/1.root"] * 2 + ["/store/2.root"]
+    assert df["missing_from"].tolist() == ["T1_A", "T2_B", "T1_A"]
+    assert df["size"].tolist() == [1000.0, 1000.0, 2000.0]
+    assert df["created"].dt.year.tolist() == [2020] * 3
+    dfs = [df async for df in datasvc.iter_xml("missingfiles", human_readable=True)]
+    assert len(dfs) == 1
+    assert "Missing from" in dfs[0].columns
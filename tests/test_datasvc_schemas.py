@@ -0,0 +1,697 @@
+import pandas
+import pytest
+from dmwmclient.datasvc import BLOCKARRIVE_BASISCODE, SCHEMAS
+from dmwmclient.flatten import flatten
+from dmwmclient.util import format_dates
+
+# Sample datasvc json documents, with the structure of the production responses
+SAMPLES = {
+    "data": {
+        "phedex": {
+            "dbs": [
+                {
+                    "name": "https://cmsweb.cern.ch/dbs/prod/global/DBSReader",
+                    "dataset": [
+                        {
+                            "name": "/A/B/RAW",
+                            "is_open": "n",
+                            "block": [
+                                {
+                                    "name": "/A/B/RAW#1",
+                                    "bytes": 3000000000,
+                                    "time_create": 1600000000.5,
+                                    "file": [
+                                        {
+                                            "lfn": "/store/a/1.root",
+                                            "checksum": "adler32:0a1b2c3d",
+                                            "size": 1000000000,
+                                            "time_create": 1600000001,
+                                        },
+                                        {
+                                            "lfn": "/store/a/2.root",
+                                            "checksum": "adler32:0a1b2c3e",
+                                            "size": 2000000000,
+                                            "time_create": 1600000002,
+                                        },
+                                    ],
+                                },
+                                {
+                                    "name": "/A/B/RAW#2",
+                                    "bytes": 0,
+                                    "time_create": 1600000100,
+                                    "file": [],
+                                },
+                            ],
+                        },
+                        {
+                            "name": "/C/D/AOD",
+                            "is_open": "y",
+                            "block": [
+                                {
+                                    "name": "/C/D/AOD#1",
+                                    "bytes": 500,
+                                    "time_create": 1600000200,
+                                    "file": [
+                                        {
+                                            "lfn": "/store/c/1.root",
+                                            "checksum": "adler32:ffffffff",
+                                            "size": 500,
+                                            "time_create": 1600000201,
+                                        }
+                                    ],
+                                }
+                            ],
+                        },
+                    ],
+                }
+            ]
+        }
+    },
+    "errorlog": {
+        "phedex": {
+            "link": [
+                {
+                    "from": "T1_A_Disk",
+                    "to": "T2_B",
+                    "block": [
+                        {
+                            "name": "/A/B/RAW#1",
+                            "file": [
+                                {
+                                    "name": "/store/a/1.root",
+                                    "checksum": "adler32:0a1b2c3d",
+                                    "size": 1000000000,
+                                    "transfer_error": [
+                                        {
+                                            "detail_log": {"$t": "timeout after 3600s"},
+                                            "from_pfn": "gsiftp://a/store/a/1.root",
+                                            "to_pfn": "gsiftp://b/store/a/1.root",
+                                            "time_done": 1600000000,
+                                        },
+                                        {
+                                            "detail_log": {"$t": None},
+                                            "from_pfn": "gsiftp://a/store/a/1.root",
+                                            "to_pfn": "gsiftp://b/store/a/1.root",
+                                            "time_done": 1600000060.25,
+                                        },
+                                    ],
+                                }
+                            ],
+                        }
+                    ],
+                }
+            ]
+        }
+    },
+    "blockarrive": {
+        "phedex": {
+            "block": [
+                {
+                    "name": "/A/B/RAW#1",
+                    "destination": [
+                        {
+                            "name": "T2_B",
+                            "time_arrive": 1600003600,
+                            "time_update": 1600000000,
+                            "files": 2,
+                            "bytes": 3000000000,
+                            "basis": 0,
+                        },
+                        {
+                            "name": "T2_C",
+                            "time_arrive": None,
+                            "time_update": 1600000000,
+                            "files": 2,
+                            "bytes": 3000000000,
+                            "basis": -6,
+                        },
+                        {
+                            "name": "T2_D",
+                            "time_arrive": None,
+                            "time_update": 1600000000,
+                            "files": 2,
+                            "bytes": 3000000000,
+                            "basis": 7,
+                        },
+                    ],
+                }
+            ]
+        }
+    },
+    "filereplicas": {
+        "phedex": {
+            "block": [
+                {
+                    "name": "/A/B/RAW#1",
+                    "files": 2,
+                    "bytes": 3000000000,
+                    "file": [
+                        {
+                            "name": "/store/a/1.root",
+                            "checksum": "adler32:0a1b2c3d",
+                            "time_create": 1600000001,
+                            "replica": [
+                                {
+                                    "node": "T1_A_Disk",
+                                    "subscribed": "y",
+                                    "custodial": "n",
+                                    "group": "DataOps",
+                                    "time_create": 1600000100,
+                                },
+                                {
+                                    "node": "T2_B",
+                                    "subscribed": "n",
+                                    "custodial": "n",
+                                    "group": None,
+                                    "time_create": 1600000200,
+                                },
+                            ],
+                        },
+                        {
+                            "name": "/store/a/2.root",
+                            "checksum": "adler32:0a1b2c3e",
+                            "time_create": 1600000002,
+                            "replica": [
+                                {
+                                    "node": "T1_A_Disk",
+                                    "subscribed": "y",
+                                    "custodial": "y",
+                                    "group": "DataOps",
+                                    "time_create": 1600000100,
+                                }
+                            ],
+                        },
+                    ],
+                }
+            ]
+        }
+    },
+    "agentlogs": {
+        "phedex": {
+            "agent": [
+                {
+                    "name": "FileDownload",
+                    "host": "vocms1.cern.ch",
+                    "pid": 1234,
+                    "user": "phedex",
+                    "node": [{"name": "T2_B"}, {"name": "T2_C"}],
+                    "log": [
+                        {
+                            "reason": "AGENT RESTARTED",
+                            "time": 1600000000,
+                            "state_dir": "/state/download",
+                            "working_dir": "/work",
+                            "message": {"$t": "started"},
+                        },
+                        {
+                            "reason": "AGENT STOPPED",
+                            "time": 1600000500,
+                            "state_dir": "/state/download",
+                            "working_dir": "/work",
+                            "message": {"$t": 42},
+                        },
+                    ],
+                },
+                {
+                    "name": "FileRemove",
+                    "host": "vocms2.cern.ch",
+                    "pid": 5678,
+                    "user": "phedex",
+                    "node": [{"name": "T2_B"}],
+                    "log": [],
+                },
+            ]
+        }
+    },
+    "missingfiles": {
+        "phedex": {
+            "block": [
+                {
+                    "name": "/A/B/RAW#1",
+                    "file": [
+                        {
+                            "name": "/store/a/1.root",
+                            "checksum": "adler32:0a1b2c3d",
+                            "bytes": 1000000000,
+                            "time_create": 1600000001,
+                            "origin_node": "T0_CH_CERN",
+                            "missing": [
+                                {
+                                    "node_name": "T1_A_Disk",
+                                    "se": "a.cern.ch",
+                                    "custodial": "y",
+                                    "subscribed": "y",
+                                },
+                                {
+                                    "node_name": "T2_B",
+                                    "se": "b.cern.ch",
+                                    "custodial": "n",
+                                    "subscribed": "n",
+                                },
+                            ],
+                        }
+                    ],
+                }
+            ]
+        }
+    },
+    "agents": {
+        "phedex": {
+            "node": [
+                {
+                    "node": "T2_B",
+                    "host": "vocms1.cern.ch",
+                    "name": "T2_B_Agents",
+                    "agent": [
+                        {
+                            "label": "download",
+                            "time_update": 1600000000,
+                            "state_dir": "/state/download",
+                            "version": "4.2.1",
+                        },
+                        {
+                            "label": "remove",
+                            "time_update": 1600000010,
+                            "state_dir": "/state/remove",
+                            "version": "4.2.1",
+                        },
+                    ],
+                }
+            ]
+        }
+    },
+    "blocklatency": {
+        "phedex": {
+            "block": [
+                {
+                    "name": "/A/B/RAW#1",
+                    "id": 123,
+                    "dataset": "/A/B/RAW",
+                    "bytes": 3000000000,
+                    "time_create": 1600000000,
+                    "files": 2,
+                    "time_update": 1600000100,
+                    "destination": [
+                        {
+                            "name": "T2_B",
+                            "latency": [
+                                {
+                                    "is_custodial": "n",
+                                    "last_suspend": None,
+                                    "last_replica": 1600001000,
+                                    "time_subscription": 1600000200,
+                                    "block_close": 1600000050,
+                                    "latency": 800,
+                                },
+                                {
+                                    "is_custodial": "n",
+                                    "last_suspend": 1600002000,
+                                    "last_replica": None,
+                                    "time_subscription": 1600001500,
+                                    "block_close": 1600000050,
+                                    "latency": None,
+                                },
+                            ],
+                        }
+                    ],
+                }
+            ]
+        }
+    },
+    "requestlist": {
+        "phedex": {
+            "request": [
+                {
+                    "id": 1,
+                    "time_create": 1600000000,
+                    "requested_by": "someone",
+                    "approval": "approved",
+                    "node": [
+                        {
+                            "name": "T2_B",
+                            "time_decided": 1600000100,
+                            "decided_by": "admin",
+                        },
+                        {"name": "T2_C", "time_decided": None, "decided_by": None},
+                    ],
+                },
+                {
+                    "id": 2,
+                    "time_create": 1600000500,
+                    "requested_by": "other",
+                    "approval": "pending",
+                    "node": [],
+                },
+            ]
+        }
+    },
+    "blockreplicasummary": {
+        "phedex": {
+            "block": [
+                {
+                    "name": "/A/B/RAW#1",
+                    "replica": [
+                        {"node": "T1_A_Disk", "complete": "y"},
+                        {"node": "T2_B", "complete": "n"},
+                    ],
+                }
+            ]
+        }
+    },
+}
+
+
+def rename(df, mapping, human_readable):
+    return df.rename(columns=mapping) if human_readable else df
+
+
+# The per-method loops that SCHEMAS replaced, as they were in DataSvc
+def legacy_data(resjson, human_readable):
+    out = []
+    for _instance in resjson["phedex"]["dbs"]:
+        for _dataset in _instance["dataset"]:
+            for _block in _dataset["block"]:
+                for _file in _block["file"]:
+                    out.append(
+                        {
+                            "Dataset": _dataset["name"],
+                            "Is_dataset_open": _dataset["is_open"],
+                            "block_Name": _block["name"],
+                            "Block_size_(GB)": _block["bytes"] / 1000000000.0,
+                            "Time_block_was_created": _block["time_create"],
+                            "File_name": _file["lfn"],
+                            "File_checksum": _file["checksum"],
+                            "File_size": _file["size"] / 1000000000.0,
+                            "Time_file_was_created": _file["time_create"],
+                        }
+                    )
+    df = pandas.json_normalize(out)
+    format_dates(df, ["Time_file_was_created", "Time_block_was_created"])
+    mapping = {
+        "Is_dataset_open": "Is dataset open",
+        "block_Name": "Block Name",
+        "Block_size_(GB)": "Block size (GB)",
+        "Time_block_was_created": "Time Block Was Created",
+        "File_name": "File Name",
+        "File_checksum": "File Checksum",
+        "File_size": "File Size (GB)",
+        "Time_file_was_created": "Time File Was Created",
+    }
+    return rename(df, mapping, human_readable)
+
+
+def legacy_errorlog(resjson, human_readable):
+    out = []
+    for _instance in resjson["phedex"]["link"]:
+        for _block in _instance["block"]:
+            for _file in _block["file"]:
+                for _transfer_error in _file["transfer_error"]:
+                    out.append(
+                        {
+                            "Link": _instance["from"] + " to " + _instance["to"],
+                            "LFN": _file["name"],
+                            "file_Checksum": _file["checksum"],
+                            "file_size_(GB)": _file["size"] / 1000000000.0,
+                            "Block_name": _block["name"],
+                            "Error_log": str(_transfer_error["detail_log"]["$t"]),
+                            "From_PFN": _transfer_error["from_pfn"],
+                            "To_PFN": _transfer_error["to_pfn"],
+                            "Time": _transfer_error["time_done"],
+                        }
+                    )
+    df = pandas.json_normalize(out)
+    format_dates(df, ["Time"])
+    mapping = {
+        "From_PFN": "From PFN",
+        "To_PFN": "To PFN",
+        "Error_log": "Error Log",
+        "Block_Name": "Block Name",
+        "Block_size_(GB)": "Block size (GB)",
+        "file_checksum": "File Checksum",
+        "file_size_(GB)": "File Size (GB)",
+    }
+    return rename(df, mapping, human_readable)
+
+
+def legacy_blockarrive(resjson, human_readable):
+    out = []
+    for _block in resjson["phedex"]["block"]:
+        for _destination in _block["destination"]:
+            out.append(
+                {
+                    "Block_Name": _block["name"],
+                    "Destination": _destination["name"],
+                    "Time_Arrive": _destination["time_arrive"],
+                    "Time_update": _destination["time_update"],
+                    "Number_of_files": _destination["files"],
+                    "Block_size_(GB)": _destination["bytes"] / 1000000000.0,
+                    "Basis_code": BLOCKARRIVE_BASISCODE.get(
+                        _destination["basis"], "No code specified"
+                    ),
+                }
+            )
+    df = pandas.json_normalize(out)
+    format_dates(df, ["Time_Arrive", "Time_update"])
+    mapping = {
+        "Block_Name": "Block Name",
+        "Block_size_(GB)": "Block size (GB)",
+        "Time_Arrive": "Time Arrive",
+        "Time_update": "Time Update",
+        "Number_of_files": "Number Of Files",
+        "Basis_code": "Basis Code",
+    }
+    return rename(df, mapping, human_readable)
+
+
+def legacy_filereplicas(resjson, human_readable):
+    out = []
+    for _block in resjson["phedex"]["block"]:
+        for _file in _block["file"]:
+            for _replica in _file["replica"]:
+                out.append(
+                    {
+                        "Block_name": _block["name"],
+                        "Files": _block["files"],
+                        "Block_size_(GB)": _block["bytes"] / 1000000000.0,
+                        "lfn": _file["name"],
+                        "Checksum": _file["checksum"],
+                        "File_created_on": _file["time_create"],
+                        "File_replica_at": _replica["node"],
+                        "File_subcribed": _replica["subscribed"],
+                        "Custodial": _replica["custodial"],
+                        "Group": _replica["group"],
+                        "File_in_node_since": _replica["time_create"],
+                    }
+                )
+    df = pandas.json_normalize(out)
+    format_dates(df, ["File_created_on", "File_in_node_since"])
+    mapping = {
+        "Block_name": "Block Name",
+        "Block_size_(GB)": "Block size (GB)",
+        "File_created_on": "File Created On",
+        "File_replica_at": "File Replica At",
+        "File_subcribed": "File Subcribed",
+        "File_in_node_since": "File In Node Since",
+    }
+    return rename(df, mapping, human_readable)
+
+
+def legacy_agentlogs(resjson, human_readable):
+    out = []
+    for _agent in resjson["phedex"]["agent"]:
+        for _node in _agent["node"]:
+            node = _node["name"]
+            for _log in _agent["log"]:
+                out.append(
+                    {
+                        "Agent": _agent["name"],
+                        "Host": _agent["host"],
+                        "PID": _agent["pid"],
+                        "Node": node,
+                        "User": _agent["user"],
+                        "Reason": _log["reason"],
+                        "Time": _log["time"],
+                        "state_dir": _log["state_dir"],
+                        "working_dir": _log["working_dir"],
+                        "Message": str(_log["message"]["$t"]),
+                    }
+                )
+    df = pandas.json_normalize(out)
+    format_dates(df, ["Time"])
+    mapping = {
+        "state_dir": "State Directory",
+        "working_dir": "Working Directory",
+    }
+    return rename(df, mapping, human_readable)
+
+
+def legacy_missingfiles(resjson, human_readable):
+    out = []
+    for _block in resjson["phedex"]["block"]:
+        for _file in _block["file"]:
+            for _missing in _file["missing"]:
+                out.append(
+                    {
+                        "block_name": _block["name"],
+                        "file_name": _file["name"],
+                        "checksum": _file["checksum"],
+                        "size": _file["bytes"],
+                        "created": _file["time_create"],
+                        "origin_node": _file["origin_node"],
+                        "missing_from": _missing["node_name"],
+                        "disk": _missing["se"],
+                        "custodial": _missing["custodial"],
+                        "subscribed": _missing["subscribed"],
+                    }
+                )
+    df = format_dates(pandas.json_normalize(out), ["created"])
+    mapping = {
+        "block_name": "Block Name",
+        "file_name": "File Name",
+        "size": "Size of file",
+        "created": "Time created",
+        "origin_node": "Origin Node",
+        "missing_from": "Missing from",
+        "disk": "Disk",
+        "custodial": "Custodial?",
+        "subscribed": "Subscribed?",
+    }
+    return rename(df, mapping, human_readable)
+
+
+def legacy_agents(resjson, human_readable):
+    out = []
+    for _node in resjson["phedex"]["node"]:
+        for _agent in _node["agent"]:
+            out.append(
+                {
+                    "Node": _node["node"],
+                    "Host": _node["host"],
+                    "Agent_name": _node["name"],
+                    "Agent_label": _agent["label"],
+                    "Time_update": _agent["time_update"],
+                    "state_dir": _agent["state_dir"],
+                    "version": _agent["version"],
+                }
+            )
+    df = format_dates(pandas.json_normalize(out), ["Time_update"])
+    mapping = {
+        "Agent_name": "Agent name",
+        "Agent_label": "Agent label",
+        "Time_update": "Time update",
+        "state_dir": "Directory",
+        "version": "Version",
+    }
+    return rename(df, mapping, human_readable)
+
+
+def legacy_blocklatency(resjson, human_readable):
+    out = []
+    for _block in resjson["phedex"]["block"]:
+        for _destination in _block["destination"]:
+            for _latency in _destination["latency"]:
+                out.append(
+                    {
+                        "Block": _block["name"],
+                        "Block_ID": _block["id"],
+                        "Dataset": _block["dataset"],
+                        "Size": _block["bytes"],
+                        "Time_create": _block["time_create"],
+                        "Number_of_files": _block["files"],
+                        "Time_update": _block["time_update"],
+                        "Destination": _destination["name"],
+                        "custodial": _latency["is_custodial"],
+                        "last_suspend": _latency["last_suspend"],
+                        "last_replica": _latency["last_replica"],
+                        "time_subscription": _latency["time_subscription"],
+                        "block_closed": _latency["block_close"],
+                        "latency": _latency["latency"],
+                    }
+                )
+    df = format_dates(
+        pandas.json_normalize(out),
+        [
+            "Time_update",
+            "last_suspend",
+            "last_replica",
+            "time_subscription",
+            "block_closed",
+            "Time_create",
+        ],
+    )
+    mapping = {
+        "Block_ID": "Block ID",
+        "Time_create": "Time Create",
+        "Number_of_files": "Number of files",
+        "Time_update": "Time Update",
+        "last_suspend": "Last Suspend",
+        "last_replica": "Last Replica",
+        "time_subscription": "Time Subscription",
+        "block_closed": "Block Closed",
+        "latency": "Latency",
+    }
+    return rename(df, mapping, human_readable)
+
+
+def legacy_requestlist(resjson, human_readable):
+    out = []
+    for _request in resjson["phedex"]["request"]:
+        for _node in _request["node"]:
+            out.append(
+                {
+                    "request_id": _request["id"],
+                    "time_created": _request["time_create"],
+                    "requested_by": _request["requested_by"],
+                    "approval": _request["approval"],
+                    "node": _node["name"],
+                    "time_decided": _node["time_decided"],
+                    "decided_by": _node["decided_by"],
+                }
+            )
+    df = format_dates(pandas.json_normalize(out), ["time_created", "time_decided"])
+    mapping = {
+        "request_id": "Request ID",
+        "time_created": "Time Created",
+        "requested_by": "Requested by",
+        "approval": "Approval",
+        "node": "Node",
+        "time_decided": "Time decided",
+        "decided_by": "Decided by",
+    }
+    return rename(df, mapping, human_readable)
+
+
+def legacy_blockreplicasummary(resjson, human_readable):
+    out = []
+    for _block in resjson["phedex"]["block"]:
+        for _replica in _block["replica"]:
+            out.append(
+                {
+                    "Block": _block["name"],
+                    "Node": _replica["node"],
+                    "Complete": _replica["complete"],
+                }
+            )
+    return pandas.json_normalize(out)
+
+
+LEGACY = {
+    "data": legacy_data,
+    "errorlog": legacy_errorlog,
+    "blockarrive": legacy_blockarrive,
+    "filereplicas": legacy_filereplicas,
+    "agentlogs": legacy_agentlogs,
+    "missingfiles": legacy_missingfiles,
+    "agents": legacy_agents,
+    "blocklatency": legacy_blocklatency,
+    "requestlist": legacy_requestlist,
+    "blockreplicasummary": legacy_blockreplicasummary,
+}
+
+
+@pytest.mark.parametrize("human_readable", [False, True])
+@pytest.mark.parametrize("method", sorted(LEGACY))
+def test_schema_matches_legacy(method, human_readable):
+    expected = LEGACY[method](SAMPLES[method], human_readable)
+    df = flatten(SAMPLES[method], SCHEMAS[method], human_readable)
+    pandas.testing.assert_frame_equal(df, expected)
@@ -0,0 +1,291 @@
+import json
+import pytest
+from dmwmclient.dbs import DBS
+from dmwmclient.util import format_dates
+
+PARENTS = {
+    "/A/NANO/X": ["/A/MINI/X"],
+    "/B/NANO/X": ["/A/MINI/X"],
+    "/A/MINI/X": ["/A/AOD/X"],
+    "/A/AOD/X": ["/A/RAW/X"],
+}
+
+
+class FakeClient:
+    def __init__(self):
+        self.calls = 0
+
+    async def getjson(self, url, params):
+        self.calls += 1
+        dataset = params["dataset"]
+        if str(url).endswith("datasetparents"):
+            return [
+                {"this_dataset": dataset, "parent_dataset": parent}
+                for parent in PARENTS.get(dataset, [])
+            ]
+        return [
+            {"this_dataset": dataset, "child_dataset": child}
+            for child, parents in PARENTS.items()
+            if dataset in parents
+        ]
+
+
+@pytest.mark.asyncio
+async def test_lineage():
+    client = FakeClient()
+    dbs = DBS(client)
+    df = await dbs.lineage(["/A/NANO/X", "/B/NANO/X"])
+    edges = set(zip(df["child"], df["parent"], df["generation"]))
+    assert edges == {
+        ("/A/NANO/X", "/A/MINI/X", 1),
+        ("/B/NANO/X", "/A/MINI/X", 1),
+        ("/A/MINI/X", "/A/AOD/X", 2),
+        ("/A/AOD/X", "/A/RAW/X", 3),
+    }
+    assert client.calls == 5
+
+    # cached lookups are shared across calls
+    df = await dbs.lineage("/A/MINI/X", depth=1)
+    assert list(df["parent"]) == ["/A/AOD/X"]
+    assert client.calls == 5
+
+    df = await dbs.lineage("/A/MINI/X", direction="both", depth=1)
+    assert set(zip(df["child"], df["parent"])) == {
+        ("/A/MINI/X", "/A/AOD/X"),
+        ("/A/NANO/X", "/A/MINI/X"),
+        ("/B/NANO/X", "/A/MINI/X"),
+    }
+    assert client.calls == 6
+
+    with pytest.raises(ValueError):
+        await dbs.lineage("/A/MINI/X", direction="siblings")
+
+
+BLOCKS = {"/A/B/RAW": ["/A/B/RAW#1", "/A/B/RAW#2", "/A/B/RAW#3"]}
+
+
+def files(block_name):
+    n = int(block_name[-1])
+    return [
+        {
+            "logical_file_name": f"/store/{n}/{i}.root",
+            "block_name": block_name,
+            "file_size": 1000 * i,
+            "last_modification_date": 1600000000 + i,
+        }
+        for i in range(n)
+    ]
+
+
+class FakeStreamClient:
+    def __init__(self):
+        self.queries = []
+        self.timeouts = []
+
+    async def getjson(self, url, params):
+        assert str(url).endswith("blocks")
+        return [{"block_name": block} for block in BLOCKS[params["dataset"]]]
+
+    async def iter_bytes(self, url, params=None, timeout=None):
+        self.queries.append(dict(params))
+        self.timeouts.append(timeout)
+        if "block_name" in params:
+            records = files(params["block_name"])
+        else:
+            blocks = BLOCKS[params["dataset"]]
+            records = [record for block in blocks for record in files(block)]
+        data = json.dumps(records).encode()
+        for start in range(0, len(data), 5):
+            stop = start + 5
+            yield data[start:stop]
+
+    def postprocess(self, df, dates=()):
+        return format_dates(df, dates)
+
+
+@pytest.mark.asyncio
+async def test_pandasmethod():
+    client = FakeStreamClient()
+    dbs = DBS(client)
+    df = await dbs.pandasmethod("files", dataset="/A/B/RAW")
+    assert client.queries == [{"dataset": "/A/B/RAW"}]
+    assert list(df.columns) == list(files("/A/B/RAW#1")[0])
+    assert df["file_size"].tolist() == [0, 0, 1000, 0, 1000, 2000]
+    assert client.timeouts == [DBS.defaults["timeout"]]
+
+
+@pytest.mark.asyncio
+async def test_shards():
+    dbs = DBS(FakeStreamClient())
+    shards = await dbs.shards("files", dataset="/A/B/RAW", run_num=(1, 1200), detail=1)
+    assert len(shards) == 9
+    assert shards[0] == {"detail": 1, "block_name": "/A/B/RAW#1", "run_num": "1-500"}
+    assert shards[-1] == {
+        "detail": 1,
+        "block_name": "/A/B/RAW#3",
+        "run_num": "1001-1200",
+    }
+    assert await dbs.shards("blocks", dataset="/A/B/RAW") == [{"dataset": "/A/B/RAW"}]
+
+
+@pytest.mark.asyncio
+async def test_sharded():
+    client = FakeStreamClient()
+    dbs = DBS(client)
+    expected = await dbs.pandasmethod("files", dataset="/A/B/RAW")
+    df = await dbs.sharded("files", concurrency=2, dataset="/A/B/RAW")
+    assert len(client.queries) == 4
+    assert client.timeouts == [DBS.defaults["timeout"]] * 4
+    df = df.sort_values("logical_file_name", ignore_index=True)
+    assert df["logical_file_name"].tolist() == sorted(expected["logical_file_name"])
+    assert df["last_modification_date"].dt.year.tolist() == [2020] * 6
+
+    chunks = [chunk async for chunk in dbs.iter_chunks("files", dataset="/A/B/RAW")]
+    assert sorted(map(len, chunks)) == [1, 2, 3]
+    for chunk in chunks:
+        assert list(chunk.columns) == list(chunks[0].columns)
+        assert (chunk.dtypes == chunks[0].dtypes).all()
+    assert sum(map(len, chunks)) == len(df)
+
+    client.timeouts = []
+    records = [record async for record in dbs.iter_json("files", dataset="/A/B/RAW")]
+    assert len(records) == len(df)
+    assert client.timeouts == [DBS.defaults["timeout"]]
+
+
+class FakeResult:
+    def __init__(self, status_code, records):
+        self.status_code = status_code
+        self.records = records
+        self.text = json.dumps(records)
+
+    def json(self):
+        return self.records
+
+
+class FakePostClient:
+    def __init__(self):
+        self.posts = []
+        self.failures = 0
+
+    def build_request(self, method, url, json):
+        return method, str(url), json
+
+    async def send(self, request, timeout=None, retries=1):
+        method, url, data = request
+        assert method == "POST"
+        self.posts.append((url.rsplit("/", 1)[-1], data))
+        if self.failures > 0:
+            self.failures -= 1
+            return FakeResult(503, "Service Unavailable")
+        if url.endswith("fileArray"):
+            records = [
+                {
+                    "logical_file_name": lfn,
+                    "file_size": len(lfn),
+                    "last_modification_date": 1600000000,
+                }
+                for lfn in data["logical_file_name"]
+            ]
+            if data.get("detail"):
+                for record in records:
+                    record["is_file_valid"] = 1
+            return FakeResult(200, records)
+        if url.endswith("blockparents"):
+            return FakeResult(
+                200,
+                [
+                    {"this_block_name": block, "parent_block_name": block + "P"}
+                    for block in data["block_name"]
+                ],
+            )
+        return FakeResult(
+            200,
+            [
+                {
+                    "logical_file_name": lfn,
+                    "parent_logical_file_name": [lfn + ".parent"],
+                }
+                for lfn in data["logical_file_name"]
+            ],
+        )
+
+    def postprocess(self, df, dates=()):
+        return format_dates(df, dates)
+
+
+@pytest.mark.asyncio
+async def test_postjson():
+    client = FakePostClient()
+    dbs = DBS(client)
+    result = await dbs.postjson("blockparents", {"block_name": ["/A/B/RAW#1"]})
+    assert result == [
+        {"this_block_name": "/A/B/RAW#1", "parent_block_name": "/A/B/RAW#1P"}
+    ]
+    client.failures = 1
+    with pytest.raises(IOError):
+        await dbs.postjson("blockparents", {"block_name": ["/A/B/RAW#1"]})
+
+
+@pytest.mark.asyncio
+async def test_bulk():
+    client = FakePostClient()
+    dbs = DBS(client)
+    lfns = [f"/store/{i}.root" for i in range(25)]
+    df = await dbs.bulk(
+        "fileArray", "logical_file_name", lfns + lfns[:5], batchsize=10, validFileOnly=1
+    )
+    assert [method for method, _ in client.posts] == ["fileArray"] * 3
+    batches = [data["logical_file_name"] for _, data in client.posts]
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+    assert sorted(lfn for batch in batches for lfn in batch) == sorted(lfns)
+    assert all(data["validFileOnly"] == 1 for _, data in client.posts)
+    assert list(df.columns) == [
+        "logical_file_name",
+        "file_size",
+        "last_modification_date",
+    ]
+    assert sorted(df["logical_file_name"]) == sorted(lfns)
+    assert df["last_modification_date"].dt.year.tolist() == [2020] * 25
+
+    # failed batches are retried
+    client.posts = []
+    client.failures = 1
+    df = await dbs.bulk(
+        "fileArray", "logical_file_name", lfns, batchsize=100, retries=2
+    )
+    assert len(client.posts) == 2
+    assert len(df) == 25
+
+    df = await dbs.bulk("fileArray", "logical_file_name", [])
+    assert len(df) == 0
+
+
+@pytest.mark.asyncio
+async def test_bulk_methods():
+    client = FakePostClient()
+    dbs = DBS(client)
+    df = await dbs.file_array(["/store/a.root", "/store/b.root"])
+    assert client.posts[-1] == (
+        "fileArray",
+        {"logical_file_name": ["/store/a.root", "/store/b.root"], "detail": 1},
+    )
+    assert list(df.columns) == [
+        "logical_file_name",
+        "file_size",
+        "last_modification_date",
+        "is_file_valid",
+    ]
+    df = await dbs.file_array(["/store/a.root"], detail=False)
+    assert client.posts[-1] == ("fileArray", {"logical_file_name": ["/store/a.root"]})
+    assert "is_file_valid" not in df.columns
+
+    df = await dbs.block_parents(["/A/B/RAW#1", "/A/B/RAW#2"])
+    assert client.posts[-1][0] == "blockparents"
+    assert list(df.columns) == ["this_block_name", "parent_block_name"]
+    assert df["parent_block_name"].tolist() == ["/A/B/RAW#1P", "/A/B/RAW#2P"]
+
+    df = await dbs.file_parents(["/store/a.root"])
+    assert client.posts[-1][0] == "fileparents"
+    assert list(df.columns) == ["logical_file_name", "parent_logical_file_name"]
+    assert df["parent_logical_file_name"].tolist() == [["/store/a.root.parent"]]
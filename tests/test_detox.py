@@ -0,0 +1,92 @@
+import pandas
+import pytest
+from dmwmclient.detox import DetoxSnapshots, _pack_strings, _unpack_strings, diff
+from dmwmclient.dynamo import Dynamo
+
+
+DECISIONS = {
+    1: {
+        "T2_AA": [("/A/B/C", 1.5, "keep", 1), ("/D/E/F", 2.0, "delete", 2)],
+        "T2_BB": [("/A/B/C", 1.5, "protect", 3), ("/G/H/I", 3.0, "keep", 1)],
+    },
+    2: {
+        "T2_AA": [("/A/B/C", 1.5, "delete", 2), ("/D/E/F", 2.0, "delete", 2)],
+        "T2_BB": [("/A/B/C", 1.5, "protect", 3), ("/J/K/L", 4.0, "protect", 3)],
+    },
+}
+CONDITIONS = {"1": "default keep", "2": "old and unused", "3": "locked"}
+
+
+class FakeClient:
+    def __init__(self):
+        self.queries = []
+
+    async def getjson(self, url, params):
+        self.queries.append(dict(params))
+        if str(url).endswith("summary"):
+            return {
+                "data": [
+                    {
+                        "site_data": [{"name": site} for site in DECISIONS[params["cycle"]]],
+                        "comment": "",
+                        "partition": "AnalysisOps",
+                        "cycle_timestamp": 1600000000,
+                        "next_cycle": 0,
+                        "operation": "",
+                        "previous_cycle": 0,
+                        "cycle": params["cycle"],
+                    }
+                ]
+            }
+        datasets = [
+            {"name": name, "size": size, "decision": decision, "condition_id": condition}
+            for name, size, decision, condition in DECISIONS[params["cycle"]][params["site"]]
+        ]
+        return {"data": {"content": {"datasets": datasets}, "conditions": CONDITIONS}}
+
+    def postprocess(self, df, dates=()):
+        return df
+
+
+@pytest.mark.asyncio
+async def test_detox_snapshots(tmp_path):
+    client = FakeClient()
+    snapshots = DetoxSnapshots(Dynamo(client), str(tmp_path / "detox.db"))
+    df = await snapshots.snapshot(1)
+    assert list(df.columns) == ["cycle", "site", "dataset", "size", "decision", "condition_id", "condition"]
+    assert list(df["site"]) == ["T2_AA", "T2_AA", "T2_BB", "T2_BB"]
+    assert list(df["condition"]) == ["default keep", "old and unused", "locked", "default keep"]
+
+    changes = await snapshots.diff(1, 2)
+    changes = changes.set_index(["site", "dataset"])["change"].astype(str).to_dict()
+    assert changes == {
+        ("T2_AA", "/A/B/C"): "newly_deleted",
+        ("T2_BB", "/G/H/I"): "gone",
+        ("T2_BB", "/J/K/L"): "newly_protected",
+    }
+    assert snapshots.cycles() == [1, 2]
+    snapshots.close()
+
+    # past cycles are read back from the local store
+    client.queries = []
+    snapshots = DetoxSnapshots(Dynamo(client), str(tmp_path / "detox.db"))
+    stored = await snapshots.snapshot(1)
+    assert client.queries == []
+    assert list(stored["dataset"]) == list(df["dataset"])
+    assert list(stored["condition"]) == list(df["condition"])
+    assert stored["size"].sum() == df["size"].sum()
+
+
+def test_pack_strings():
+    values = pandas.Series(["/A/B/C", None, "", "keep"], dtype=object)
+    assert _unpack_strings(_pack_strings(values), len(values)) == ["/A/B/C", None, "", "keep"]
+
+
+def test_diff_missing():
+    before = pandas.DataFrame(
+        {"site": ["T2_AA", "T2_AA"], "dataset": ["/A/B/C", "/D/E/F"], "size": [1.0, 2.0], "decision": [None, "keep"]}
+    )
+    after = before.assign(decision=[None, "delete"])
+    changes = diff(before, after)
+    assert list(changes["dataset"]) == ["/D/E/F"]
+    assert list(changes["change"]) == ["newly_deleted"]
@@ -1,5 +1,8 @@
+import datetime
 import pytest
 from dmwmclient import Client
+from dmwmclient.dynamo import Dynamo
+from dmwmclient.util import format_dates
 
 
 @pytest.mark.asyncio
@@ -20,3 +23,55 @@ async def test_detail():
     df = await dynamo.site_detail('T2_PK_NCP', 34069)
     assert set(df.columns) == {'condition', 'condition_id', 'decision', 'name', 'site', 'size'}
     assert df.sum()['size'] == 99787.18272119202
+
+
+class FakeCycleClient:
+    def __init__(self):
+        self.calls = 0
+        self.data = [
+            {"cycle": 1, "partition_id": 10, "timestamp": 1600000000, "comment": "a"},
+            {"cycle": 2, "partition_id": 11, "timestamp": 1600000100, "comment": "b"},
+            {"cycle": 3, "partition_id": 10, "timestamp": 1600000200, "comment": "c", "policy_version": "v3"},
+        ]
+
+    async def getjson(self, url, params=None):
+        self.calls += 1
+        return {"data": [dict(cycle) for cycle in self.data]}
+
+    def postprocess(self, df, dates=()):
+        return format_dates(df, dates)
+
+
+@pytest.mark.asyncio
+async def test_cycle_index():
+    client = FakeCycleClient()
+    dynamo = Dynamo(client)
+    cycle = await dynamo.latest_cycle()
+    assert cycle["cycle"] == 3
+    assert set(cycle.keys()) == {'cycle', 'partition_id', 'timestamp', 'comment', 'policy_version'}
+    assert cycle["policy_version"] == "v3"
+    assert cycle["timestamp"] == datetime.datetime.fromtimestamp(1600000200)
+    assert (await dynamo.cycle_at(1600000150))["cycle"] == 1
+    assert (await dynamo.cycle_at(1600000200))["cycle"] == 3
+    assert await dynamo.cycle_at(1500000000) is None
+    assert (await dynamo.latest_cycle(11))["cycle"] == 2
+    assert await dynamo.latest_cycle(12) is None
+    assert client.calls == 1
+
+    client.data.append({"cycle": 4, "partition_id": 10, "timestamp": 1600000300, "comment": "d"})
+    assert (await dynamo.latest_cycle())["cycle"] == 3
+    dynamo._cycles_cache.invalidate()
+    assert (await dynamo.latest_cycle())["cycle"] == 4
+    df = await dynamo.cycles()
+    assert list(df["cycle"]) == [1, 3, 4]
+    assert client.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_cycles_ttl():
+    client = FakeCycleClient()
+    dynamo = Dynamo(client, cycles_ttl=0)
+    assert (await dynamo.latest_cycle())["cycle"] == 3
+    client.data.append({"cycle": 4, "partition_id": 10, "timestamp": 1600000300, "comment": "d"})
+    assert (await dynamo.latest_cycle())["cycle"] == 4
+    assert client.calls == 2
@@ -0,0 +1,90 @@
+import pandas
+import pytest
+from dmwmclient.datasvc import SCHEMAS
+from dmwmclient.errorsignature import ErrorSignatures, cluster, normalize
+from dmwmclient.flatten import flatten
+
+
+def test_normalize():
+    messages = [
+        "TRANSFER [ERROR] Operation timeout after 3600s gsiftp://se1.cern.ch:2811//eos/cms/store/a.root",
+        "TRANSFER [ERROR] Operation timeout after 1800s gsiftp://se2.fnal.gov/store/b.root",
+        "SOURCE CHECKSUM MISMATCH ADLER32 do not match (0a1b2c3d != 7f6e5d4c)",
+        "Connection to 188.184.1.2:1094 on host eoscms.cern.ch refused, file /store/c.root",
+    ]
+    signatures = normalize(messages)
+    assert signatures[0] == signatures[1]
+    assert signatures[0] == "TRANSFER [ERROR] Operation timeout after <N>s <PFN>"
+    assert (
+        signatures[2] == "SOURCE CHECKSUM MISMATCH ADLER32 do not match (<ID> != <ID>)"
+    )
+    assert signatures[3] == "Connection to <IP> on host <HOST> refused, file <PATH>"
+
+
+def test_normalize_missing():
+    signatures = normalize(pandas.Series(["after 12s", None, float("nan"), "after 3s"]))
+    assert signatures[0] == signatures[3] == "after <N>s"
+    assert signatures[1:3].isna().all()
+    assert list(signatures.cat.categories) == ["after <N>s"]
+
+
+def test_cluster():
+    df = pandas.DataFrame(
+        {
+            "Link": ["A to B"] * 3 + ["C to B"],
+            "LFN": ["/store/1", "/store/2", "/store/2", "/store/3"],
+            "Error_log": [
+                "timeout after 10s",
+                "timeout after 20s",
+                "timeout after 30s",
+                "timeout after 10s",
+            ],
+            "Time": pandas.to_datetime([0, 60, 7200, 0], unit="s"),
+        }
+    )
+    out = cluster(df)
+    assert list(out["Count"]) == [3, 1]
+    assert list(out["Files"]) == [2, 1]
+    assert out["Example"][0] == "timeout after 10s"
+    out = cluster(df, window=3600)
+    assert list(out["Count"]) == [2, 1, 1]
+
+
+def errorlog(node, times):
+    files = [
+        {
+            "name": f"/store/{time}",
+            "checksum": "adler32:0",
+            "size": 1000,
+            "transfer_error": [
+                {"time_done": time, "detail_log": {"$t": f"timeout after {time}s"}, "from_pfn": "a", "to_pfn": "b"}
+            ],
+        }
+        for time in times
+    ]
+    links = [{"from": "T1_A", "to": node, "block": [{"name": "/A/B/C#1", "file": files}]}] if files else []
+    return flatten({"phedex": {"link": links}}, SCHEMAS["errorlog"])
+
+
+class FakeDataSvc:
+    def __init__(self, errors):
+        self.errors = errors
+
+    async def errorlog(self, to):
+        return errorlog(to, self.errors[to])
+
+
+@pytest.mark.asyncio
+async def test_signatures_empty():
+    signatures = ErrorSignatures(FakeDataSvc({"T2_A": [0, 60, 7200], "T2_B": []}))
+    errors = await signatures.errors(["T2_A", "T2_B"])
+    assert len(errors) == 3
+    assert errors["Time"].dtype.kind == "M"
+    out = await signatures.signatures(["T2_A", "T2_B"], window=3600)
+    assert list(out["Count"]) == [2, 1]
+
+    errors = await signatures.errors(["T2_B"])
+    assert len(errors) == 0
+    assert errors["Time"].dtype.kind == "M"
+    assert len(await signatures.signatures(["T2_B"], window=3600)) == 0
+    assert len(await signatures.errors([])) == 0
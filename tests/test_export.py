@@ -0,0 +1,43 @@
+import pytest
+import numpy
+import pandas
+from dmwmclient.export import to_parquet, read_parquet
+
+
+pytest.importorskip("pyarrow")
+
+
+def frame(n, offset=0):
+    index = numpy.arange(offset, offset + n)
+    return pandas.DataFrame(
+        {
+            "node": numpy.array(["T1_US_FNAL_Disk", "T2_CH_CERN"])[index % 2],
+            "bytes": index * 10,
+            "time": pandas.to_datetime(index * 60, unit="s"),
+        }
+    )
+
+
+async def chunks():
+    for i in range(3):
+        yield frame(100, i * 100)
+
+
+@pytest.mark.asyncio
+async def test_chunked(tmp_path):
+    path = str(tmp_path / "out.parquet")
+    assert await to_parquet(chunks(), path, row_group_size=50) == 300
+    df = read_parquet(path, columns=["bytes"], filters=[("bytes", ">=", 2500)])
+    assert list(df.columns) == ["bytes"]
+    assert len(df) == 50
+
+
+@pytest.mark.asyncio
+async def test_partitioned(tmp_path):
+    path = str(tmp_path / "out")
+    await to_parquet(chunks(), path, partition_cols=["node"])
+    await to_parquet(frame(10), path, partition_cols=["node"])
+    df = read_parquet(path, filters=[("node", "=", "T2_CH_CERN")])
+    assert len(df) == 155
+    assert (df["node"] == "T2_CH_CERN").all()
+    assert pandas.api.types.is_datetime64_any_dtype(df["time"])
@@ -0,0 +1,134 @@
+import pandas
+import pytest
+from xml.sax.saxutils import quoteattr, escape
+from dmwmclient.flatten import Level, Schema, flatten, flatten_xml
+
+
+schema = Schema(
+    path=["phedex"],
+    levels=[
+        Level("agent", {"Agent": "name"}),
+        Level("node", {"Node": "name"}),
+        Level("log", {"Message": ("message", "$t"), "Time": "time"}, source=0),
+    ],
+    units={"Time": 1},
+    dates=["Time"],
+    human_readable={"Agent": "Agent Name"},
+)
+
+document = {
+    "phedex": {
+        "agent": [
+            {
+                "name": "a",
+                "node": [{"name": "n1"}, {"name": "n2"}],
+                "log": [{"message": {"$t": "x"}, "time": 0}, {"message": {"$t": "y"}, "time": 60}],
+            },
+            {"name": "b", "node": [], "log": [{"message": {"$t": "z"}, "time": 0}]},
+            {"name": "c", "node": [{"name": "n3"}], "log": []},
+        ]
+    }
+}
+
+
+def test_flatten():
+    df = flatten(document, schema)
+    assert list(df.columns) == ["Agent", "Node", "Message", "Time"]
+    assert df["Agent"].tolist() == ["a"] * 4
+    assert df["Node"].tolist() == ["n1", "n1", "n2", "n2"]
+    assert df["Message"].tolist() == ["x", "y", "x", "y"]
+    assert str(df["Time"].iloc[1]) == "1970-01-01 00:01:00"
+
+    df = flatten(document, schema, human_readable=True)
+    assert list(df.columns) == ["Agent Name", "Node", "Message", "Time"]
+
+
+def test_empty():
+    df = flatten({"phedex": {"agent": []}}, schema)
+    assert len(df) == 0
+    assert list(df.columns) == ["Agent", "Node", "Message", "Time"]
+
+
+stream_schema = Schema(
+    path=["phedex"],
+    levels=[
+        Level("block", {"Block": "name", "Files": "files"}),
+        Level(
+            "file",
+            {"File": "name", "Size": "bytes", "Checksum": ("checksum", "$t")},
+        ),
+    ],
+    units={"Size": 1e9},
+    numeric=["Files"],
+)
+
+stream_document = {
+    "phedex": {
+        "block": [
+            {
+                "name": f"/Dé/B/RAW#{i}",
+                "files": i % 3,
+                "file": [
+                    {
+                        "name": f"/store/é{i}_{j}.root",
+                        "bytes": 1000 * j,
+                        "checksum": {"$t": f"adler32:{i:04x}{j:04x} & <é>"},
+                    }
+                    for j in range(i % 3)
+                ],
+            }
+            for i in range(12)
+        ]
+    }
+}
+
+
+def to_xml(tag, item):
+    """Render a json document as datasvc XML"""
+    attributes = "".join(
+        f" {key}={quoteattr(str(value))}"
+        for key, value in item.items()
+        if not isinstance(value, (list, dict))
+    )
+    children = []
+    for key, value in item.items():
+        if isinstance(value, dict):
+            children.append(f"<{key}>{escape(value['$t'])}</{key}>")
+        elif isinstance(value, list):
+            children.extend(to_xml(key, child) for child in value)
+    return f"<{tag}{attributes}>{''.join(children)}</{tag}>"
+
+
+@pytest.mark.asyncio
+async def test_flatten_xml():
+    expected = flatten(stream_document, stream_schema)
+    data = (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        + to_xml("phedex", stream_document["phedex"])
+    ).encode()
+
+    async def chunks(size):
+        for start in range(0, len(data), size):
+            stop = start + size
+            yield data[start:stop]
+
+    for size in (1, 5, 64, len(data)):
+        dfs = [df async for df in flatten_xml(chunks(size), stream_schema, 4)]
+        assert [len(df) for df in dfs] == [4, 4, 4]
+        df = pandas.concat(dfs, ignore_index=True)
+        # numeric columns are always floating point when streaming
+        assert df["Files"].dtype == "float64"
+        assert expected["Files"].dtype == "int64"
+        pandas.testing.assert_frame_equal(df, expected, check_dtype=False)
+
+    dfs = [df async for df in flatten_xml(chunks(7), stream_schema, 100, True)]
+    assert len(dfs) == 1
+    assert list(dfs[0].columns) == ["Block", "Files", "File", "Size", "Checksum"]
+
+    async def empty():
+        yield b"<phedex></phedex>"
+
+    dfs = [df async for df in flatten_xml(empty(), stream_schema, 4)]
+    assert len(dfs) == 1
+    assert len(dfs[0]) == 0
+    assert list(dfs[0].columns) == list(expected.columns)
@@ -0,0 +1,42 @@
+import pandas
+from dmwmclient.lumimask import FileLumiIndex, LumiMask
+
+
+def test_lumimask():
+    golden = LumiMask.from_json({"1": [[1, 10], [20, 30]], "2": [[5, 5]]})
+    assert len(golden) == 22
+    other = LumiMask([1, 1, 3], [8, 11, 1], [9, 25, 2])
+    assert (golden | other).to_json() == {"1": [[1, 30]], "2": [[5, 5]], "3": [[1, 2]]}
+    assert (golden & other).to_json() == {"1": [[8, 9], [20, 25]]}
+    assert (golden - other).to_json() == {
+        "1": [[1, 7], [10, 10], [26, 30]],
+        "2": [[5, 5]],
+    }
+    assert list(golden.contains([1, 1, 2, 3], [10, 11, 5, 1])) == [
+        True,
+        False,
+        True,
+        False,
+    ]
+    assert LumiMask.from_json(golden.to_json()) == golden
+    assert list(golden.runs()) == [1, 2]
+
+
+def test_filelumiindex():
+    df = pandas.DataFrame(
+        {
+            "logical_file_name": ["/store/a", "/store/a", "/store/b"],
+            "run_num": [1, 2, 1],
+            "lumi_section_num": [[3, 1, 2, 7], [1], [4, 5]],
+        }
+    )
+    index = FileLumiIndex.from_filelumis(df)
+    assert index.mask().to_json() == {"1": [[1, 5], [7, 7]], "2": [[1, 1]]}
+    assert index.mask(["/store/b"]).to_json() == {"1": [[4, 5]]}
+    coverage = index.coverage(LumiMask.from_json({"1": [[2, 4]]}))
+    assert list(coverage["lumis"]) == [5, 2]
+    assert list(coverage["selected"]) == [2, 1]
+    assert list(index.files_in(LumiMask.from_json({"2": [[1, 1]]}))) == ["/store/a"]
+    both = FileLumiIndex.concat([index, FileLumiIndex.from_filelumis(df.iloc[2:])])
+    assert len(both) == 2
+    assert both.mask() == index.mask()
@@ -0,0 +1,45 @@
+import asyncio
+import pytest
+from dmwmclient.mcm import McM
+
+
+class FakeClient:
+    def __init__(self, total):
+        self.total = total
+        self.pages = []
+        self.active = 0
+        self.max_active = 0
+
+    async def getjson(self, url, params):
+        self.pages.append(params["page"])
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        start = params["page"] * params["limit"]
+        stop = min(start + params["limit"], self.total)
+        return {
+            "results": [
+                {"prepid": f"REQ-{i:05d}", "status": "done", "history": [1, 2, 3]}
+                for i in range(start, stop)
+            ]
+        }
+
+    def postprocess(self, df, dates=()):
+        return df
+
+
+@pytest.mark.asyncio
+async def test_iter_search():
+    client = FakeClient(105)
+    mcm = McM(client)
+    records = [r async for r in mcm.iter_search(limit=10, prefetch=3, member_of_campaign="X")]
+    assert [r["prepid"] for r in records] == [f"REQ-{i:05d}" for i in range(105)]
+    assert client.max_active == 3
+    assert set(range(11)) <= set(client.pages)
+
+    client = FakeClient(20)
+    mcm = McM(client)
+    chunks = [df async for df in mcm.iter_search_chunks(fields=["prepid", "status"], limit=10, prefetch=2)]
+    assert [len(df) for df in chunks] == [10, 10]
+    assert list(chunks[0].columns) == ["prepid", "status"]
@@ -0,0 +1,137 @@
+import pandas
+import pytest
+from dmwmclient.mirror import BlockReplicaMirror
+from dmwmclient.util import compact_dtypes, format_dates
+
+
+def replica(block, node, time_update, complete="y"):
+    return {
+        "name": block,
+        "id": 1,
+        "bytes": 100,
+        "files": 2,
+        "is_open": "n",
+        "replica.node": node,
+        "replica.node_id": 1 if node == "T1_A" else 2,
+        "replica.se": node.lower(),
+        "replica.bytes": 100 if complete == "y" else 50,
+        "replica.files": 2 if complete == "y" else 1,
+        "replica.complete": complete,
+        "replica.subscribed": "y",
+        "replica.custodial": "n",
+        "replica.group": "DataOps",
+        "replica.time_create": 1000.0,
+        "replica.time_update": time_update,
+    }
+
+
+class FakeDataSvc:
+    def __init__(self, replicas, compact=False, arrow=False):
+        self.replicas = replicas
+        self.compact = compact
+        self.arrow = arrow
+        self.queries = []
+
+    async def nodes(self):
+        return pandas.DataFrame({"node.name": ["T1_A", "T2_B"]})
+
+    async def sharded(self, method, node, update_since=None):
+        assert method == "blockreplicas"
+        self.queries.append((sorted(node), update_since))
+        rows = [
+            row
+            for row in self.replicas
+            if row["replica.node"] in node
+            and (update_since is None or row["replica.time_update"] >= update_since)
+        ]
+        df = pandas.DataFrame(rows, columns=list(replica("", "T1_A", 0)))
+        df = format_dates(df, ["replica.time_create", "replica.time_update"])
+        if self.compact:
+            df = compact_dtypes(df, arrow=self.arrow)
+        return df
+
+
+@pytest.mark.asyncio
+async def test_refresh(tmp_path):
+    datasvc = FakeDataSvc(
+        [
+            replica("/A/B/RAW#1", "T1_A", 1000.0),
+            replica("/A/B/RAW#2", "T1_A", 1000.0, complete="n"),
+            replica("/A/B/RAW#1", "T2_B", 1000.0),
+            replica("/A/B/RAWX#1", "T2_B", 1000.0),
+        ]
+    )
+    mirror = BlockReplicaMirror(datasvc, str(tmp_path / "mirror.db"), overlap=0)
+    assert await mirror.refresh() == 4
+    assert datasvc.queries == [(["T1_A", "T2_B"], None)]
+    df = mirror.blockreplicas()
+    assert len(df) == 4
+    assert list(df.columns) == list(replica("", "T1_A", 0))
+    assert df["replica.time_update"].dt.year.tolist() == [1970] * 4
+    assert set(mirror.sync_state()["node"]) == {"T1_A", "T2_B"}
+
+    # the second block completes, and the second replica is deleted
+    datasvc.replicas[1] = replica("/A/B/RAW#2", "T1_A", 2e9)
+    del datasvc.replicas[2]
+    assert await mirror.refresh() == 1
+    assert datasvc.queries[1][0] == ["T1_A", "T2_B"]
+    assert datasvc.queries[1][1] > 1e9
+    df = mirror.blockreplicas(block="/A/B/RAW#2")
+    assert df["replica.complete"].tolist() == ["y"]
+    assert df["replica.files"].tolist() == [2]
+    # deletions only show up in a full reload
+    assert len(mirror.blockreplicas(node="T2_B")) == 2
+    mirror.close()
+
+    mirror = BlockReplicaMirror(
+        datasvc, str(tmp_path / "mirror.db"), nodes=["T2_B"], full_refresh=0
+    )
+    assert await mirror.refresh() == 1
+    assert datasvc.queries[2] == (["T2_B"], None)
+    assert mirror.blockreplicas(node="T2_B")["name"].tolist() == ["/A/B/RAWX#1"]
+    assert len(mirror.blockreplicas(node="T1_A")) == 2
+    mirror.close()
+
+
+@pytest.mark.asyncio
+async def test_blockreplicas(tmp_path):
+    datasvc = FakeDataSvc(
+        [
+            replica("/A/B/RAW#1", "T1_A", 1000.0),
+            replica("/A/B/RAW#2", "T2_B", 1000.0, complete="n"),
+            replica("/A/B/RAWX#1", "T1_A", 1000.0),
+            replica("/A/B/RA#1", "T1_A", 1000.0),
+            replica("/C/D/AOD#1", "T2_B", 1000.0),
+        ]
+    )
+    mirror = BlockReplicaMirror(datasvc, str(tmp_path / "mirror.db"))
+    await mirror.refresh()
+    df = mirror.blockreplicas(dataset="/A/B/RAW")
+    assert sorted(df["name"]) == ["/A/B/RAW#1", "/A/B/RAW#2"]
+    df = mirror.blockreplicas(dataset=["/A/B/RAW", "/C/D/AOD"], complete="y")
+    assert sorted(df["name"]) == ["/A/B/RAW#1", "/C/D/AOD#1"]
+    df = mirror.blockreplicas(dataset="/A/B/RAW", node="T2_B")
+    assert df["name"].tolist() == ["/A/B/RAW#2"]
+    assert len(mirror.blockreplicas(dataset="/X/Y/Z")) == 0
+    mirror.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("arrow", [False, True])
+async def test_blockreplicas_compact(tmp_path, arrow):
+    datasvc = FakeDataSvc(
+        [
+            replica("/A/B/RAW#1", "T1_A", 1000.0),
+            replica("/A/B/RAW#2", "T2_B", 1000.0, complete="n"),
+        ],
+        compact=True,
+        arrow=arrow,
+    )
+    mirror = BlockReplicaMirror(datasvc, str(tmp_path / "mirror.db"))
+    await mirror.refresh()
+    assert mirror.blockreplicas(complete="y")["name"].tolist() == ["/A/B/RAW#1"]
+    assert mirror.blockreplicas(complete="n")["name"].tolist() == ["/A/B/RAW#2"]
+    df = mirror.blockreplicas()
+    assert df["is_open"].tolist() == ["n", "n"]
+    assert df["replica.time_update"].dt.year.tolist() == [1970] * 2
+    mirror.close()
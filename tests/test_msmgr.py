@@ -0,0 +1,73 @@
+import pandas
+import pytest
+from dmwmclient.msmgr import MSMgr
+from dmwmclient.util import format_dates
+
+
+DOCS = {
+    "wf1": {
+        "workflowName": "wf1",
+        "lastUpdate": 1600000000,
+        "transfers": [
+            {"dataset": "/A/B/RAW", "dataType": "primary", "campaignName": "C1", "transferIDs": ["r1", "r2"]},
+            {"dataset": "/PU/X/GEN-SIM", "dataType": "secondary", "campaignName": "C1", "transferIDs": ["r3"]},
+        ],
+    },
+    "wf2": {
+        "workflowName": "wf2",
+        "lastUpdate": 1600000100,
+        "transfers": [{"dataset": "/C/D/RAW", "dataType": "primary", "campaignName": "C2", "transferIDs": []}],
+    },
+}
+
+
+class FakeClient:
+    def __init__(self):
+        self.queries = []
+
+    async def getjson(self, url, params):
+        request = params["request"]
+        self.queries.append(request)
+        if request == "bad":
+            raise IOError("Failed to fetch data for request bad")
+        if request == "ALL_DOCS":
+            return {"result": [{"request": request, "transferDoc": list(DOCS.values())}]}
+        return {"result": [{"request": request, "transferDoc": DOCS.get(request)}]}
+
+    def postprocess(self, df, dates=()):
+        return format_dates(df, dates)
+
+
+@pytest.mark.asyncio
+async def test_transfers():
+    client = FakeClient()
+    msmgr = MSMgr(client)
+    df = await msmgr.transfers(["wf1", "wf2", "wf3", "wf1"])
+    assert sorted(client.queries) == ["wf1", "wf2", "wf3"]
+    df = df.sort_values("workflow", kind="stable", ignore_index=True)
+    assert list(df["rule_id"][:3]) == ["r1", "r2", "r3"]
+    assert list(df["dataset"]) == ["/A/B/RAW", "/A/B/RAW", "/PU/X/GEN-SIM", "/C/D/RAW"]
+    assert list(df["workflow"]) == ["wf1", "wf1", "wf1", "wf2"]
+    # a transfer record without rules is kept, with a missing rule ID
+    assert pandas.isna(df["rule_id"][3])
+    assert df["campaignName"][3] == "C2"
+    assert df["lastUpdate"].dt.year.tolist() == [2020] * 4
+
+    client.queries = []
+    df = await msmgr.transfers()
+    assert client.queries == ["ALL_DOCS"]
+    assert len(df) == 4
+
+    df = await msmgr.transfers([])
+    assert list(df.columns) == ["workflow", "dataset", "dataType", "campaignName", "rule_id", "lastUpdate"]
+    assert len(df) == 0
+
+
+@pytest.mark.asyncio
+async def test_iter_transfers_failure():
+    msmgr = MSMgr(FakeClient())
+    with pytest.raises(IOError):
+        await msmgr.transfers(["wf1", "bad"], retries=1)
+    dfs = [df async for df in msmgr.iter_transfers(["wf1", "bad", "wf2"], retries=1)]
+    assert len(dfs) == 2
+    assert sum(len(df) for df in dfs) == 4
@@ -1,5 +1,9 @@
+import time
+import pandas
 import pytest
 from dmwmclient import Client
+from dmwmclient.reqmgr import ReqMgr
+from dmwmclient.util import format_dates
 
 
 @pytest.mark.asyncio
@@ -9,3 +13,103 @@ async def test_transitions():
     df = await client.reqmgr.transitions(outputdataset="/QCD_HT700to1000_TuneCP5_13TeV-madgraph-pythia8/RunIIFall17NanoAODv6-PU2017_12Apr2018_Nano25Oct2019_new_pmx_102X_mc2017_realistic_v7-v1/NANOAODSIM")
     assert set(df.columns) == {'DN', 'Status', 'UpdateTime', 'current', 'mask', 'outputdataset', 'requestname'}
     assert df['current'].sum() == 1
+
+
+class FakeClient:
+    async def getjson(self, url, params):
+        n = int(params["outputdataset"].split("/")[1])
+        return {
+            "result": [
+                {
+                    f"request_{n}_{i}": {
+                        "RequestTransition": [
+                            {"Status": "new", "UpdateTime": 1600000000, "DN": "me"},
+                            {"Status": "assigned", "UpdateTime": 1600000100 + i, "DN": "me", "Comment": "go"},
+                        ][: i + 1]
+                    }
+                    for i in range(n)
+                }
+            ]
+        }
+
+    def postprocess(self, df, dates=()):
+        return format_dates(df, dates)
+
+
+@pytest.mark.asyncio
+async def test_bulk_transitions():
+    reqmgr = ReqMgr(FakeClient())
+    df = await reqmgr.bulk_transitions(["/0/A/B", "/2/A/B", "/1/A/B", "/2/A/B"])
+    assert list(df["dataset"].cat.categories) == ["/0/A/B", "/2/A/B", "/1/A/B"]
+    assert list(df["dataset"]) == ["/2/A/B"] * 3 + ["/1/A/B"]
+    assert list(df["requestname"]) == ["request_2_0", "request_2_1", "request_2_1", "request_1_0"]
+    assert list(df["current"]) == [True, False, True, True]
+    assert list(df["Status"]) == ["new", "new", "assigned", "new"]
+    assert df["UpdateTime"].iloc[2] == pandas.Timestamp("2020-09-13 12:28:21")
+
+
+class FakeRequestClient:
+    def __init__(self, now):
+        self.now = now
+        self.params = None
+        self.postprocessed = 0
+
+    async def getjson(self, url, params):
+        self.params = params
+        documents = {
+            "old": {
+                "RequestTransition": [{"Status": "staging", "UpdateTime": self.now - 30 * 86400}],
+                "InputDataset": "/A/B/RAW",
+                "RequestStatus": "staging",
+            },
+            "recent": {
+                "RequestTransition": [{"Status": "staging", "UpdateTime": self.now - 86400}],
+                "InputDataset": "/C/D/RAW",
+                "RequestStatus": "staging",
+            },
+            "noinput": {
+                "RequestTransition": [{"Status": "staging", "UpdateTime": self.now - 30 * 86400}],
+                "RequestStatus": "staging",
+            },
+        }
+        mask = params.get("mask", [])
+        return {
+            "result": [
+                {name: {k: v for k, v in doc.items() if not mask or k in mask} for name, doc in documents.items()}
+            ]
+        }
+
+    def postprocess(self, df, dates=()):
+        self.postprocessed += 1
+        return format_dates(df, dates)
+
+
+@pytest.mark.asyncio
+async def test_requests_mask():
+    client = FakeRequestClient(time.time())
+    reqmgr = ReqMgr(client)
+    df = await reqmgr.requests(["InputDataset", "Team"], status="staging")
+    assert client.params == {"status": "staging", "mask": ["InputDataset", "Team"]}
+    assert list(df.columns) == ["requestname", "InputDataset", "Team"]
+    assert df["Team"].isna().all()
+
+    df = await reqmgr.requests(status="staging")
+    assert list(df.columns) == ["requestname", "RequestTransition", "InputDataset", "RequestStatus"]
+
+    client.postprocessed = 0
+    df = await reqmgr.stuck_transfers()
+    assert client.params["mask"] == ["RequestTransition", "InputDataset"]
+    assert client.postprocessed == 1
+    assert list(df.columns) == ["requestname", "InputDataset", "UpdateTime"]
+    assert list(df["requestname"]) == ["old"]
+
+
+@pytest.mark.asyncio
+async def test_transition_fields():
+    reqmgr = ReqMgr(FakeClient())
+    df = await reqmgr.transitions(outputdataset="/2/A/B")
+    assert list(df.columns) == ["requestname", "current", "mask", "outputdataset", "Status", "UpdateTime", "DN", "Comment"]
+    assert list(df["Comment"].isna()) == [True, True, False]
+    df = await reqmgr.bulk_transitions(["/1/A/B", "/2/A/B"])
+    assert list(df.columns) == ["dataset", "requestname", "current", "Status", "UpdateTime", "DN", "Comment"]
+    assert list(df["Comment"].isna()) == [True, True, True, False]
@@ -0,0 +1,92 @@
+import pandas
+import pytest
+from dmwmclient.requestindex import RequestIndex
+
+
+class FakeReqMgr:
+    def __init__(self):
+        self.status = {"req1": "running-open", "req2": "assigned"}
+        self.queried = []
+        self.extra = []
+
+    async def request_status(self, status="ACTIVE"):
+        return dict(self.status)
+
+    async def active_request_datasets(self, names=None):
+        self.queried.extend(names)
+        details = {
+            "req1": {
+                "InputDataset": ["/A/B/RAW"],
+                "OutputDatasets": ["/A/C/AOD"],
+                "IncludeParents": False,
+                "MCPileup": None,
+                "Team": "production",
+            },
+            "req2": {
+                "InputDataset": ["/A/C/AOD"],
+                "OutputDatasets": ["/A/D/MINIAOD", "/A/E/MINIAOD"],
+                "IncludeParents": True,
+                "MCPileup": "/PU/X/GEN-SIM",
+                "Team": "relval",
+            },
+            "req3": {
+                "InputDataset": [],
+                "OutputDatasets": ["/A/B/RAW"],
+                "IncludeParents": False,
+                "MCPileup": "/PU/X/GEN-SIM",
+                "Team": None,
+            },
+        }
+        return [dict(details[name], requestname=name) for name in names + self.extra]
+
+
+class FakeDBS:
+    async def lineage(self, datasets, depth=None):
+        assert datasets == ["/A/C/AOD"]
+        return pandas.DataFrame(
+            {"child": ["/A/C/AOD"], "parent": ["/A/B/RAW"], "generation": [1]}
+        )
+
+
+@pytest.mark.asyncio
+async def test_requestindex():
+    reqmgr = FakeReqMgr()
+    index = RequestIndex(reqmgr, FakeDBS(), batchsize=1)
+    with pytest.raises(RuntimeError):
+        index.requests("/A/B/RAW")
+    assert await index.load() is index
+    assert len(index) == 2
+    assert index.requests("/A/B/RAW") == ["req1", "req2"]
+    assert index.requests("/A/B/RAW", roles=["input"]) == ["req1"]
+    assert index.requests("/A/C/AOD", roles=["output"]) == ["req1"]
+    assert index.requests("/PU/X/GEN-SIM") == ["req2"]
+    assert index.requests("/X/Y/Z") == []
+    assert index.teams("/A/B/RAW") == ["production", "relval"]
+    assert index.team("req2") == "relval"
+    assert ("parent", "/A/B/RAW") in index.datasets("req2")
+    assert len(index.table()) == 7
+
+    # only new and changed requests are queried again
+    reqmgr.queried = []
+    reqmgr.status = {"req2": "running-open", "req3": "assigned"}
+    assert await index.refresh() == {"added": 1, "updated": 1, "removed": 1}
+    assert sorted(reqmgr.queried) == ["req2", "req3"]
+    assert index.requests("/A/C/AOD") == ["req2"]
+    assert index.requests("/A/B/RAW") == ["req2", "req3"]
+    assert index.requests("/PU/X/GEN-SIM", roles=["pileup"]) == ["req2", "req3"]
+    assert index.status("req1") is None
+    assert index.status("req2") == "running-open"
+
+    reqmgr.queried = []
+    assert await index.refresh() == {"added": 0, "updated": 0, "removed": 0}
+    assert reqmgr.queried == []
+
+
+@pytest.mark.asyncio
+async def test_requestindex_skipped():
+    reqmgr = FakeReqMgr()
+    # details of a request that is not active are ignored
+    reqmgr.extra = ["req3"]
+    index = RequestIndex(reqmgr, FakeDBS())
+    assert await index.refresh() == {"added": 2, "updated": 0, "removed": 0}
+    assert index.status("req3") is None
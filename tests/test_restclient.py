@@ -1,3 +1,4 @@
+import httpx
 import pytest
 from dmwmclient import RESTClient
 
@@ -8,3 +9,55 @@ async def test_basic():
 
     res = await client.getjson("http://httpbin.org/headers")
     print(res)
+
+
+class FakeResponse:
+    def __init__(self, status_code, chunks):
+        self.status_code = status_code
+        self.chunks = chunks
+        self.text = b"".join(chunks).decode()
+        self.closed = False
+
+    async def aread(self):
+        pass
+
+    async def aiter_bytes(self):
+        for chunk in self.chunks:
+            yield chunk
+
+    async def aclose(self):
+        self.closed = True
+
+
+@pytest.mark.asyncio
+async def test_iter_bytes(monkeypatch):
+    # without loading a user certificate
+    client = RESTClient.__new__(RESTClient)
+    client._client = httpx.AsyncClient()
+    responses = []
+
+    async def send(request, timeout=None, retries=1, stream=False):
+        assert stream
+        assert request.url.query == "a=b"
+        return responses.pop(0)
+
+    monkeypatch.setattr(client, "send", send)
+    response = FakeResponse(200, [b"<a>", b"</a>"])
+    responses.append(response)
+    chunks = [
+        chunk
+        async for chunk in client.iter_bytes("http://localhost/x", params={"a": "b"})
+    ]
+    assert chunks == [b"<a>", b"</a>"]
+    assert response.closed
+
+    response = FakeResponse(500, [b"error"])
+    responses.append(response)
+    with pytest.raises(IOError):
+        [
+            chunk
+            async for chunk in client.iter_bytes(
+                "http://localhost/x", params={"a": "b"}
+            )
+        ]
+    assert response.closed
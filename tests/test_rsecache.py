@@ -0,0 +1,78 @@
+import pytest
+from dmwmclient.rsecache import evaluate_rse_expression, InvalidRSEExpression, RSECache, RSEExpressionError
+
+
+attributes = {
+    "T1_US_FNAL_Disk": {"rse_type": "DISK", "tier": 1, "country": "US", "ddm_quota": 100},
+    "T1_US_FNAL_Tape": {"rse_type": "TAPE", "tier": 1, "country": "US"},
+    "T2_CH_CERN": {"rse_type": "DISK", "tier": 2, "country": "CH", "ddm_quota": 0},
+    "T2_DE_DESY": {"rse_type": "DISK", "tier": 2, "country": "DE", "ddm_quota": 50, "reaper": True},
+}
+
+
+def test_expressions():
+    assert evaluate_rse_expression("*", attributes) == set(attributes)
+    assert evaluate_rse_expression("T2_CH_CERN", attributes) == {"T2_CH_CERN"}
+    assert evaluate_rse_expression("reaper", attributes) == {"T2_DE_DESY"}
+    assert evaluate_rse_expression("(rse_type=DISK)&(ddm_quota>0)", attributes) == {"T1_US_FNAL_Disk", "T2_DE_DESY"}
+    assert evaluate_rse_expression("tier<2|country=CH", attributes) == {"T1_US_FNAL_Disk", "T1_US_FNAL_Tape", "T2_CH_CERN"}
+    assert evaluate_rse_expression("*\\rse_type=TAPE", attributes) == {"T1_US_FNAL_Disk", "T2_CH_CERN", "T2_DE_DESY"}
+    assert evaluate_rse_expression("reaper=true", attributes) == {"T2_DE_DESY"}
+
+
+def test_empty():
+    for expression in ["T2_XX_Unknown", "tier=3", "T2_CH_CERN\\T2_CH_CERN"]:
+        with pytest.raises(InvalidRSEExpression):
+            evaluate_rse_expression(expression, attributes)
+
+
+def test_unsupported():
+    for expression in ["(tier=1", "tier=1)", "tier!=1", "tier=1|"]:
+        with pytest.raises(RSEExpressionError):
+            evaluate_rse_expression(expression, attributes)
+
+
+class FakeRucio:
+    def __init__(self):
+        self.calls = []
+
+    async def getjson(self, path, params=None):
+        self.calls.append((path, params))
+        if path == "rses/" and params is None:
+            return [{"rse": rse, "rse_type": attr["rse_type"], "deleted": False, "id": None} for rse, attr in attributes.items()]
+        if path == "rses/":
+            # the server only gets the expressions the local evaluator cannot handle
+            assert params == {"expression": "tier!=1"}
+            return [{"rse": "T2_DE_DESY"}, {"rse": "T2_CH_CERN"}]
+        rse, kind = path.split("/")[1:3]
+        if kind == "attr":
+            return [{key: value} for key, value in attributes[rse].items() if key != "rse_type"]
+        return [{"MinFreeSpace": 100}] if rse == "T2_CH_CERN" else []
+
+
+@pytest.mark.asyncio
+async def test_rsecache():
+    rucio = FakeRucio()
+    cache = RSECache(rucio, concurrency=2)
+    assert await cache.rses() == sorted(attributes)
+    assert len(rucio.calls) == 1 + 2 * len(attributes)
+    assert await cache.attributes("T2_DE_DESY") == dict(attributes["T2_DE_DESY"], rse="T2_DE_DESY", deleted=False)
+    assert await cache.limits("T2_CH_CERN") == {"MinFreeSpace": 100}
+    df = await cache.table()
+    assert list(df.index) == sorted(attributes)
+    assert list(df["tier"]) == [1, 1, 2, 2]
+
+    # resolved locally from the cached attributes
+    rucio.calls = []
+    assert await cache.expression("rse_type=DISK&tier=2") == ["T2_CH_CERN", "T2_DE_DESY"]
+    with pytest.raises(InvalidRSEExpression):
+        await cache.expression("T2_XX_Unknown")
+    assert rucio.calls == []
+
+    # unsupported syntax falls back to the server
+    assert await cache.expression("tier!=1") == ["T2_CH_CERN", "T2_DE_DESY"]
+    assert rucio.calls == [("rses/", {"expression": "tier!=1"})]
+
+    cache.invalidate()
+    await cache.rses()
+    assert len(rucio.calls) == 2 + 2 * len(attributes)
@@ -0,0 +1,65 @@
+import datetime
+import json
+import pytest
+from dmwmclient.rucio import Rucio
+
+
+def replica(i):
+    return {
+        "scope": "cms",
+        "name": f"/store/{i}.root",
+        "bytes": 1000 * i,
+        "pfns": {
+            f"root://a.se//store/{i}.root": {"rse": "T2_XX_A"},
+            f"root://b.se//store/{i}.root": {"rse": "T2_XX_B"},
+        },
+    }
+
+
+class FakeClient:
+    def __init__(self, records):
+        self.records = records
+        self.urls = []
+
+    async def iter_bytes(self, url, params=None, headers=None, timeout=None, retries=1):
+        self.urls.append(str(url))
+        # one record per line, without a trailing newline, split at odd places
+        data = "\n".join(json.dumps(record) for record in self.records).encode()
+        for start in range(0, len(data), 7):
+            stop = start + 7
+            yield data[start:stop]
+
+
+def rucio_client(records):
+    rucio = Rucio(FakeClient(records))
+    rucio._token_expiration = datetime.datetime.max
+    return rucio
+
+
+@pytest.mark.asyncio
+async def test_iter_json():
+    records = [replica(i) for i in range(5)]
+    rucio = rucio_client(records)
+    assert [record async for record in rucio.iter_json("replicas/cms/x")] == records
+
+
+@pytest.mark.asyncio
+async def test_iter_chunks(monkeypatch):
+    rucio = rucio_client([replica(i) for i in range(5)])
+    chunks = [df async for df in rucio.iter_chunks("list_replicas", "cms", "/A/B/RAW#1", chunksize=4)]
+    assert rucio.client.urls == ["http://cms-rucio.cern.ch/replicas/cms/%2FA%2FB%2FRAW%231"]
+    assert list(map(len, chunks)) == [4, 4, 2]
+    for chunk in chunks:
+        assert list(chunk.columns) == ["lfn", "bytes", "pfn", "replica"]
+        assert (chunk.dtypes == chunks[0].dtypes).all()
+    assert [lfn for chunk in chunks for lfn in chunk["lfn"]][::2] == [f"/store/{i}.root" for i in range(5)]
+    assert list(chunks[1]["replica"]) == ["T2_XX_A", "T2_XX_B"] * 2
+
+    # the default chunk size is taken from the Rucio defaults
+    monkeypatch.setitem(Rucio.defaults, "chunksize", 3)
+    chunks = [df async for df in rucio.iter_chunks("list_replicas", "cms", "/A/B/RAW#1")]
+    assert list(map(len, chunks)) == [3, 3, 3, 1]
+
+    rucio = rucio_client([])
+    chunks = [df async for df in rucio.iter_chunks("list_replicas", "cms", "/A/B/RAW#1")]
+    assert list(map(len, chunks)) == [0]
@@ -0,0 +1,30 @@
+import pandas
+from dmwmclient.sitemap import SiteMap
+
+
+def test_sitemap():
+    sitemap = SiteMap.from_names(
+        ["T1_US_FNAL_Disk", "T1_US_FNAL_MSS", "T1_US_FNAL_Buffer", "T2_CH_CERN"],
+        ["T1_US_FNAL_Disk", "T1_US_FNAL_Tape", "T2_CH_CERN", "T2_CH_CERN_Temp"],
+    )
+    assert sitemap.rse("T1_US_FNAL_MSS") == "T1_US_FNAL_Tape"
+    assert sitemap.rse("T1_US_FNAL_Buffer") is None
+    assert sitemap.node("T1_US_FNAL_Tape") == "T1_US_FNAL_MSS"
+    assert sitemap.node("T2_CH_CERN_Temp") is None
+    assert sitemap.site("T2_CH_CERN_Temp") == "T2_CH_CERN"
+    assert sitemap.nodes("T1_US_FNAL") == [
+        "T1_US_FNAL_Buffer",
+        "T1_US_FNAL_Disk",
+        "T1_US_FNAL_MSS",
+    ]
+    assert sitemap.rses("T2_CH_CERN") == ["T2_CH_CERN", "T2_CH_CERN_Temp"]
+
+    nodes = pandas.Series(
+        ["T1_US_FNAL_MSS", "T2_CH_CERN", "T1_US_FNAL_Buffer", "T2_XX_Unknown"] * 3,
+        dtype="category",
+    )
+    rses = sitemap.translate(nodes, "node", "rse")
+    assert list(rses[:2]) == ["T1_US_FNAL_Tape", "T2_CH_CERN"]
+    assert rses[2:4].isna().all()
+    sites = sitemap.translate(["T1_US_FNAL_Tape", "T2_CH_CERN_Temp"], "rse", "site")
+    assert list(sites) == ["T1_US_FNAL", "T2_CH_CERN"]
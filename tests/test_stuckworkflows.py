@@ -0,0 +1,71 @@
+import time
+import pandas
+import pytest
+from dmwmclient.stuckworkflows import StuckWorkflows
+from dmwmclient.util import format_dates
+
+
+class FakeReqMgr:
+    async def stuck_transfers(self, timedelta=14):
+        now = time.time()
+        df = pandas.DataFrame(
+            {
+                "requestname": ["wf1", "wf2", "wf3"],
+                "InputDataset": ["/A/B/RAW", "/C/D/RAW", "/E/F/RAW"],
+                "UpdateTime": [now - 20 * 86400, now - 30 * 86400, now - 15 * 86400],
+            }
+        )
+        return format_dates(df, ["UpdateTime"])
+
+
+class FakeMSMgr:
+    async def iter_transfers(self, workflows=None, concurrency=None, retries=None):
+        # a transfer record without rules has a missing rule ID
+        records = {"wf1": ["r1", "r2"], "wf2": ["r2", "r2"], "wf3": [None]}
+        for workflow in workflows:
+            yield pandas.DataFrame(
+                {
+                    "workflow": [workflow] * len(records[workflow]),
+                    "rule_id": records[workflow],
+                }
+            )
+
+
+class FakeRucio:
+    def __init__(self):
+        self.calls = []
+
+    async def get_rule(self, rule_id, json=None):
+        self.calls.append(("rule", rule_id))
+        return {
+            "r1": {"id": "r1", "state": "OK", "locks_ok_cnt": 10, "locks_replicating_cnt": 0, "locks_stuck_cnt": 0},
+            "r2": {"id": "r2", "state": "STUCK", "locks_ok_cnt": 1, "locks_replicating_cnt": 2, "locks_stuck_cnt": 3},
+        }[rule_id]
+
+    async def list_rule_locks(self, rule_id, json=None):
+        self.calls.append(("locks", rule_id))
+        return [
+            {"rule_id": rule_id, "scope": "cms", "name": "f1", "rse": "T2_XX_B", "state": "STUCK"},
+            {"rule_id": rule_id, "scope": "cms", "name": "f2", "rse": "T2_XX_A", "state": "STUCK"},
+            {"rule_id": rule_id, "scope": "cms", "name": "f3", "rse": "T2_XX_A", "state": "STUCK"},
+            {"rule_id": rule_id, "scope": "cms", "name": "f4", "rse": "T2_XX_C", "state": "OK"},
+        ]
+
+
+@pytest.mark.asyncio
+async def test_diagnose():
+    rucio = FakeRucio()
+    df = await StuckWorkflows(FakeReqMgr(), FakeMSMgr(), rucio).diagnose()
+    assert sorted(rucio.calls) == [("locks", "r2"), ("rule", "r1"), ("rule", "r2")]
+    assert list(df["requestname"]) == ["wf2", "wf1", "wf3"]
+    df = df.set_index("requestname")
+    assert df.loc["wf1", "rule_ids"] == ["r1", "r2"]
+    assert df.loc["wf1", "rule_state"] == "STUCK"
+    assert df.loc["wf1", "locks_ok"] == 11
+    assert df.loc["wf2", "locks_stuck"] == 3
+    assert df.loc["wf2", "blocking_rses"] == ["T2_XX_A", "T2_XX_B"]
+    assert df.loc["wf3", "rule_ids"] == []
+    assert df.loc["wf3", "blocking_rses"] == []
+    assert df.loc["wf3", "locks_stuck"] == 0
+    assert pandas.isna(df.loc["wf3", "rule_state"])
+    assert df.loc["wf2", "age"] > pandas.Timedelta(days=29)
@@ -0,0 +1,78 @@
+import pandas
+from dmwmclient.timeseries import BlockTimeSeries
+
+
+def poll(eta, basis, update):
+    return pandas.DataFrame(
+        {
+            "Block_Name": ["/A/B/C#1", "/A/B/C#2"],
+            "Destination": ["T2_CH_CERN", "T2_CH_CERN"],
+            "Time_Arrive": pandas.to_datetime(eta, unit="s"),
+            "Time_update": pandas.to_datetime([update, update], unit="s"),
+            "Number_of_files": [10, 20],
+            "Block_size_(GB)": [1.0, 2.0],
+            "Basis_code": basis,
+        }
+    )
+
+
+def test_timeseries(tmp_path):
+    store = BlockTimeSeries(None, str(tmp_path / "ts.db"))
+    assert store.record("blockarrive", poll([1000, 2000], ["routed"] * 2, 0), 0) == 2
+    # only time_update changed
+    assert store.record("blockarrive", poll([1000, 2000], ["routed"] * 2, 10), 10) == 0
+    assert (
+        store.record(
+            "blockarrive", poll([1500, 2000], ["routed", "queue_full"], 20), 20
+        )
+        == 2
+    )
+    store.close()
+
+    store = BlockTimeSeries(None, str(tmp_path / "ts.db"))
+    assert (
+        store.record(
+            "blockarrive", poll([1500, 2000], ["routed", "queue_full"], 30), 30
+        )
+        == 0
+    )
+    assert len(store.history("blockarrive")) == 4
+    assert len(store.history("blockarrive", since=5, block="/A/B/C#1")) == 1
+
+    transitions = store.basis_transitions(since=5)
+    assert len(transitions) == 1
+    assert transitions.loc[0, "previous_basis"] == "routed"
+    assert transitions.loc[0, "basis"] == "queue_full"
+
+    drift = store.eta_drift(since=5).set_index("block")
+    assert drift.loc["/A/B/C#1", "drift"] == 500
+    assert drift.loc["/A/B/C#2", "drift"] == 0
+    store.close()
+
+
+def test_timeseries_latency(tmp_path):
+    def latency(subscriptions, latencies):
+        n = len(subscriptions)
+        return pandas.DataFrame(
+            {
+                "Block": ["/A/B/C#1"] * n,
+                "Destination": ["T1_US_FNAL_Disk"] * n,
+                "Size": [1e9] * n,
+                "time_subscription": pandas.to_datetime(subscriptions, unit="s"),
+                "latency": latencies,
+            }
+        )
+
+    store = BlockTimeSeries(None, str(tmp_path / "ts.db"))
+    assert store.record("blocklatency", latency([100, 200], [50.0, None]), 0) == 2
+    assert store.record("blocklatency", latency([100, 200], [50.0, None]), 10) == 0
+    assert store.record("blocklatency", latency([100, 200], [50.0, 80.0]), 20) == 1
+    store.close()
+
+    store = BlockTimeSeries(None, str(tmp_path / "ts.db"))
+    assert len(store.latest("blocklatency")) == 2
+    assert store.record("blocklatency", latency([100, 200], [50.0, 80.0]), 30) == 0
+    history = store.history("blocklatency")
+    assert len(history) == 3
+    assert history["latency"].tolist()[-1] == 80.0
+    store.close()
@@ -0,0 +1,90 @@
+import json
+import pytest
+from dmwmclient.unified import Unified
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b"", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.text = content.decode()
+
+
+class FakeClient:
+    def __init__(self):
+        self.document = {"wf1": {"status": "ok"}, "wf2": {"status": "stuck"}}
+        self.etag = None
+        self.content = None
+        self.requests = []
+
+    def build_request(self, method, url, headers):
+        return headers
+
+    async def send(self, headers):
+        self.requests.append(headers)
+        if self.etag is not None and headers.get("If-None-Match") == self.etag:
+            return FakeResponse(304)
+        content = self.content if self.content is not None else json.dumps(self.document).encode()
+        return FakeResponse(200, content, {"ETag": self.etag} if self.etag else {})
+
+
+@pytest.mark.asyncio
+async def test_poller():
+    client = FakeClient()
+    poller = Unified(client).poller()
+    deltas = []
+    poller.subscribe(deltas.append)
+
+    async def acallback(delta):
+        deltas.append(delta)
+
+    poller.subscribe(acallback)
+    delta = await poller.poll()
+    assert set(delta["updated"]) == {"wf1", "wf2"}
+    assert len(deltas) == 2
+
+    # no validator: unchanged content is detected by its digest
+    assert await poller.poll() is None
+    poller.unsubscribe(acallback)
+
+    client.document = {"wf1": {"status": "ok"}, "wf2": {"status": "done"}, "wf3": {"status": "ok"}}
+    client.etag = '"v2"'
+    delta = await poller.poll()
+    assert delta == {"updated": {"wf2": {"status": "done"}, "wf3": {"status": "ok"}}, "removed": []}
+    assert len(deltas) == 3
+
+    # conditional request answered with 304
+    assert await poller.poll() is None
+    assert client.requests[-1] == {"If-None-Match": '"v2"'}
+
+    client.document = {"wf3": {"status": "ok"}}
+    client.etag = '"v3"'
+    delta = await poller.poll()
+    assert delta == {"updated": {}, "removed": ["wf1", "wf2"]}
+    assert poller.snapshot == client.document
+
+
+@pytest.mark.asyncio
+async def test_poller_invalid():
+    client = FakeClient()
+    client.etag = '"v1"'
+    poller = Unified(client).poller()
+    await poller.poll()
+
+    client.etag = '"v2"'
+    client.content = b'{"wf1": '
+    with pytest.raises(IOError):
+        await poller.poll()
+    client.content = b"42"
+    with pytest.raises(IOError):
+        await poller.poll()
+    # the invalid document is not cached, so it is fetched again
+    assert client.requests[-1] == {"If-None-Match": '"v1"'}
+
+    client.content = None
+    client.document = {"wf1": {"status": "done"}}
+    delta = await poller.poll()
+    assert delta == {"updated": {"wf1": {"status": "done"}}, "removed": ["wf2"]}
+    assert await poller.poll() is None
+    assert client.requests[-1] == {"If-None-Match": '"v2"'}
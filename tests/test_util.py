@@ -0,0 +1,139 @@
+import json
+import pytest
+import pandas
+import dmwmclient.util
+from dmwmclient.util import (
+    chunked,
+    compact_dtypes,
+    conform,
+    format_dates,
+    iter_chunks,
+    iter_json_array,
+)
+
+
+def test_format_dates():
+    df = pandas.DataFrame({"a": [0, 60], "b": [None, 3600.0], "c": ["x", "y"]})
+    format_dates(df, ["a", "b"])
+    assert str(df["a"].iloc[1]) == "1970-01-01 00:01:00"
+    assert pandas.isna(df["b"].iloc[0])
+    assert str(df["b"].iloc[1]) == "1970-01-01 01:00:00"
+
+
+def test_compact_dtypes():
+    df = pandas.DataFrame(
+        {
+            "node": ["T1_US_FNAL_Disk", "T2_CH_CERN"] * 50,
+            "name": [f"/store/file{i}.root" for i in range(100)],
+            "complete": ["y", "n"] * 50,
+            "bytes": [float(i * 1000) for i in range(100)],
+            "files": list(range(100)),
+        }
+    )
+    out = compact_dtypes(df)
+    assert isinstance(out["node"].dtype, pandas.CategoricalDtype)
+    assert not isinstance(out["name"].dtype, pandas.CategoricalDtype)
+    assert out["complete"].dtype == bool
+    assert pandas.api.types.is_integer_dtype(out["bytes"])
+    assert out["files"].dtype.itemsize == 1
+    assert out.attrs["memory_saved"] > 0
+    assert (out["bytes"] == df["bytes"]).all()
+
+
+@pytest.mark.parametrize("major", [1, 2])
+def test_compact_dtypes_arrow(monkeypatch, major):
+    pytest.importorskip("pyarrow")
+    monkeypatch.setattr(dmwmclient.util, "_pandas_major", major)
+    df = pandas.DataFrame(
+        {
+            "name": ["a", "b", None],
+            "size": [1.5, None, 2.5],
+            "lumis": [[1, 2], [3], []],
+        }
+    )
+    out = compact_dtypes(df, arrow=True)
+    assert out["lumis"].tolist() == [[1, 2], [3], []]
+    assert out["name"].tolist()[:2] == ["a", "b"]
+    assert pandas.isna(out["size"].iloc[1])
+    if major >= 2:
+        assert "pyarrow" in str(out["size"].dtype)
+    else:
+        assert out["size"].dtype == "Float64"
+
+
+@pytest.mark.asyncio
+async def test_iter_json_array():
+    document = json.dumps(
+        [{"a": i, "b": "é" * i, "c": [i, {"d": None}]} for i in range(50)]
+    )
+
+    async def chunks(size):
+        data = document.encode()
+        for start in range(0, len(data), size):
+            stop = start + size
+            yield data[start:stop]
+
+    for size in (1, 7, 1000):
+        items = [
+            item async for items in iter_json_array(chunks(size)) for item in items
+        ]
+        assert items == json.loads(document)
+
+    async def scalars():
+        for chunk in (
+            b"[12",
+            b"34, 5.",
+            b"5e",
+            b"1, tr",
+            b"ue, nu",
+            b'll, "a',
+            b'b", 7',
+            b"8]",
+        ):
+            yield chunk
+
+    items = [item async for items in iter_json_array(scalars()) for item in items]
+    assert items == [1234, 5.5e1, True, None, "ab", 78]
+
+    async def empty():
+        yield b" [ ] "
+
+    assert [items async for items in iter_json_array(empty())] == []
+
+    async def truncated():
+        yield b'[{"a": 1}, {"a"'
+
+    with pytest.raises(json.JSONDecodeError):
+        [items async for items in iter_json_array(truncated())]
+
+
+@pytest.mark.asyncio
+async def test_iter_chunks():
+    df = pandas.DataFrame({"a": range(10), "b": list("abcdefghij")})
+
+    async def method():
+        return df
+
+    chunks = [chunk async for chunk in iter_chunks(method(), 4)]
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    pandas.testing.assert_frame_equal(pandas.concat(chunks), df)
+
+    chunks = list(chunked(df.iloc[:0], 4))
+    assert len(chunks) == 1
+    assert list(chunks[0].columns) == ["a", "b"]
+
+
+def test_conform():
+    reference = pandas.DataFrame(
+        {"a": [1.5], "b": ["x"], "c": pandas.Series([1], dtype="int32")}
+    )
+    df = pandas.DataFrame({"c": [2, 3], "a": [1, 2], "d": [0, 0]})
+    out = conform(df, reference)
+    assert list(out.columns) == ["a", "b", "c"]
+    assert out["a"].dtype == "float64"
+    assert out["c"].dtype == "int32"
+    assert out["b"].isna().all()
+    # a missing value cannot be cast to integer, so the column is left as is
+    df = pandas.DataFrame({"a": [1.0], "b": ["y"], "c": [None]})
+    assert conform(df, reference)["c"].isna().all()
+    assert conform(df, None) is df